@@ -90,6 +90,158 @@ def check_api_keys():
         'serper': bool(serper_key and serper_key != 'your_serper_api_key_here')
     }
 
+# 分頁載入歷史紀錄
+def load_history_pages(history_manager, crew_type, state_key, page_size=10):
+    """依照已展開的頁數載入歷史紀錄，只取得畫面上要顯示的列"""
+    pages = st.session_state.get(state_key, 1)
+    records, cursor = [], None
+    for _ in range(pages):
+        page, cursor = history_manager.get_history_page(crew_type, page_size, cursor)
+        records.extend(page)
+        if not cursor:
+            break
+    return records, cursor is not None
+
+def show_load_more_button(state_key, has_more):
+    """還有更舊的紀錄時顯示「載入更多」按鈕"""
+    if has_more and st.button("⬇️ 載入更多", key=f"{state_key}_more"):
+        st.session_state[state_key] = st.session_state.get(state_key, 1) + 1
+        st.rerun()
+
+# 讀取歷史紀錄的報告內容
+def load_record_report(record):
+    """優先從報告儲存區讀取（所有 session 共用 LRU 快取），舊紀錄則讀取輸出檔案"""
+    from crew_modules.report_store import report_store
+    
+    if record.get('report_hash'):
+        content = report_store.get(record['report_hash'])
+        if content is not None:
+            return content
+    with open(record['output_file'], 'r', encoding='utf-8') as f:
+        return f.read()
+
+# 查看報告時先只顯示開頭這麼多位元組，較長的報告由使用者展開
+REPORT_PREVIEW_BYTES = 200 * 1024
+
+def load_report_preview(record, limit=REPORT_PREVIEW_BYTES):
+    """
+    讀取報告開頭的預覽：從報告儲存區串流解壓（ReportStore.iter_chunks），讀到 limit 就停止，
+    長報告不必整份解壓、渲染
+    
+    Returns:
+        (預覽內容, 是否還有未顯示的內容)
+    """
+    from crew_modules.report_store import report_store
+    
+    data = None
+    if record.get('report_hash'):
+        chunks = report_store.iter_chunks(record['report_hash'])
+        try:
+            data = bytearray()
+            for chunk in chunks:
+                data.extend(chunk)
+                if len(data) > limit:
+                    break
+        except OSError:
+            # 儲存區中已沒有這份報告，改讀輸出檔案
+            data = None
+        finally:
+            chunks.close()
+    if data is None:
+        with open(record['output_file'], 'rb') as f:
+            data = f.read(limit + 1)
+    return bytes(data[:limit]).decode('utf-8', errors='ignore'), len(data) > limit
+
+def show_viewing_report(state_key, close_key=None, download_key=None):
+    """顯示 session 中正在查看的報告；報告已被刪除（例如被保留策略清理）時顯示提示，仍可關閉"""
+    viewing = st.session_state[state_key]
+    full_key = f"{state_key}_full"
+    
+    try:
+        if st.session_state.get(full_key):
+            viewing_content, truncated = load_record_report(viewing), False
+        else:
+            viewing_content, truncated = load_report_preview(viewing)
+    except (OSError, UnicodeDecodeError):
+        viewing_content, truncated = None, False
+        st.warning("這份報告已無法取得（可能已被刪除或清理），請關閉後重新選擇")
+    
+    if viewing_content is not None:
+        st.markdown(viewing_content)
+        if truncated:
+            st.caption(f"只顯示前 {REPORT_PREVIEW_BYTES // 1024} KB")
+            if st.button("📖 顯示完整報告", key=f"{state_key}_show_full"):
+                st.session_state[full_key] = True
+                st.rerun()
+    
+    col1, col2 = st.columns([1, 5])
+    with col1:
+        if st.button("❌ 關閉", key=close_key):
+            del st.session_state[state_key]
+            st.session_state.pop(full_key, None)
+            st.rerun()
+    with col2:
+        if viewing_content is not None:
+            try:
+                st.download_button(
+                    label="📥 下載",
+                    data=load_record_report(viewing),
+                    file_name=Path(viewing['filename']).name,
+                    mime="text/markdown",
+                    key=download_key
+                )
+            except (OSError, UnicodeDecodeError):
+                st.warning("這份報告已無法取得，無法下載")
+
+# 全文搜尋歷史報告
+def show_history_search(history_manager, crew_type, state_key, viewing_key=None):
+    """在歷史紀錄區域顯示搜尋框與排序後的摘要片段；viewing_key 為 None 時改為提供下載"""
+    from crew_modules.report_search import report_search_index
+    
+    query = st.text_input("🔍 搜尋報告內容", key=f"{state_key}_search", placeholder="例如：SQL injection payments")
+    if not query.strip():
+        return
+    
+    # 第一次搜尋時補上建立索引之前的舊紀錄
+    report_search_index.sync(history_manager.get_history())
+    results = report_search_index.search(query, crew_type)
+    if not results:
+        st.info("找不到符合的報告")
+        return
+    
+    st.caption(f"找到 {len(results)} 份相關報告（依相關度排序）")
+    for result in results:
+        col1, col2 = st.columns([4, 1])
+        
+        with col1:
+            timestamp = history_manager.format_timestamp(result['timestamp'])
+            st.markdown(f"**{timestamp}** - `{Path(result['output_file']).name}`")
+            st.caption(result['snippet'])
+        
+        with col2:
+            try:
+                if viewing_key:
+                    if st.button("📄 查看", key=f"{state_key}_hit_{result['id']}"):
+                        load_record_report(result)
+                        st.session_state[viewing_key] = {
+                            'report_hash': result.get('report_hash'),
+                            'output_file': result['output_file'],
+                            'filename': result['output_file'],
+                            'query': (result.get('input_files') or [''])[0]
+                        }
+                else:
+                    st.download_button(
+                        label="📥 下載",
+                        data=load_record_report(result),
+                        file_name=Path(result['output_file']).name,
+                        mime="text/markdown",
+                        key=f"{state_key}_hit_{result['id']}"
+                    )
+            except Exception as e:
+                st.error(f"無法讀取檔案：{e}")
+    
+    st.markdown("---")
+
 # 主頁
 def show_home():
     st.markdown('<div class="main-header">🤖 CrewAI Code Agent</div>', unsafe_allow_html=True)
@@ -221,7 +373,9 @@ def show_documentation_crew():
     from crew_modules.history_manager import history_manager
     
     with st.expander("📚 歷史紀錄", expanded=False):
-        history_records = history_manager.get_history('documentation', limit=10)
+        show_history_search(history_manager, 'documentation', 'doc_history_pages', 'viewing_doc')
+        
+        history_records, has_more = load_history_pages(history_manager, 'documentation', 'doc_history_pages')
         
         if history_records:
             for record in history_records:
@@ -234,13 +388,14 @@ def show_documentation_crew():
                     st.markdown(f"{status_icon} **{timestamp}** - {file_count} 個檔案")
                 
                 with col2:
-                    if record.get('file_exists') and record.get('output_file'):
+                    if (record.get('report_hash') or record.get('file_exists')) and record.get('output_file'):
                         if st.button("📄 查看", key=f"view_{record['id']}"):
                             try:
-                                with open(record['output_file'], 'r', encoding='utf-8') as f:
-                                    content = f.read()
+                                # session 只保存雜湊，內容在顯示時才從共用快取取得
+                                load_record_report(record)
                                 st.session_state['viewing_doc'] = {
-                                    'content': content,
+                                    'report_hash': record.get('report_hash'),
+                                    'output_file': record['output_file'],
                                     'filename': record['output_file']
                                 }
                             except Exception as e:
@@ -253,6 +408,8 @@ def show_documentation_crew():
                         history_manager.delete_record(record['id'])
                         st.rerun()
             
+            show_load_more_button('doc_history_pages', has_more)
+            
             if st.button("🗑️ 清除全部歷史"):
                 history_manager.clear_history('documentation')
                 st.rerun()
@@ -263,20 +420,7 @@ def show_documentation_crew():
     if 'viewing_doc' in st.session_state:
         st.markdown("---")
         st.markdown(f"### 📄 {st.session_state['viewing_doc']['filename']}")
-        st.markdown(st.session_state['viewing_doc']['content'])
-        
-        col1, col2 = st.columns([1, 5])
-        with col1:
-            if st.button("❌ 關閉"):
-                del st.session_state['viewing_doc']
-                st.rerun()
-        with col2:
-            st.download_button(
-                label="📥 下載",
-                data=st.session_state['viewing_doc']['content'],
-                file_name=Path(st.session_state['viewing_doc']['filename']).name,
-                mime="text/markdown"
-            )
+        show_viewing_report('viewing_doc')
         st.markdown("---")
     
     # 輸入區
@@ -408,6 +552,25 @@ def show_documentation_crew():
             st.success(f"✅ 文件已上傳：{file_path}")
             file_paths = [file_path]
     
+    # 程式碼內容的 token 預算
+    with st.expander("🎯 Context 預算（大型專案）", expanded=False):
+        st.markdown("""
+        <div class="info-box">
+            <small>💡 內容超過預算時，會在本地以向量檢索挑出與分析目標最相關的程式碼片段<br>
+            設為 0 表示提供所有文件的完整內容</small>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        context_token_budget = st.number_input(
+            "Token 預算",
+            min_value=0,
+            max_value=200000,
+            value=0,
+            step=1000,
+            help="送給 Senior Python Developer 的程式碼內容上限（約略估算）",
+            key="doc_context_budget"
+        )
+    
     # 執行按鈕
     st.markdown("---")
     
@@ -432,6 +595,9 @@ def show_documentation_crew():
             try:
                 # 動態導入
                 from crew_modules import documentation_crew_module
+                from crew_modules.run_telemetry import RunTelemetry
+                
+                telemetry = RunTelemetry('documentation')
                 
                 # 根據文件數量決定輸出文件名
                 if len(file_paths) == 1:
@@ -444,7 +610,9 @@ def show_documentation_crew():
                 result = documentation_crew_module.run_documentation_crew(
                     target, 
                     output_file,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    context_token_budget=context_token_budget or None,
+                    telemetry=telemetry
                 )
                 
                 # 記錄到歷史
@@ -452,13 +620,23 @@ def show_documentation_crew():
                     crew_type='documentation',
                     input_files=file_paths,
                     output_file=output_file,
-                    success=True
+                    success=True,
+                    telemetry=telemetry.to_dict()
                 )
                 
                 st.markdown('<div class="success-box">', unsafe_allow_html=True)
                 st.markdown("### ✅ 文檔生成完成！")
+                st.markdown(
+                    f"**執行時間**：{telemetry.wall_time or 0:.1f} 秒 · "
+                    f"**Tokens**：{telemetry.usage['total_tokens']:,} · **估計成本**：${telemetry.estimated_cost:.4f}"
+                )
                 st.markdown(f"**分析文件數量**：{len(file_paths)}")
                 st.markdown(f"**輸出文件**：`{output_file}`")
+                if telemetry.prefix_cache and telemetry.prefix_cache["prefix_bytes"]:
+                    st.caption(
+                        f"Prompt 與上次執行相同的前綴：{telemetry.prefix_cache['prefix_bytes']:,} / "
+                        f"{telemetry.prefix_cache['total_bytes']:,} bytes（{telemetry.prefix_cache['prefix_ratio']:.0%}）"
+                    )
                 st.markdown('</div>', unsafe_allow_html=True)
                 
                 # 顯示結果
@@ -484,7 +662,8 @@ def show_documentation_crew():
                     input_files=file_paths,
                     output_file=output_file if 'output_file' in locals() else None,
                     success=False,
-                    error_message=str(e)
+                    error_message=str(e),
+                    telemetry=telemetry.to_dict() if 'telemetry' in locals() else None
                 )
                 
                 st.error(f"❌ 執行錯誤：{str(e)}")
@@ -516,7 +695,9 @@ def show_refactoring_crew():
     from crew_modules.history_manager import history_manager
     
     with st.expander("� 歷史紀錄", expanded=False):
-        history_records = history_manager.get_history('refactoring', limit=10)
+        show_history_search(history_manager, 'refactoring', 'refactor_history_pages', 'viewing_refactor_doc')
+        
+        history_records, has_more = load_history_pages(history_manager, 'refactoring', 'refactor_history_pages')
         
         if history_records:
             for record in history_records:
@@ -529,13 +710,14 @@ def show_refactoring_crew():
                     st.markdown(f"{status_icon} **{timestamp}** - {file_count} 個檔案")
                 
                 with col2:
-                    if record.get('file_exists') and record.get('output_file'):
+                    if (record.get('report_hash') or record.get('file_exists')) and record.get('output_file'):
                         if st.button("📄 查看", key=f"view_ref_{record['id']}"):
                             try:
-                                with open(record['output_file'], 'r', encoding='utf-8') as f:
-                                    content = f.read()
+                                # session 只保存雜湊，內容在顯示時才從共用快取取得
+                                load_record_report(record)
                                 st.session_state['viewing_refactor_doc'] = {
-                                    'content': content,
+                                    'report_hash': record.get('report_hash'),
+                                    'output_file': record['output_file'],
                                     'filename': record['output_file']
                                 }
                             except Exception as e:
@@ -548,6 +730,8 @@ def show_refactoring_crew():
                         history_manager.delete_record(record['id'])
                         st.rerun()
             
+            show_load_more_button('refactor_history_pages', has_more)
+            
             if st.button("🗑️ 清除全部歷史", key="clear_refactor_history"):
                 history_manager.clear_history('refactoring')
                 st.rerun()
@@ -558,21 +742,7 @@ def show_refactoring_crew():
     if 'viewing_refactor_doc' in st.session_state:
         st.markdown("---")
         st.markdown(f"### 📄 {st.session_state['viewing_refactor_doc']['filename']}")
-        st.markdown(st.session_state['viewing_refactor_doc']['content'])
-        
-        col1, col2 = st.columns([1, 5])
-        with col1:
-            if st.button("❌ 關閉", key="close_refactor_doc"):
-                del st.session_state['viewing_refactor_doc']
-                st.rerun()
-        with col2:
-            st.download_button(
-                label="📥 下載",
-                data=st.session_state['viewing_refactor_doc']['content'],
-                file_name=Path(st.session_state['viewing_refactor_doc']['filename']).name,
-                mime="text/markdown",
-                key="download_refactor_doc"
-            )
+        show_viewing_report('viewing_refactor_doc', "close_refactor_doc", "download_refactor_doc")
         st.markdown("---")
     
     # 輸入區
@@ -672,6 +842,31 @@ def show_refactoring_crew():
             st.success(f"✅ 文件已上傳：{file_path}")
             file_paths = [file_path]
     
+    # Git diff 模式
+    with st.expander("🔀 Git Diff 模式（只審查分支變更）", expanded=False):
+        st.markdown("""
+        <div class="info-box">
+            <small>💡 只把相對於 base ref 的變更區塊與少量上下文送給 Security Auditor 和 Clean Code Reviewer<br>
+            Token 用量和執行時間會隨變更大小而非文件大小成長（文件需位於本地 Git 儲存庫中）</small>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        diff_mode = st.checkbox("只審查變更", value=False, key="refactor_diff_mode")
+        base_ref = st.text_input(
+            "Base ref",
+            value="main",
+            help="要比較的分支、tag 或 commit",
+            key="refactor_base_ref"
+        )
+        diff_context_lines = st.number_input(
+            "上下文行數",
+            min_value=0,
+            max_value=20,
+            value=3,
+            help="每個變更區塊前後保留的行數",
+            key="refactor_diff_context"
+        )
+    
     # 執行按鈕
     st.markdown("---")
     
@@ -695,6 +890,9 @@ def show_refactoring_crew():
             try:
                 # 動態導入
                 from crew_modules import refactoring_crew_module
+                from crew_modules.run_telemetry import RunTelemetry
+                
+                telemetry = RunTelemetry('refactoring')
                 
                 # 根據文件數量決定輸出文件名
                 if len(file_paths) == 1:
@@ -704,11 +902,17 @@ def show_refactoring_crew():
                     output_file = f"REFACTORING_MultiFile_{len(file_paths)}files.md"
                     target = file_paths[0]  # 目前只支援單檔案，多檔案需要修改模組
                 
+                if diff_mode and base_ref.strip():
+                    output_file = output_file.replace(".md", "_diff.md")
+                
                 # 執行 Crew
                 result = refactoring_crew_module.run_refactoring_crew(
                     target, 
                     output_file,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    base_ref=base_ref.strip() if diff_mode else None,
+                    diff_context_lines=int(diff_context_lines),
+                    telemetry=telemetry
                 )
                 
                 # 記錄到歷史
@@ -716,13 +920,23 @@ def show_refactoring_crew():
                     crew_type='refactoring',
                     input_files=file_paths,
                     output_file=output_file,
-                    success=True
+                    success=True,
+                    telemetry=telemetry.to_dict()
                 )
                 
                 st.markdown('<div class="success-box">', unsafe_allow_html=True)
                 st.markdown("### ✅ Code Review 完成！")
+                st.markdown(
+                    f"**執行時間**：{telemetry.wall_time or 0:.1f} 秒 · "
+                    f"**Tokens**：{telemetry.usage['total_tokens']:,} · **估計成本**：${telemetry.estimated_cost:.4f}"
+                )
                 st.markdown(f"**分析文件數量**：{len(file_paths)}")
                 st.markdown(f"**輸出報告**：`{output_file}`")
+                if telemetry.prefix_cache and telemetry.prefix_cache["prefix_bytes"]:
+                    st.caption(
+                        f"Prompt 與上次執行相同的前綴：{telemetry.prefix_cache['prefix_bytes']:,} / "
+                        f"{telemetry.prefix_cache['total_bytes']:,} bytes（{telemetry.prefix_cache['prefix_ratio']:.0%}）"
+                    )
                 st.markdown('</div>', unsafe_allow_html=True)
                 
                 # 顯示結果
@@ -749,7 +963,8 @@ def show_refactoring_crew():
                     input_files=file_paths,
                     output_file=output_file if 'output_file' in locals() else None,
                     success=False,
-                    error_message=str(e)
+                    error_message=str(e),
+                    telemetry=telemetry.to_dict() if 'telemetry' in locals() else None
                 )
                 
                 st.error(f"❌ 執行錯誤：{str(e)}")
@@ -790,7 +1005,9 @@ def show_tech_researcher():
     from crew_modules.history_manager import history_manager
     
     with st.expander("📚 歷史紀錄", expanded=False):
-        history_records = history_manager.get_history('research', limit=10)
+        show_history_search(history_manager, 'research', 'research_history_pages', 'viewing_research_doc')
+        
+        history_records, has_more = load_history_pages(history_manager, 'research', 'research_history_pages')
         
         if history_records:
             for record in history_records:
@@ -804,13 +1021,14 @@ def show_tech_researcher():
                     st.markdown(f"{status_icon} **{timestamp}**<br><small>{query_preview}</small>", unsafe_allow_html=True)
                 
                 with col2:
-                    if record.get('file_exists') and record.get('output_file'):
+                    if (record.get('report_hash') or record.get('file_exists')) and record.get('output_file'):
                         if st.button("📄 查看", key=f"view_res_{record['id']}"):
                             try:
-                                with open(record['output_file'], 'r', encoding='utf-8') as f:
-                                    content = f.read()
+                                # session 只保存雜湊，內容在顯示時才從共用快取取得
+                                load_record_report(record)
                                 st.session_state['viewing_research_doc'] = {
-                                    'content': content,
+                                    'report_hash': record.get('report_hash'),
+                                    'output_file': record['output_file'],
                                     'filename': record['output_file'],
                                     'query': record.get('input_files', [''])[0]
                                 }
@@ -824,6 +1042,8 @@ def show_tech_researcher():
                         history_manager.delete_record(record['id'])
                         st.rerun()
             
+            show_load_more_button('research_history_pages', has_more)
+            
             if st.button("🗑️ 清除全部歷史", key="clear_research_history"):
                 history_manager.clear_history('research')
                 st.rerun()
@@ -836,21 +1056,7 @@ def show_tech_researcher():
         st.markdown(f"### 📄 {st.session_state['viewing_research_doc']['filename']}")
         st.markdown(f"**問題：** {st.session_state['viewing_research_doc']['query']}")
         st.markdown("---")
-        st.markdown(st.session_state['viewing_research_doc']['content'])
-        
-        col1, col2 = st.columns([1, 5])
-        with col1:
-            if st.button("❌ 關閉", key="close_research_doc"):
-                del st.session_state['viewing_research_doc']
-                st.rerun()
-        with col2:
-            st.download_button(
-                label="📥 下載",
-                data=st.session_state['viewing_research_doc']['content'],
-                file_name=Path(st.session_state['viewing_research_doc']['filename']).name,
-                mime="text/markdown",
-                key="download_research_doc"
-            )
+        show_viewing_report('viewing_research_doc', "close_research_doc", "download_research_doc")
         st.markdown("---")
     
     # 輸入區
@@ -940,6 +1146,9 @@ def show_tech_researcher():
             try:
                 # 動態導入
                 from crew_modules import tech_researcher_module
+                from crew_modules.run_telemetry import RunTelemetry
+                
+                telemetry = RunTelemetry('research')
                 
                 # 根據問題生成文件名
                 import hashlib
@@ -950,7 +1159,8 @@ def show_tech_researcher():
                 result = tech_researcher_module.run_tech_researcher(
                     research_query, 
                     output_file,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    telemetry=telemetry
                 )
                 
                 # 記錄到歷史（將問題存在 input_files 中）
@@ -958,11 +1168,16 @@ def show_tech_researcher():
                     crew_type='research',
                     input_files=[research_query],
                     output_file=output_file,
-                    success=True
+                    success=True,
+                    telemetry=telemetry.to_dict()
                 )
                 
                 st.markdown('<div class="success-box">', unsafe_allow_html=True)
                 st.markdown("### ✅ 技術調研完成！")
+                st.markdown(
+                    f"**執行時間**：{telemetry.wall_time or 0:.1f} 秒 · "
+                    f"**Tokens**：{telemetry.usage['total_tokens']:,} · **估計成本**：${telemetry.estimated_cost:.4f}"
+                )
                 st.markdown(f"**研究問題**：{research_query}")
                 st.markdown(f"**輸出報告**：`{output_file}`")
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -991,7 +1206,8 @@ def show_tech_researcher():
                     input_files=[research_query],
                     output_file=output_file if 'output_file' in locals() else None,
                     success=False,
-                    error_message=str(e)
+                    error_message=str(e),
+                    telemetry=telemetry.to_dict() if 'telemetry' in locals() else None
                 )
                 
                 st.error(f"❌ 執行錯誤：{str(e)}")
@@ -1028,10 +1244,12 @@ def show_daily_tech_news():
     
     # 歷史記錄區塊
     with st.expander("📚 查看歷史記錄", expanded=False):
-        history = history_manager.get_history('daily_news', limit=20)
+        show_history_search(history_manager, 'daily_news', 'news_history_pages')
+        
+        history, has_more = load_history_pages(history_manager, 'daily_news', 'news_history_pages', page_size=20)
         
         if history:
-            st.write(f"**總共 {len(history)} 筆記錄**")
+            st.write(f"**顯示最近 {len(history)} 筆記錄**")
             
             for record in history:
                 col1, col2, col3 = st.columns([3, 2, 1])
@@ -1043,16 +1261,18 @@ def show_daily_tech_news():
                 
                 with col2:
                     output_file = record.get('output_file', '')
-                    if output_file and os.path.exists(output_file):
-                        with open(output_file, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        st.download_button(
-                            label="📥 下載報告",
-                            data=content,
-                            file_name=output_file,
-                            mime="text/markdown",
-                            key=f"download_news_{record.get('id')}"
-                        )
+                    if output_file and (record.get('report_hash') or record.get('file_exists')):
+                        try:
+                            content = load_record_report(record)
+                            st.download_button(
+                                label="📥 下載報告",
+                                data=content,
+                                file_name=output_file,
+                                mime="text/markdown",
+                                key=f"download_news_{record.get('id')}"
+                            )
+                        except (OSError, UnicodeDecodeError):
+                            st.text("報告已不存在")
                 
                 with col3:
                     if st.button("🗑️ 刪除", key=f"delete_news_{record.get('id')}"):
@@ -1060,6 +1280,8 @@ def show_daily_tech_news():
                         st.rerun()
                 
                 st.markdown("---")
+            
+            show_load_more_button('news_history_pages', has_more)
         else:
             st.info("📭 尚無歷史記錄")
     
@@ -1145,6 +1367,9 @@ def show_daily_tech_news():
             try:
                 # 動態導入
                 from crew_modules import daily_tech_news_module
+                from crew_modules.run_telemetry import RunTelemetry
+                
+                telemetry = RunTelemetry('daily_news')
                 
                 # 生成輸出文件名
                 today = datetime.now().strftime("%Y%m%d")
@@ -1155,7 +1380,8 @@ def show_daily_tech_news():
                     topics=all_topics,
                     num_articles=num_articles,
                     output_file=output_file,
-                    progress_callback=update_progress
+                    progress_callback=update_progress,
+                    telemetry=telemetry
                 )
                 
                 # 記錄到歷史
@@ -1163,11 +1389,16 @@ def show_daily_tech_news():
                     crew_type='daily_news',
                     input_files=[f"主題: {', '.join(all_topics)} ({num_articles} 篇)"],
                     output_file=output_file,
-                    success=True
+                    success=True,
+                    telemetry=telemetry.to_dict()
                 )
                 
                 st.markdown('<div class="success-box">', unsafe_allow_html=True)
                 st.markdown("### ✅ AI 技術新聞搜尋完成！")
+                st.markdown(
+                    f"**執行時間**：{telemetry.wall_time or 0:.1f} 秒 · "
+                    f"**Tokens**：{telemetry.usage['total_tokens']:,} · **估計成本**：${telemetry.estimated_cost:.4f}"
+                )
                 st.markdown(f"**文章數量**：{num_articles} 篇")
                 st.markdown(f"**涵蓋領域**：AI、Machine Learning、LLM、Generative AI 等")
                 st.markdown(f"**輸出報告**：`{output_file}`")
@@ -1197,7 +1428,8 @@ def show_daily_tech_news():
                     input_files=[f"主題: {', '.join(all_topics)} ({num_articles} 篇)"],
                     output_file=output_file if 'output_file' in locals() else None,
                     success=False,
-                    error_message=str(e)
+                    error_message=str(e),
+                    telemetry=telemetry.to_dict() if 'telemetry' in locals() else None
                 )
                 
                 st.error(f"❌ 執行錯誤：{str(e)}")
@@ -1427,6 +1659,77 @@ def show_settings():
     
     st.markdown("---")
     
+    st.markdown("### 📈 執行統計")
+    from crew_modules.history_manager import history_manager
+    
+    stats_rows = []
+    for crew_type, stats in history_manager.get_statistics().items():
+        stats_rows.append({
+            "類型": crew_type,
+            "執行次數": stats["total"],
+            "成功率": stats["success_rate"],
+            "p50 (秒)": stats["p50_seconds"],
+            "p95 (秒)": stats["p95_seconds"],
+            "p99 (秒)": stats["p99_seconds"],
+            "平均 Tokens": stats["avg_tokens"],
+            "工具呼叫": stats["tool_calls"],
+            "估計成本 (USD)": stats["estimated_cost"]
+        })
+    if stats_rows:
+        st.dataframe(stats_rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("尚無歷史紀錄")
+    
+    st.markdown("---")
+    
+    st.markdown("### 🔐 登入 Session")
+    from auth_manager import session_service
+    
+    session_counts = session_service.session_counts()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("有效 Session", session_counts["live"])
+    with col2:
+        st.metric("已過期（待清除）", session_counts["expired"])
+    
+    from login_throttle import login_throttle
+    throttle_metrics = login_throttle.metrics()
+    st.caption(
+        f"登入節流：允許 {throttle_metrics['allowed']} 次、"
+        f"拒絕 {throttle_metrics['throttled']} 次（帳號 {throttle_metrics['throttled_account']}／"
+        f"用戶端 {throttle_metrics['throttled_client']}），"
+        f"追蹤中 {throttle_metrics['tracked_accounts']} 個帳號、{throttle_metrics['tracked_clients']} 個用戶端"
+    )
+    
+    st.markdown("---")
+    
+    st.markdown("### 🧹 儲存空間清理")
+    from crew_modules.retention import retention_manager, format_bytes
+    
+    policy = retention_manager.policy
+    st.caption(
+        f"保留天數：{policy.max_age_days or '不限'}　"
+        f"每類最多：{policy.max_records_per_type or '不限'} 筆　"
+        f"容量上限：{format_bytes(policy.max_total_bytes) if policy.max_total_bytes else '不限'}　"
+        f"暫存檔保留：{policy.temp_file_max_age_hours or '不限'} 小時　"
+        f"背景清理：{f'每 {policy.background_interval_hours:g} 小時' if policy.background_interval_hours else '關閉'}"
+    )
+    
+    if st.button("🧹 立即清理"):
+        with st.spinner("清理中..."):
+            retention_manager.run()
+    
+    report = retention_manager.last_report
+    if report:
+        st.info(
+            f"上次清理（{history_manager.format_timestamp(report['finished_at'])}）："
+            f"刪除 {report['records']} 筆紀錄、{report['reports']} 份報告、"
+            f"{report['output_files']} 個輸出檔案、{report['temp_files']} 個暫存檔、"
+            f"{report['news_articles']} 篇已讀文章，共回收 {format_bytes(report['reclaimed_bytes'])}"
+        )
+    
+    st.markdown("---")
+    
     st.markdown("### 🔄 重新載入設定")
     if st.button("重新載入環境變數"):
         from dotenv import load_dotenv
@@ -1449,6 +1752,10 @@ def show_settings():
 
 # 主程式
 def main():
+    # 設定 RETENTION_INTERVAL_HOURS 時才在背景定期清理（重複呼叫只會有一個執行緒）
+    from crew_modules.retention import retention_manager
+    retention_manager.start_background()
+    
     # 🔐 要求身份驗證
     if not require_authentication():
         return
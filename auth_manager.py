@@ -4,146 +4,163 @@ Authentication Module
 """
 
 import streamlit as st
+import ipaddress
 import os
 from pathlib import Path
-import json
-from datetime import datetime, timedelta
-import hashlib
+from datetime import datetime
+from user_store import create_user_store
+from session_store import SessionService
+from password_hashing import password_hasher, PasswordHasherBusy
+from login_throttle import login_throttle
 
 
 # 用戶資料存儲文件
 USERS_FILE = "users_db.json"
 SESSIONS_FILE = "sessions.json"
 
+# 使用者儲存（預設 SQLite，以 email 為主鍵；第一次啟動時匯入 users_db.json）
+user_store = create_user_store(users_file=USERS_FILE)
 
-def load_users():
-    """載入用戶資料"""
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {"users": []}
-    return {"users": []}
-
-
-def save_users(users_data):
-    """儲存用戶資料"""
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users_data, f, ensure_ascii=False, indent=2)
-
-
-def load_sessions():
-    """載入 session 資料"""
-    if os.path.exists(SESSIONS_FILE):
-        try:
-            with open(SESSIONS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {"sessions": []}
-    return {"sessions": []}
-
-
-def save_sessions(sessions_data):
-    """儲存 session 資料"""
-    with open(SESSIONS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(sessions_data, f, ensure_ascii=False, indent=2)
+# Session 服務（行程內 TTL 快取 + sessions.db；第一次啟動時匯入 sessions.json）
+session_service = SessionService(legacy_json=SESSIONS_FILE)
+# 背景定期批次清除過期的 session
+session_service.start_sweeper()
 
 
 def hash_password(password):
-    """密碼雜湊"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """密碼雜湊（PBKDF2，在有上限的工作執行緒池中計算）"""
+    return password_hasher.hash(password)
 
 
 def verify_password(password, hashed):
     """驗證密碼"""
-    return hash_password(password) == hashed
+    return password_hasher.verify(password, hashed)[0]
 
 
 def add_user(email, password, name=None, google_id=None):
     """新增用戶"""
-    users_data = load_users()
-    
-    # 檢查是否已存在
-    for user in users_data["users"]:
-        if user["email"] == email:
-            return False, "此電子郵件已被註冊"
+    try:
+        hashed = hash_password(password) if password else None
+    except PasswordHasherBusy as e:
+        return False, str(e)
     
-    # 新增用戶
     new_user = {
         "email": email,
-        "password": hash_password(password) if password else None,
+        "password": hashed,
         "name": name or email.split('@')[0],
         "google_id": google_id,
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "last_login": None
     }
     
-    users_data["users"].append(new_user)
-    save_users(users_data)
+    # 唯一性由儲存層保證（email 主鍵），不需要先掃描所有用戶
+    if not user_store.add_user(new_user):
+        return False, "此電子郵件已被註冊"
     return True, "註冊成功"
 
 
 def authenticate_user(email, password):
     """驗證用戶"""
-    users_data = load_users()
+    user = user_store.get_user(email)
+    if user is None:
+        return False, "用戶不存在"
     
-    for user in users_data["users"]:
-        if user["email"] == email:
-            if user["password"] and verify_password(password, user["password"]):
-                # 更新最後登入時間
-                user["last_login"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                save_users(users_data)
-                return True, user
-            else:
-                return False, "密碼錯誤"
+    try:
+        valid, needs_rehash = password_hasher.verify(password, user["password"])
+    except PasswordHasherBusy as e:
+        return False, str(e)
     
-    return False, "用戶不存在"
+    if valid:
+        # 舊版 SHA-256 或迭代次數過低的雜湊，在登入成功時換成目前的參數（忙碌時留到下次登入）
+        if needs_rehash:
+            try:
+                user_store.update_user(email, password=hash_password(password))
+            except PasswordHasherBusy:
+                pass
+        
+        # 最後登入時間延遲批次寫回，登入本身不需要寫入
+        user["last_login"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        user_store.record_login(email, user["last_login"])
+        return True, user
+    else:
+        return False, "密碼錯誤"
 
 
 def create_session(user_email):
     """創建 session"""
-    sessions_data = load_sessions()
-    
-    session_id = hashlib.sha256(f"{user_email}{datetime.now()}".encode()).hexdigest()
-    
-    new_session = {
-        "session_id": session_id,
-        "email": user_email,
-        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "expires_at": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
-    }
-    
-    sessions_data["sessions"].append(new_session)
-    save_sessions(sessions_data)
-    
-    return session_id
+    return session_service.create(user_email)
 
 
 def verify_session(session_id):
-    """驗證 session"""
-    sessions_data = load_sessions()
-    
-    for session in sessions_data["sessions"]:
-        if session["session_id"] == session_id:
-            expires_at = datetime.strptime(session["expires_at"], "%Y-%m-%d %H:%M:%S")
-            if expires_at > datetime.now():
-                return True, session["email"]
-            else:
-                # Session 過期，刪除
-                sessions_data["sessions"].remove(session)
-                save_sessions(sessions_data)
-                return False, "Session 已過期"
-    
-    return False, "無效的 session"
+    """驗證 session（快取命中時不讀取磁碟）"""
+    return session_service.verify(session_id)
 
 
 def logout_user(session_id):
     """登出用戶"""
-    sessions_data = load_sessions()
+    session_service.delete(session_id)
+
+
+def _parse_trusted_proxies(value: str) -> list:
+    """解析 TRUSTED_PROXIES（逗號分隔的 IP 或 CIDR）"""
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            print(f"忽略無效的 TRUSTED_PROXIES 設定：{item}")
+    return networks
+
+
+# 反向代理的位址；只有連線來自這些位址時才採用 X-Forwarded-For（未設定時一律不採用）
+TRUSTED_PROXIES = _parse_trusted_proxies(os.getenv("TRUSTED_PROXIES", ""))
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    """位址是否屬於 TRUSTED_PROXIES"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def _session_client_id():
+    """取不到 IP 時以 Streamlit session ID 識別用戶端"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        return None
+    return f"session:{ctx.session_id}" if ctx else None
+
+
+def get_client_id():
+    """
+    取得登入節流用的用戶端識別
+    
+    X-Forwarded-For 可由用戶端任意偽造，只有連線來自受信任的代理時才採用，
+    並由右往左取第一個不屬於受信任代理的位址；其餘情況使用連線位址，取不到時改用 session ID
+    """
+    context = getattr(st, "context", None)
+    ip_address = getattr(context, "ip_address", None) if context is not None else None
     
-    sessions_data["sessions"] = [s for s in sessions_data["sessions"] if s["session_id"] != session_id]
-    save_sessions(sessions_data)
+    # Streamlit 對 localhost 的連線回傳 None，同一台主機上的代理需在 TRUSTED_PROXIES 設定 127.0.0.1
+    peer = ip_address or "127.0.0.1"
+    if context is not None and TRUSTED_PROXIES and _is_trusted_proxy(peer):
+        headers = getattr(context, "headers", None) or {}
+        hops = [hop.strip() for hop in headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not _is_trusted_proxy(hop):
+                return hop
+        # 整條鏈都是受信任的代理時，最左邊的就是用戶端
+        if hops:
+            return hops[0]
+    
+    return ip_address or _session_client_id()
 
 
 def init_session_state():
@@ -194,7 +211,13 @@ def show_login_page():
             
             if st.button("🔑 登入", type="primary", use_container_width=True):
                 if email and password:
-                    success, result = authenticate_user(email, password)
+                    # 在讀取用戶資料與計算雜湊之前先檢查嘗試次數
+                    allowed, retry_after = login_throttle.allow(email, get_client_id())
+                    if allowed:
+                        success, result = authenticate_user(email, password)
+                    else:
+                        success, result = False, f"登入嘗試次數過多，請 {int(retry_after) + 1} 秒後再試"
+                    
                     if success:
                         session_id = create_session(email)
                         st.session_state.authenticated = True
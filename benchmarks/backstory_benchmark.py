@@ -0,0 +1,123 @@
+"""
+Backstory Benchmark
+比較 Agent backstory 組合在快取前後的成本，以及它在建立 Crew 時所佔的比例
+
+用法：
+    python benchmarks/backstory_benchmark.py --runs 2000
+"""
+
+import argparse
+import configparser
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crew_modules.prompt_manager import PromptManager
+
+
+# 與各 Crew 模組相同的 (section, key) 組合；backstory 長度接近實際的字串常數
+AGENT_PROMPTS = [
+    ('DOCUMENTATION_CREW', 'senior_dev_prompt'),
+    ('DOCUMENTATION_CREW', 'tech_writer_prompt'),
+    ('REFACTORING_CREW', 'security_auditor_prompt'),
+    ('REFACTORING_CREW', 'clean_code_reviewer_prompt'),
+    ('REFACTORING_CREW', 'refactoring_specialist_prompt'),
+    ('TECH_RESEARCHER', 'research_analyst_prompt'),
+    ('TECH_RESEARCHER', 'comparison_expert_prompt'),
+    ('TECH_RESEARCHER', 'strategy_advisor_prompt'),
+    ('DAILY_TECH_NEWS', 'news_hunter_prompt'),
+    ('DAILY_TECH_NEWS', 'content_analyzer_prompt'),
+    ('DAILY_TECH_NEWS', 'report_writer_prompt'),
+]
+BACKSTORIES = {
+    prompt: f"You are the {prompt[1].replace('_prompt', '').replace('_', ' ')} of this crew. " * 8
+    for prompt in AGENT_PROMPTS
+}
+
+
+def uncached_backstory(config, section, key, original_backstory):
+    """原本的做法：每次都從 ConfigParser 讀取並串接"""
+    global_rules = config['GLOBAL_RULES'].get('global_prompt', '') if 'GLOBAL_RULES' in config else ''
+    custom_prompt = config[section].get(key, '') if section in config else ''
+    
+    enhanced = original_backstory
+    if global_rules.strip():
+        enhanced += f"\n\n{global_rules}"
+    if custom_prompt.strip():
+        enhanced += f"\n\n{custom_prompt}"
+    return enhanced
+
+
+def measure(label, func, runs):
+    """執行 runs 次 func，印出每次平均耗時"""
+    started = time.perf_counter()
+    for _ in range(runs):
+        func()
+    elapsed = time.perf_counter() - started
+    per_run = elapsed / runs * 1e6
+    print(f"{label:<32} {per_run:10.2f} µs / crew")
+    return per_run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backstory 組合成本 benchmark")
+    parser.add_argument("--config", default="custom_prompts.ini", help="要測試的 prompts 設定檔")
+    parser.add_argument("--runs", type=int, default=2000, help="模擬建立 Crew 的次數")
+    args = parser.parse_args()
+    
+    # 複製一份設定檔，避免 PromptManager 在測試時改寫原檔
+    work_dir = tempfile.mkdtemp()
+    config_file = os.path.join(work_dir, "custom_prompts.ini")
+    if os.path.exists(args.config):
+        shutil.copy(args.config, config_file)
+    
+    try:
+        config = configparser.ConfigParser()
+        config.read(config_file, encoding='utf-8')
+        manager = PromptManager(config_file)
+        
+        def before():
+            for section, key in AGENT_PROMPTS:
+                uncached_backstory(config, section, key, BACKSTORIES[(section, key)])
+        
+        def after():
+            for section, key in AGENT_PROMPTS:
+                manager.get_enhanced_backstory(section, key, BACKSTORIES[(section, key)])
+        
+        print(f"{len(AGENT_PROMPTS)} 個 Agent，{args.runs} 次")
+        before_us = measure("before（每次重新組合）", before, args.runs)
+        after_us = measure("after（依設定版本快取）", after, args.runs)
+        print(f"{'加速':<32} {before_us / after_us:10.1f} x")
+        
+        try:
+            from crewai import Agent
+        except ImportError:
+            print("未安裝 crewai，略過 Agent 建立的量測")
+            return
+        
+        def build_agents(compose):
+            for section, key in AGENT_PROMPTS:
+                Agent(role=key, goal="benchmark", backstory=compose(section, key), allow_delegation=False)
+        
+        agent_runs = max(args.runs // 100, 5)
+        build_before = measure(
+            "Agent 建立 + before",
+            lambda: build_agents(lambda s, k: uncached_backstory(config, s, k, BACKSTORIES[(s, k)])),
+            agent_runs
+        )
+        build_after = measure(
+            "Agent 建立 + after",
+            lambda: build_agents(lambda s, k: manager.get_enhanced_backstory(s, k, BACKSTORIES[(s, k)])),
+            agent_runs
+        )
+        print(f"{'backstory 佔 Crew 建立的比例':<32} {before_us / build_before:10.2%} → {after_us / build_after:.2%}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
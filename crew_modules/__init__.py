@@ -8,6 +8,9 @@ from .tech_researcher_module import run_tech_researcher
 from . import file_utils
 from . import file_picker
 from . import history_manager
+from . import watch_mode
+from . import symbol_index
+from . import context_retriever
 
 __all__ = [
     'run_documentation_crew',
@@ -15,5 +18,8 @@ __all__ = [
     'run_tech_researcher',
     'file_utils',
     'file_picker',
-    'history_manager'
+    'history_manager',
+    'watch_mode',
+    'symbol_index',
+    'context_retriever'
 ]
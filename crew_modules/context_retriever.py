@@ -0,0 +1,466 @@
+"""
+Context Retriever Module
+在本地以 hashing TF-IDF 向量挑選與任務最相關的程式碼片段，控制在 token 預算內
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+from filelock import FileLock, Timeout
+
+from .secret_scanner import read_file_redacted
+from .symbol_index import SymbolIndex, parse_symbols
+
+
+DEFAULT_N_FEATURES = 1024
+DEFAULT_CHUNK_LINES = 80
+# .context_cache 底下最多保留幾組文件集合的快取（依最近使用時間淘汰）
+DEFAULT_MAX_CACHED_CORPORA = 32
+CACHE_VERSION = 1
+# 符號索引（所有文件的簽名大綱）存放在快取目錄中的檔名
+SYMBOL_INDEX_FILE = "symbols.db"
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|[0-9]+|[^\x00-\x7f]')
+_CAMEL_SPLIT = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗估文字的 token 數（英文與程式碼約 4 個字元一個 token）
+    
+    Args:
+        text: 文字內容
+    
+    Returns:
+        估計的 token 數
+    """
+    return max(1, len(text) // 4)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    將程式碼切成詞彙：保留完整識別字，並拆出 snake_case / camelCase 的子詞
+    
+    Args:
+        text: 文字內容
+    
+    Returns:
+        小寫詞彙列表
+    """
+    tokens = []
+    for word in _IDENTIFIER.findall(text):
+        lower = word.lower()
+        tokens.append(lower)
+        if '_' in word or not word.islower():
+            parts = [p.lower() for piece in word.split('_') for p in _CAMEL_SPLIT.findall(piece)]
+            if len(parts) > 1:
+                tokens.extend(parts)
+    return tokens
+
+
+def hash_vector(tokens: List[str], n_features: int = DEFAULT_N_FEATURES) -> np.ndarray:
+    """
+    把詞彙映射到固定維度的向量（hashing trick，sublinear TF）
+    
+    Args:
+        tokens: 詞彙列表
+        n_features: 向量維度
+    
+    Returns:
+        float32 向量
+    """
+    vector = np.zeros(n_features, dtype=np.float32)
+    for token, count in Counter(tokens).items():
+        h = zlib.crc32(token.encode('utf-8'))
+        # 最高位元決定正負號，減少碰撞造成的偏差
+        sign = 1.0 if h & 0x80000000 else -1.0
+        vector[h % n_features] += sign * (1.0 + math.log(count))
+    return vector
+
+
+def chunk_source(file_path: str, source: str, max_lines: int = DEFAULT_CHUNK_LINES) -> List[Dict]:
+    """
+    依照頂層函數 / 類別切分程式碼，過大的類別再拆成方法，其餘部分以固定行數切分
+    
+    Args:
+        file_path: 文件路徑
+        source: 原始碼
+        max_lines: 單一片段的最大行數
+    
+    Returns:
+        片段列表，每筆包含 path、start_line、end_line、text
+    """
+    lines = source.splitlines()
+    ranges = []
+    
+    try:
+        symbols, _ = parse_symbols(source)
+        top_level = [s for s in symbols if s["kind"] != "module" and '.' not in s["qualname"]]
+        for symbol in top_level:
+            size = symbol["end_line"] - symbol["start_line"] + 1
+            methods = [s for s in symbols if s["qualname"].startswith(symbol["qualname"] + '.')
+                       and s["qualname"].count('.') == 1]
+            if symbol["kind"] == "class" and size > max_lines and methods:
+                # 類別標頭（到第一個方法前）自成一段
+                ranges.append((symbol["start_line"], methods[0]["start_line"] - 1))
+                ranges.extend((m["start_line"], m["end_line"]) for m in methods)
+            else:
+                ranges.append((symbol["start_line"], symbol["end_line"]))
+    except SyntaxError:
+        ranges = []
+    
+    # 補上沒有被符號涵蓋的行（import、常數、腳本程式碼）
+    covered = set()
+    for start, end in ranges:
+        covered.update(range(start, end + 1))
+    
+    gap_start = None
+    for line_no in range(1, len(lines) + 2):
+        in_gap = line_no <= len(lines) and line_no not in covered
+        if in_gap and gap_start is None:
+            gap_start = line_no
+        elif not in_gap and gap_start is not None:
+            ranges.append((gap_start, line_no - 1))
+            gap_start = None
+    
+    chunks = []
+    for start, end in sorted(ranges):
+        for window_start in range(start, end + 1, max_lines):
+            window_end = min(end, window_start + max_lines - 1)
+            text = "\n".join(lines[window_start - 1:window_end])
+            if text.strip():
+                chunks.append({
+                    "path": file_path,
+                    "start_line": window_start,
+                    "end_line": window_end,
+                    "text": text
+                })
+    return chunks
+
+
+class ContextRetriever:
+    """以快取的 TF-IDF 矩陣做向量化相似度搜尋，依 token 預算挑選程式碼片段"""
+    
+    def __init__(
+        self,
+        cache_dir: str = ".context_cache",
+        n_features: int = DEFAULT_N_FEATURES,
+        max_chunk_lines: int = DEFAULT_CHUNK_LINES,
+        max_cached_corpora: int = DEFAULT_MAX_CACHED_CORPORA
+    ):
+        """
+        初始化檢索器
+        
+        Args:
+            cache_dir: 快取目錄
+            n_features: hashing 向量維度
+            max_chunk_lines: 單一片段的最大行數
+            max_cached_corpora: 快取目錄中最多保留的文件集合數
+        """
+        self.cache_dir = cache_dir
+        self.n_features = n_features
+        self.max_chunk_lines = max_chunk_lines
+        self.max_cached_corpora = max_cached_corpora
+        self.chunks: List[Dict] = []
+        # 讀取失敗而略過的文件：{路徑: 錯誤訊息}
+        self.errors: Dict[str, str] = {}
+        self.matrix: Optional[np.ndarray] = None
+        self.idf: Optional[np.ndarray] = None
+    
+    def _corpus_dir(self, file_paths: List[str]) -> str:
+        """同一組文件共用一個快取目錄"""
+        key = hashlib.blake2b("\n".join(sorted(file_paths)).encode('utf-8'), digest_size=8).hexdigest()
+        return os.path.join(self.cache_dir, key)
+    
+    def _cache_lock(self, corpus_dir: str) -> FileLock:
+        """同一個快取目錄的讀寫鎖（跨行程）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return FileLock(corpus_dir + ".lock", timeout=30)
+    
+    def _load_cache(self, corpus_dir: str):
+        """載入先前的快取（metadata 與 TF 矩陣）"""
+        meta_path = os.path.join(corpus_dir, "chunks.json")
+        try:
+            with self._cache_lock(corpus_dir):
+                if not os.path.exists(meta_path):
+                    return None, None
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                if meta.get("version") != CACHE_VERSION or meta.get("n_features") != self.n_features:
+                    return None, None
+                tf = np.load(os.path.join(corpus_dir, "tf.npy"), mmap_mode='r')
+            # 矩陣列數與片段數不一致表示快取不完整，整個重建
+            if tf.shape[0] != len(meta["chunks"]):
+                return None, None
+            return meta, tf
+        except Exception as e:
+            print(f"載入檢索快取失敗：{e}")
+            return None, None
+    
+    @staticmethod
+    def _load_matrix(corpus_dir: str, n_chunks: int):
+        """載入 IDF 與 TF-IDF 矩陣；檔案不存在或列數與片段數不一致時返回 (None, None)"""
+        try:
+            idf = np.load(os.path.join(corpus_dir, "idf.npy"))
+            matrix = np.load(os.path.join(corpus_dir, "tfidf.npy"), mmap_mode='r')
+        except OSError:
+            return None, None
+        if matrix.shape[0] != n_chunks:
+            return None, None
+        return idf, matrix
+    
+    def build(self, file_paths: List[str]) -> 'ContextRetriever':
+        """
+        建立或增量更新文件集合的向量索引（只重新向量化內容有變更的文件）
+        
+        Args:
+            file_paths: 文件路徑列表
+        
+        Returns:
+            self，方便串接 select
+        """
+        file_paths = [os.path.abspath(p) for p in file_paths]
+        corpus_dir = self._corpus_dir(file_paths)
+        old_meta, old_tf = self._load_cache(corpus_dir)
+        
+        old_files = old_meta["files"] if old_meta else {}
+        chunks = []
+        rows = []
+        files_meta = {}
+        changed = False
+        
+        for file_path in file_paths:
+            try:
+                with open(file_path, 'rb') as f:
+                    content_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            except OSError:
+                continue
+            
+            cached = old_files.get(file_path)
+            if cached and cached["hash"] == content_hash:
+                # 沒有變更：直接沿用快取中的片段與 TF 列
+                row_start, row_end = cached["rows"]
+                file_chunks = old_meta["chunks"][row_start:row_end]
+                rows.append(np.asarray(old_tf[row_start:row_end]))
+            else:
+                # 與 read_files_content 相同，先遮蔽敏感資訊再切片；單一文件失敗只略過該文件
+                try:
+                    source, _ = read_file_redacted(file_path)
+                    file_chunks = chunk_source(file_path, source, self.max_chunk_lines)
+                except Exception as e:
+                    self.errors[file_path] = str(e)
+                    continue
+                changed = True
+                for chunk in file_chunks:
+                    chunk["tokens"] = estimate_tokens(chunk["text"])
+                vectors = [hash_vector(tokenize(c["text"]), self.n_features) for c in file_chunks]
+                rows.append(np.vstack(vectors) if vectors else np.zeros((0, self.n_features), dtype=np.float32))
+            
+            files_meta[file_path] = {"hash": content_hash, "rows": [len(chunks), len(chunks) + len(file_chunks)]}
+            chunks.extend(file_chunks)
+        
+        if set(files_meta) != set(old_files):
+            changed = True
+        
+        tf = np.vstack(rows) if rows else np.zeros((0, self.n_features), dtype=np.float32)
+        
+        # 查詢時以 memory-map 讀取正規化後的 TF-IDF 矩陣；
+        # 寫入與讀取在同一個鎖內，避免讀到其他行程剛換上的另一份快取
+        with self._cache_lock(corpus_dir):
+            idf, matrix = None, None
+            if not changed and old_meta is not None:
+                idf, matrix = self._load_matrix(corpus_dir, len(chunks))
+            if matrix is None:
+                self._save_cache(corpus_dir, tf, chunks, files_meta)
+                idf, matrix = self._load_matrix(corpus_dir, len(chunks))
+            else:
+                # 目錄的修改時間作為最近使用時間，淘汰時保留常用的快取
+                os.utime(corpus_dir)
+        
+        if matrix is not None and changed:
+            self._evict_old_corpora(corpus_dir)
+        
+        self.chunks = chunks
+        self.idf = idf
+        self.matrix = matrix
+        return self
+    
+    def _save_cache(self, corpus_dir: str, tf: np.ndarray, chunks: List[Dict], files_meta: Dict):
+        """
+        計算 IDF 與正規化矩陣並寫入快取
+        
+        整組檔案先寫到暫存目錄，再以 os.replace 換上，讀取端不會看到新舊混雜的檔案；
+        呼叫端需持有 _cache_lock
+        """
+        n_docs = tf.shape[0]
+        df = np.count_nonzero(tf, axis=0)
+        idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+        
+        tfidf = tf * idf
+        norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        tfidf = (tfidf / norms).astype(np.float32)
+        
+        tmp_dir = f"{corpus_dir}.{os.getpid()}.tmp"
+        old_dir = f"{corpus_dir}.{os.getpid()}.old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        
+        np.save(os.path.join(tmp_dir, "tf.npy"), tf.astype(np.float32))
+        np.save(os.path.join(tmp_dir, "idf.npy"), idf)
+        np.save(os.path.join(tmp_dir, "tfidf.npy"), tfidf)
+        with open(os.path.join(tmp_dir, "chunks.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": CACHE_VERSION,
+                "n_features": self.n_features,
+                "files": files_meta,
+                "chunks": chunks
+            }, f, ensure_ascii=False)
+        
+        # 目錄無法直接覆蓋非空目錄：先把舊快取移開再換上新的，已 memory-map 的舊檔案不受影響
+        if os.path.exists(corpus_dir):
+            os.replace(corpus_dir, old_dir)
+        os.replace(tmp_dir, corpus_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    
+    def _evict_old_corpora(self, keep: str):
+        """刪除最久沒有使用的文件集合快取，只保留 max_cached_corpora 組"""
+        try:
+            corpora = [
+                entry for entry in os.scandir(self.cache_dir)
+                if entry.is_dir() and '.' not in entry.name and entry.path != keep
+            ]
+        except OSError:
+            return
+        
+        corpora.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in corpora[max(self.max_cached_corpora - 1, 0):]:
+            # 其他行程正在使用的快取先跳過，下次再淘汰；鎖檔保留，避免與等待中的行程競爭
+            try:
+                with FileLock(entry.path + ".lock", timeout=0):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except Timeout:
+                continue
+    
+    def select(self, query: str, token_budget: int) -> List[Dict]:
+        """
+        依相似度由高到低挑選片段，直到填滿 token 預算
+        
+        Args:
+            query: 任務目標描述
+            token_budget: token 預算
+        
+        Returns:
+            挑中的片段（依文件與行號排序），每筆附上 score
+        """
+        if self.matrix is None or not self.chunks:
+            return []
+        
+        query_vector = hash_vector(tokenize(query), self.n_features) * self.idf
+        norm = np.linalg.norm(query_vector)
+        if norm > 0:
+            query_vector /= norm
+        
+        # 一次矩陣乘法算出所有片段的 cosine 相似度
+        scores = self.matrix @ query_vector
+        
+        # 依完整排名逐一嘗試：前面的大片段放不下時，後面較小的片段仍可能放得進預算
+        min_tokens = min(c["tokens"] for c in self.chunks)
+        positive = np.flatnonzero(scores > 0)
+        candidates = positive[np.argsort(-scores[positive], kind='stable')]
+        
+        selected = []
+        used = 0
+        for index in candidates:
+            if token_budget - used < min_tokens:
+                break
+            chunk = self.chunks[int(index)]
+            if used + chunk["tokens"] > token_budget:
+                continue
+            selected.append({**chunk, "score": float(scores[index])})
+            used += chunk["tokens"]
+        
+        return sorted(selected, key=lambda c: (c["path"], c["start_line"]))
+
+
+def render_chunks(chunks: List[Dict]) -> str:
+    """
+    將片段格式化為 prompt 內容，格式與 read_files_content 一致
+    
+    Args:
+        chunks: select 的結果
+    
+    Returns:
+        格式化的程式碼內容
+    """
+    results = []
+    for chunk in chunks:
+        results.append(
+            f"\n{'='*80}\nFile: {chunk['path']} (lines {chunk['start_line']}-{chunk['end_line']})\n{'='*80}\n\n"
+            f"{chunk['text']}\n"
+        )
+    return "\n".join(results)
+
+
+def build_symbol_outline(file_paths: List[str], cache_dir: str = ".context_cache") -> str:
+    """
+    以符號索引產生所有 Python 文件的大綱（簽名、docstring 摘要與行號範圍）
+    
+    Args:
+        file_paths: 文件路徑列表
+        cache_dir: 快取目錄（符號索引依內容雜湊增量更新）
+    
+    Returns:
+        大綱文字，沒有 Python 文件時為空字串
+    """
+    python_files = [path for path in file_paths if path.endswith('.py')]
+    if not python_files:
+        return ""
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    index = SymbolIndex(os.path.join(cache_dir, SYMBOL_INDEX_FILE))
+    stats = index.index_paths(python_files, recursive=False)
+    # 無法解析的文件（語法錯誤等）不放進大綱，內容仍由片段檢索處理
+    failed = {error.split(": ", 1)[0] for error in stats["errors"]}
+    return index.build_outline([path for path in python_files if os.path.abspath(path) not in failed])
+
+
+def select_context(file_paths: List[str], query: str, token_budget: int, cache_dir: str = ".context_cache") -> str:
+    """
+    便利函數：建立（或載入）索引並返回預算內最相關的程式碼內容
+    
+    片段檢索只會挑出部分程式碼，先附上所有文件的符號大綱，讓模型仍能看到整體結構；
+    大綱超過預算一半時省略，其餘預算留給片段
+    
+    Args:
+        file_paths: 文件路徑列表
+        query: 任務目標描述
+        token_budget: token 預算
+        cache_dir: 快取目錄
+    
+    Returns:
+        格式化的程式碼內容
+    """
+    retriever = ContextRetriever(cache_dir=cache_dir).build(file_paths)
+    
+    outline = build_symbol_outline(file_paths, cache_dir)
+    if estimate_tokens(outline) > token_budget // 2:
+        outline = ""
+    
+    content = render_chunks(retriever.select(query, token_budget - estimate_tokens(outline)))
+    if outline:
+        content = f"\n{'='*80}\nOutline of all files (signatures and line ranges)\n{'='*80}\n\n{outline}\n\n{content}"
+    # 讀取失敗的文件與 read_files_content 一樣以錯誤項目呈現
+    errors = [
+        f"\n{'='*80}\nFile: {path}\nError: {error}\n{'='*80}\n"
+        for path, error in retriever.errors.items()
+    ]
+    return "\n".join([content] + errors) if errors else content
@@ -8,11 +8,14 @@ import json
 import threading
 import time
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
+from filelock import FileLock
 from crewai import Agent, Task, Crew, Process, LLM
 from crewai_tools import SerperDevTool, ScrapeWebsiteTool
 from .prompt_manager import prompt_manager
+from .run_telemetry import RunTelemetry
+from .prompt_layout import layout_task, task_prompts, prefix_cache_tracker
 
 load_dotenv()
 
@@ -30,29 +33,32 @@ def load_read_articles():
 
 
 def save_read_articles(articles_data):
-    """儲存已讀文章記錄"""
+    """儲存已讀文章記錄（與 retention 清理共用檔案鎖，並以原子替換寫入）"""
     history_file = "tech_news_history.json"
-    with open(history_file, 'w', encoding='utf-8') as f:
-        json.dump(articles_data, f, ensure_ascii=False, indent=2)
+    with FileLock(history_file + ".lock", timeout=30):
+        tmp_path = f"{history_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(articles_data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, history_file)
 
 
-def run_daily_tech_news(
+def build_daily_tech_news_tasks(
     topics: list = None,
     num_articles: int = 7,
     output_file: str = None,
-    progress_callback: Optional[callable] = None
-):
+    read_urls: Optional[List[str]] = None
+) -> List[Task]:
     """
-    執行每日技術新聞抓取與分析
+    建立每日技術新聞 Crew 的 Agents 與 Tasks（不執行）
     
     Args:
         topics: 感興趣的主題列表（預設為 AI 相關主題）
         num_articles: 要找的文章數量（預設 7 篇）
         output_file: 輸出的報告文件名
-        progress_callback: 進度回調函數
+        read_urls: 要排除的已讀文章 URL（None 表示從已讀記錄載入）
         
     Returns:
-        執行結果
+        依執行順序排列的 Tasks（task.agent 為負責的 Agent）
     """
     
     # 預設主題 - 專注於 AI 領域
@@ -81,8 +87,9 @@ def run_daily_tech_news(
     scrape_tool = ScrapeWebsiteTool()
     
     # 載入已讀文章
-    history_data = load_read_articles()
-    read_urls = [article.get('url', '') for article in history_data.get('articles', [])]
+    if read_urls is None:
+        history_data = load_read_articles()
+        read_urls = [article.get('url', '') for article in history_data.get('articles', [])]
     
     # Agent 1: News Hunter (新聞獵人)
     news_hunter_backstory = """You are an expert AI and technology news curator with a keen eye for finding 
@@ -100,7 +107,7 @@ def run_daily_tech_news(
     
     news_hunter = Agent(
         role='AI News Hunter',
-        goal=f'Find {num_articles} fresh, high-quality AI/ML articles about: {", ".join(topics[:5])}',
+        goal='Find fresh, high-quality AI/ML articles about the topics given in the task',
         backstory=enhanced_hunter_backstory,
         tools=[search_tool, scrape_tool],
         llm=fast_llm,
@@ -108,9 +115,6 @@ def run_daily_tech_news(
         allow_delegation=False
     )
     
-    if progress_callback:
-        progress_callback("Tech News Hunter", "running", 3, 0)
-    
     # Agent 2: Content Analyzer (內容分析師)
     content_analyzer_backstory = """You are an AI/ML technical content analyst who specializes in 
         reading and summarizing AI research papers and technical articles. You can quickly extract 
@@ -162,10 +166,14 @@ def run_daily_tech_news(
     if len(read_urls) > 50:
         read_urls_str += f"\n  ... 以及其他 {len(read_urls) - 50} 篇文章"
     
+    # 文章數量、主題、已讀 URL 與日期每次執行都不同，放在各 Task 的 inputs 區塊（最後），
+    # 靜態指示在前，每次執行的 prompt 前綴相同，可命中 provider 的 prefix cache
+    now = datetime.now()
+    
     # Task 1: 搜尋新文章
     search_task = Task(
-        description=f"""Search for {num_articles} NEW and UNIQUE AI/Machine Learning articles published recently 
-        (within the last 3-7 days) about the following AI topics: {", ".join(topics[:10])}.
+        description=layout_task("""Search for the number of NEW and UNIQUE AI/Machine Learning articles given in the inputs below,
+        published recently (within the last 3-7 days) about the AI topics given in the inputs below.
 
 IMPORTANT - FOCUS ON AI/ML CONTENT:
 - Prioritize articles about AI models, ML techniques, LLMs, GenAI applications
@@ -173,8 +181,7 @@ IMPORTANT - FOCUS ON AI/ML CONTENT:
 - Look for practical AI applications and case studies
 
 IMPORTANT - AVOID DUPLICATE ARTICLES:
-The following URLs have already been read and should be EXCLUDED:
-{read_urls_str if read_urls else "  (No articles read yet)"}
+The URLs listed under "Already read URLs" in the inputs below have already been read and should be EXCLUDED.
 
 Search Strategy:
 1. Use multiple AI-focused search queries:
@@ -195,15 +202,19 @@ Search Strategy:
    - Brief description (2-3 sentences about the AI content)
 
 Find diverse AI articles covering different aspects of artificial intelligence.
-Ensure ALL {num_articles} articles are UNIQUE and NOT in the excluded list above.
-""",
+Ensure ALL articles are UNIQUE and NOT in the excluded list.
+""", [
+            ("Number of articles", str(num_articles)),
+            ("Topics", ", ".join(topics[:10])),
+            ("Already read URLs", read_urls_str if read_urls else "  (No articles read yet)")
+        ]),
         agent=news_hunter,
         expected_output=f"A list of {num_articles} unique AI/ML articles with titles, URLs, sources, and brief descriptions"
     )
     
     # Task 2: 分析文章內容
     analysis_task = Task(
-        description=f"""For each AI/ML article found by the News Hunter, visit the URL and perform a detailed analysis:
+        description=layout_task("""For each AI/ML article found by the News Hunter, visit the URL and perform a detailed analysis:
 
 1. **Read the full article** using the scrape tool
 2. **Extract key AI/ML information**:
@@ -236,8 +247,8 @@ Ensure ALL {num_articles} articles are UNIQUE and NOT in the excluded list above
    - Innovation (1-5): Novelty of content
 
 IMPORTANT: Each summary must be DETAILED (200-300 words minimum) to provide sufficient context.
-Analyze ALL {num_articles} articles thoroughly with comprehensive summaries.
-""",
+Analyze ALL articles thoroughly with comprehensive summaries (the expected number is given in the inputs below).
+""", [("Number of articles", str(num_articles))]),
         agent=content_analyzer,
         expected_output=f"Detailed analysis and COMPREHENSIVE summaries (200-300 words each) for all {num_articles} AI articles with ratings",
         context=[search_task]
@@ -245,21 +256,21 @@ Analyze ALL {num_articles} articles thoroughly with comprehensive summaries.
     
     # Task 3: 生成每日報告
     report_task = Task(
-        description=f"""Create a comprehensive daily AI/ML news digest report based on the analyzed articles.
+        description=layout_task("""Create a comprehensive daily AI/ML news digest report based on the analyzed articles.
 
 Structure the report as follows:
 
-# 📰 每日 AI 技術新聞摘要 - {datetime.now().strftime("%Y年%m月%d日")}
+# 📰 每日 AI 技術新聞摘要 - [Report date from the inputs]
 
 ## 📊 今日統計
-- 📄 文章總數：{num_articles} 篇
+- 📄 文章總數：[Number of articles from the inputs] 篇
 - 🎯 主要領域：[列出主要 AI 領域，如 LLM、Computer Vision 等]
 - ⭐ 平均品質評分：[計算平均分/5]
 - 🔥 熱門話題：[提取最常出現的主題]
 
 ## 🏆 今日精選推薦
 
-For each of the TOP {min(num_articles, 5)} articles (sorted by rating), provide:
+For each of the TOP articles (sorted by rating; the count is given as "Featured articles" in the inputs below), provide:
 
 ### 📌 [文章標題]
 
@@ -333,25 +344,61 @@ Based on today's articles, provide learning recommendations:
 
 ---
 
-**📅 生成時間**：{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}  
+**📅 生成時間**：[Generated at from the inputs]  
 **🤖 AI Agents**: News Hunter → Content Analyzer → Report Writer
 
 Use proper markdown formatting with emojis, headers, tables, and lists.
 Make it visually appealing and easy to scan.
-Save the report to: {output_file}
-""",
+Save the report to the output file given in the inputs below.
+""", [
+            ("Report date", now.strftime("%Y年%m月%d日")),
+            ("Number of articles", str(num_articles)),
+            ("Featured articles", str(min(num_articles, 5))),
+            ("Generated at", now.strftime("%Y-%m-%d %H:%M:%S")),
+            ("Output file", output_file)
+        ]),
         agent=report_writer,
         expected_output=f"A well-formatted daily AI news digest with detailed summaries saved as {output_file}",
         context=[search_task, analysis_task],
         output_file=output_file
     )
     
+    return [search_task, analysis_task, report_task]
+
+
+def run_daily_tech_news(
+    topics: list = None,
+    num_articles: int = 7,
+    output_file: str = None,
+    progress_callback: Optional[callable] = None,
+    telemetry: Optional[RunTelemetry] = None
+):
+    """
+    執行每日技術新聞抓取與分析
+    
+    Args:
+        topics: 感興趣的主題列表（預設為 AI 相關主題）
+        num_articles: 要找的文章數量（預設 7 篇）
+        output_file: 輸出的報告文件名
+        progress_callback: 進度回調函數
+        telemetry: 執行量測（RunTelemetry），記錄各 Agent / Task 的時間、token 用量與成本
+    
+    Returns:
+        執行結果
+    """
+    tasks = build_daily_tech_news_tasks(topics, num_articles, output_file)
+    prefix_report = prefix_cache_tracker.measure('daily_news', task_prompts(tasks))
+    if telemetry:
+        telemetry.prefix_cache = prefix_report
+    
     # 建立 Crew
     crew = Crew(
-        agents=[news_hunter, content_analyzer, report_writer],
-        tasks=[search_task, analysis_task, report_task],
+        agents=[task.agent for task in tasks],
+        tasks=tasks,
         process=Process.sequential,
-        verbose=True
+        verbose=True,
+        step_callback=telemetry.step_callback if telemetry else None,
+        task_callback=telemetry.task_callback if telemetry else None
     )
     
     # 使用執行緒來模擬進度更新
@@ -361,11 +408,15 @@ Save the report to: {output_file}
     
     def run_crew():
         nonlocal result, error
+        if telemetry:
+            telemetry.start()
         try:
             result = crew.kickoff()
         except Exception as e:
             error = e
         finally:
+            if telemetry:
+                telemetry.finish(result)
             execution_done.set()
     
     # 啟動執行緒
@@ -10,25 +10,28 @@ from typing import List, Union, Optional
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew, Process, LLM
 from .prompt_manager import prompt_manager
+from .run_telemetry import RunTelemetry
+from .prompt_layout import layout_task, task_prompts, prefix_cache_tracker
 from .utf8_file_tool import read_files_content
+from .context_retriever import estimate_tokens, select_context
 
 load_dotenv()
 
-def run_documentation_crew(
+def build_documentation_tasks(
     target_file: Union[str, List[str]], 
     output_file: str = "OUTPUT_DOCUMENTATION.md",
-    progress_callback: Optional[callable] = None
-):
+    context_token_budget: Optional[int] = None
+) -> List[Task]:
     """
-    執行文檔生成 Crew
+    建立文檔生成 Crew 的 Agents 與 Tasks（不執行）
     
     Args:
         target_file: 要分析的代碼文件路徑（字串或列表）
         output_file: 輸出的文檔文件名
-        progress_callback: 進度回調函數 (agent_name, status, total, completed)
+        context_token_budget: 程式碼內容的 token 預算；超過時只挑選最相關的片段（None 表示全部提供）
         
     Returns:
-        執行結果
+        依執行順序排列的 Tasks（task.agent 為負責的 Agent）
     """
     # 初始化更快的 LLM（使用 gpt-4o-mini 或 gpt-3.5-turbo 更快更便宜）
     fast_llm = LLM(
@@ -40,17 +43,34 @@ def run_documentation_crew(
     # 處理多個文件的情況
     if isinstance(target_file, list):
         file_list = target_file
-        target_description = f"{len(file_list)} 個文件"
         file_list_str = "\n".join([f"  - {f}" for f in file_list[:10]])  # 只顯示前10個
         if len(file_list) > 10:
             file_list_str += f"\n  ... 以及其他 {len(file_list) - 10} 個文件"
     else:
         file_list = [target_file]
-        target_description = target_file
         file_list_str = target_file
     
+    analysis_instructions = """Your analysis should include:
+1. Overall purpose and functionality of the code
+2. Main classes, functions, and their responsibilities
+3. Key dependencies and imports
+4. Data flow and architecture patterns
+5. Any notable design decisions or algorithms used
+6. Input/output expectations
+7. Error handling mechanisms
+8. How different files/modules work together (if multiple files)"""
+    
     # 預先讀取所有文件內容（避免編碼問題）
     files_content = read_files_content(file_list)
+    content_intro = "Here is the complete content of all files (already read with UTF-8 encoding):"
+    
+    # 內容超過預算時，以本地向量檢索挑出與分析目標最相關的片段
+    if context_token_budget and estimate_tokens(files_content) > context_token_budget:
+        files_content = select_context(file_list, analysis_instructions, context_token_budget)
+        content_intro = (
+            f"Here is an outline of all files followed by the code sections most relevant to this analysis "
+            f"(selected to fit a budget of about {context_token_budget} tokens):"
+        )
     
     # Agent 1: Senior Python Developer (Code Interpreter)
     senior_dev_backstory = """You are an expert software engineer with 15+ years of experience.
@@ -67,16 +87,13 @@ def run_documentation_crew(
     
     senior_dev = Agent(
         role='Senior Python Developer',
-        goal=f'Analyze the code in {target_description} and explain its functionality in depth',
+        goal='Analyze the provided code and explain its functionality in depth',
         backstory=enhanced_backstory,
         llm=fast_llm,  # 使用更快的 LLM
         verbose=True,
         allow_delegation=False
     )
     
-    if progress_callback:
-        progress_callback("Senior Python Developer", "running", 2, 0)
-    
     # Agent 2: Technical Writer
     tech_writer_backstory = """You are a skilled technical writer who specializes in creating clear,
         structured documentation. You transform complex technical jargon into easy-to-read
@@ -107,36 +124,25 @@ def run_documentation_crew(
         absolute_file_list_str += f"\n  ... 以及其他 {len(absolute_file_list) - 10} 個文件"
     
     # Task 1: Code Analysis
-    # 直接在 description 中提供文件內容，避免編碼問題
+    # 直接在 description 中提供文件內容，避免編碼問題；
+    # 靜態指示在前、檔案清單與內容在最後，每次執行的 prompt 前綴相同，可命中 provider 的 prefix cache
     analysis_task = Task(
-        description=f"""Thoroughly analyze the following code files.
-
-Files being analyzed:
-{absolute_file_list_str}
+        description=layout_task(f"""Thoroughly analyze the code files given in the inputs below.
 
-Here is the complete content of all files (already read with UTF-8 encoding):
-
-{files_content}
-
-Your analysis should include:
-1. Overall purpose and functionality of the code
-2. Main classes, functions, and their responsibilities
-3. Key dependencies and imports
-4. Data flow and architecture patterns
-5. Any notable design decisions or algorithms used
-6. Input/output expectations
-7. Error handling mechanisms
-8. How different files/modules work together (if multiple files)
+{analysis_instructions}
 
 Be detailed and technical in your analysis.
-""",
+""", [
+            ("Files being analyzed", absolute_file_list_str),
+            ("Code", f"{content_intro}\n\n{files_content}")
+        ]),
         agent=senior_dev,
         expected_output="A detailed technical analysis of the code structure and functionality"
     )
     
     # Task 2: Documentation Creation
     documentation_task = Task(
-        description=f"""Based on the technical analysis, create a comprehensive README.md style documentation.
+        description=layout_task("""Based on the technical analysis, create a comprehensive README.md style documentation.
         
         The documentation should include:
         
@@ -171,19 +177,51 @@ Be detailed and technical in your analysis.
         Use proper markdown formatting with emojis, code blocks, and clear headers.
         Make it professional yet easy to understand.
         
-        Save the final documentation to: {output_file}""",
+        Save the final documentation to the output file given in the inputs below.""", [("Output file", output_file)]),
         agent=tech_writer,
         expected_output=f"A complete, well-formatted markdown documentation file saved as {output_file}",
         context=[analysis_task],
         output_file=output_file
     )
     
+    return [analysis_task, documentation_task]
+
+
+def run_documentation_crew(
+    target_file: Union[str, List[str]], 
+    output_file: str = "OUTPUT_DOCUMENTATION.md",
+    progress_callback: Optional[callable] = None,
+    context_token_budget: Optional[int] = None,
+    telemetry: Optional[RunTelemetry] = None
+):
+    """
+    執行文檔生成 Crew
+    
+    Args:
+        target_file: 要分析的代碼文件路徑（字串或列表）
+        output_file: 輸出的文檔文件名
+        progress_callback: 進度回調函數 (agent_name, status, total, completed)
+        context_token_budget: 程式碼內容的 token 預算；超過時只挑選最相關的片段（None 表示全部提供）
+        telemetry: 執行量測（RunTelemetry），記錄各 Agent / Task 的時間、token 用量與成本
+    
+    Returns:
+        執行結果
+    """
+    tasks = build_documentation_tasks(target_file, output_file, context_token_budget)
+    
+    # 量測與上一次執行的共同前綴長度
+    prefix_report = prefix_cache_tracker.measure('documentation', task_prompts(tasks))
+    if telemetry:
+        telemetry.prefix_cache = prefix_report
+    
     # 建立 Crew
     crew = Crew(
-        agents=[senior_dev, tech_writer],
-        tasks=[analysis_task, documentation_task],
+        agents=[task.agent for task in tasks],
+        tasks=tasks,
         process=Process.sequential,
-        verbose=True
+        verbose=True,
+        step_callback=telemetry.step_callback if telemetry else None,
+        task_callback=telemetry.task_callback if telemetry else None
     )
     
     # 使用執行緒來模擬進度更新
@@ -193,11 +231,15 @@ Be detailed and technical in your analysis.
     
     def run_crew():
         nonlocal result, error
+        if telemetry:
+            telemetry.start()
         try:
             result = crew.kickoff()
         except Exception as e:
             error = e
         finally:
+            if telemetry:
+                telemetry.finish(result)
             execution_done.set()
     
     # 啟動執行緒
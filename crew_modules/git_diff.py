@@ -0,0 +1,202 @@
+"""
+Git Diff Module
+讀取本地 Git 儲存庫，計算相對於 base ref 的變更區塊（hunks）
+"""
+
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional
+
+from .secret_scanner import scan_bytes, redact_bytes, summarize_findings
+
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$')
+
+
+class GitDiffError(Exception):
+    """Git 指令執行失敗"""
+
+
+def _run_git(args: List[str], cwd: str) -> str:
+    """執行 git 指令並返回標準輸出"""
+    try:
+        completed = subprocess.run(
+            ['git', *args],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace'
+        )
+    except FileNotFoundError:
+        raise GitDiffError("找不到 git 執行檔，請確認已安裝 Git")
+    
+    if completed.returncode != 0:
+        raise GitDiffError(completed.stderr.strip() or f"git {' '.join(args)} 執行失敗")
+    return completed.stdout
+
+
+def find_repo_root(path: str) -> str:
+    """
+    取得路徑所在的 Git 儲存庫根目錄
+    
+    Args:
+        path: 文件或目錄路徑
+    
+    Returns:
+        儲存庫根目錄的絕對路徑
+    """
+    directory = path if os.path.isdir(path) else os.path.dirname(os.path.abspath(path))
+    return os.path.abspath(_run_git(['rev-parse', '--show-toplevel'], directory).strip())
+
+
+def get_merge_base(repo_root: str, base_ref: str) -> str:
+    """
+    取得目前 HEAD 與 base ref 的分岔點，只比較這個分支帶進來的變更
+    
+    Args:
+        repo_root: 儲存庫根目錄
+        base_ref: 基準分支或 commit（例如 'main'）
+    
+    Returns:
+        merge-base commit hash
+    """
+    return _run_git(['merge-base', base_ref, 'HEAD'], repo_root).strip()
+
+
+def _is_tracked(repo_root: str, relative_path: str) -> bool:
+    """檢查文件是否已被 Git 追蹤"""
+    try:
+        _run_git(['ls-files', '--error-unmatch', '--', relative_path], repo_root)
+        return True
+    except GitDiffError:
+        return False
+
+
+def parse_unified_diff(diff_text: str) -> List[Dict]:
+    """
+    解析 unified diff 成 hunk 列表
+    
+    Args:
+        diff_text: git diff 的輸出
+    
+    Returns:
+        hunk 列表，每筆包含 old_start、old_lines、new_start、new_lines、section、lines
+    """
+    hunks = []
+    current = None
+    
+    for line in diff_text.splitlines():
+        match = _HUNK_HEADER.match(line)
+        if match:
+            old_start, old_lines, new_start, new_lines, section = match.groups()
+            current = {
+                "old_start": int(old_start),
+                "old_lines": int(old_lines) if old_lines is not None else 1,
+                "new_start": int(new_start),
+                "new_lines": int(new_lines) if new_lines is not None else 1,
+                "section": section.strip(),
+                "lines": []
+            }
+            hunks.append(current)
+        elif current is not None and line[:1] in (' ', '+', '-'):
+            current["lines"].append(line)
+        elif current is not None and line.startswith('\\'):
+            # "\ No newline at end of file"
+            continue
+    
+    return hunks
+
+
+def get_file_hunks(file_path: str, base_ref: str, context_lines: int = 3) -> List[Dict]:
+    """
+    計算單一文件相對於 base ref 的變更區塊（包含尚未 commit 的修改）
+    
+    Args:
+        file_path: 文件路徑
+        base_ref: 基準分支或 commit
+        context_lines: 每個 hunk 前後保留的上下文行數
+    
+    Returns:
+        hunk 列表；沒有變更時為空列表
+    """
+    abs_path = os.path.abspath(file_path)
+    repo_root = find_repo_root(abs_path)
+    relative_path = os.path.relpath(abs_path, repo_root)
+    
+    # 尚未追蹤的新文件整份都算是變更
+    if not _is_tracked(repo_root, relative_path):
+        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
+            lines = f.read().splitlines()
+        return [{
+            "old_start": 0,
+            "old_lines": 0,
+            "new_start": 1,
+            "new_lines": len(lines),
+            "section": "new file",
+            "lines": [f"+{line}" for line in lines]
+        }]
+    
+    merge_base = get_merge_base(repo_root, base_ref)
+    diff_text = _run_git(
+        ['diff', '--no-color', '--no-ext-diff', f'-U{context_lines}', merge_base, '--', relative_path],
+        repo_root
+    )
+    return parse_unified_diff(diff_text)
+
+
+def format_hunks(file_path: str, hunks: List[Dict], base_ref: str) -> str:
+    """
+    將 hunks 格式化成給 LLM 的文字，並標上新版本的行號
+    
+    Args:
+        file_path: 文件路徑
+        hunks: get_file_hunks 的結果
+        base_ref: 基準分支或 commit
+    
+    Returns:
+        已遮蔽敏感資訊的 diff 內容
+    """
+    output = [f"File: {os.path.abspath(file_path)}", f"Compared against: {base_ref}", ""]
+    
+    for hunk in hunks:
+        header = f"@@ -{hunk['old_start']},{hunk['old_lines']} +{hunk['new_start']},{hunk['new_lines']} @@"
+        if hunk["section"]:
+            header += f" {hunk['section']}"
+        output.append(header)
+        
+        new_line = hunk["new_start"]
+        for line in hunk["lines"]:
+            if line.startswith('-'):
+                output.append(f"      {line}")
+            else:
+                output.append(f"{new_line:5d} {line}")
+                new_line += 1
+        output.append("")
+    
+    # diff 內容同樣可能包含硬編碼的金鑰
+    data = "\n".join(output).encode('utf-8')
+    findings = scan_bytes(data)
+    if findings:
+        data = redact_bytes(data, findings)
+        return f"Redacted secrets: {summarize_findings(findings)}\n" + data.decode('utf-8', errors='ignore')
+    return data.decode('utf-8', errors='ignore')
+
+
+def read_diff_content(file_path: str, base_ref: str, context_lines: int = 3) -> Optional[str]:
+    """
+    取得文件變更內容，供 diff 模式的 Code Review 使用
+    
+    Args:
+        file_path: 文件路徑
+        base_ref: 基準分支或 commit
+        context_lines: 每個 hunk 前後保留的上下文行數
+    
+    Returns:
+        格式化的 diff 內容；沒有變更時返回 None
+    """
+    hunks = get_file_hunks(file_path, base_ref, context_lines)
+    if not hunks:
+        return None
+    return format_hunks(file_path, hunks, base_ref)
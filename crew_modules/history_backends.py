@@ -0,0 +1,639 @@
+"""
+History Backends Module
+歷史紀錄的儲存後端（JSON 文件 / JSONL 日誌 / SQLite）
+"""
+
+import heapq
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from filelock import FileLock
+
+
+DEFAULT_CREW_TYPES = ("documentation", "refactoring", "research")
+
+
+def _empty_history() -> Dict[str, List[Dict]]:
+    """預設的空歷史結構"""
+    return {crew_type: [] for crew_type in DEFAULT_CREW_TYPES}
+
+
+def record_sort_key(record: Dict) -> Tuple[str, str]:
+    """紀錄的排序鍵（時間相同時以 id 區分），分頁游標也使用同一組值"""
+    return (record.get('timestamp', ''), record.get('id', ''))
+
+
+def _start_index(records: List[Dict], after: Tuple[str, str]) -> int:
+    """在由新到舊排序的列表中，二分搜尋第一筆比 after 更舊的紀錄"""
+    low, high = 0, len(records)
+    while low < high:
+        middle = (low + high) // 2
+        if record_sort_key(records[middle]) < after:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class JsonHistoryBackend:
+    """
+    整份歷史存成一個 JSON 文件（原本的行為）
+    
+    多個行程共用同一份檔案時，寫入前取得檔案鎖並重新載入最新內容，
+    以暫存檔 + atomic rename 寫入；讀取前只需一次 stat 檢查是否被其他行程修改
+    """
+    
+    def __init__(self, history_file: str = "history.json"):
+        """
+        初始化 JSON 後端
+        
+        Args:
+            history_file: 歷史紀錄檔案路徑
+        """
+        self.history_file = history_file
+        self._file_lock = FileLock(history_file + ".lock", timeout=30)
+        self._lock = threading.RLock()
+        self._signature = None
+        self.history_data = self._load_history()
+    
+    @staticmethod
+    def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+        """檔案的 (mtime, size, inode)；rename 寫入一定會換 inode"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def _load_history(self) -> Dict:
+        """載入歷史紀錄"""
+        self._signature = self._file_signature(self.history_file)
+        if os.path.exists(self.history_file):
+            try:
+                with open(self.history_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"載入歷史紀錄失敗：{e}")
+                return _empty_history()
+        return _empty_history()
+    
+    def _refresh(self):
+        """檔案被其他行程修改過時重新載入"""
+        with self._lock:
+            if self._file_signature(self.history_file) != self._signature:
+                self.history_data = self._load_history()
+    
+    @contextmanager
+    def _locked(self):
+        """取得行程內與跨行程的鎖，並確保記憶體中的內容是最新的"""
+        with self._lock, self._file_lock:
+            self._refresh()
+            yield
+    
+    def _save_history(self):
+        """儲存歷史紀錄（寫入暫存檔後 atomic rename，當機不會留下寫到一半的檔案）"""
+        tmp_file = f"{self.history_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.history_data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.history_file)
+            self._signature = self._file_signature(self.history_file)
+        except Exception as e:
+            print(f"儲存歷史紀錄失敗：{e}")
+    
+    def add_record(self, record: Dict, max_records: int) -> List[Dict]:
+        """新增紀錄（最新的放最前面），每個類型最多保留 max_records 筆；返回因此被淘汰的紀錄"""
+        with self._locked():
+            crew_type = record["crew_type"]
+            records = self.history_data.setdefault(crew_type, [])
+            records.insert(0, record)
+            evicted = records[max_records:]
+            del records[max_records:]
+            self._save_history()
+            return evicted
+    
+    def _iter_records(self, crew_type: Optional[str] = None, after: Optional[Tuple[str, str]] = None,
+                      success_only: bool = False):
+        """依時間由新到舊逐筆產生紀錄；各類型的列表本來就已排序，只需 k-way merge"""
+        if crew_type:
+            lists = [self.history_data.get(crew_type, [])]
+        else:
+            lists = list(self.history_data.values())
+        
+        iterators = [islice(records, _start_index(records, after) if after else 0, None) for records in lists]
+        merged = iterators[0] if len(iterators) == 1 else heapq.merge(
+            *iterators, key=record_sort_key, reverse=True
+        )
+        if success_only:
+            merged = (r for r in merged if r.get('success', False))
+        return merged
+    
+    def get_records(self, crew_type: Optional[str] = None, limit: Optional[int] = None,
+                    success_only: bool = False) -> List[Dict]:
+        """依時間由新到舊取得紀錄"""
+        with self._lock:
+            self._refresh()
+            return list(islice(self._iter_records(crew_type, success_only=success_only), limit or None))
+    
+    def get_page(self, crew_type: Optional[str], page_size: int, after: Optional[Tuple[str, str]] = None,
+                 success_only: bool = False) -> List[Dict]:
+        """取得 after 之後的 page_size + 1 筆紀錄（多取一筆用來判斷是否還有下一頁）"""
+        with self._lock:
+            self._refresh()
+            return list(islice(self._iter_records(crew_type, after, success_only), page_size + 1))
+    
+    def delete_record(self, record_id: str) -> bool:
+        """刪除指定紀錄"""
+        with self._locked():
+            for crew_type, records in self.history_data.items():
+                for i, record in enumerate(records):
+                    if record.get('id') == record_id:
+                        del self.history_data[crew_type][i]
+                        self._save_history()
+                        return True
+            return False
+    
+    def update_file_exists(self, changes: Dict[str, bool]):
+        """寫回變更過的 file_exists 狀態"""
+        with self._locked():
+            for records in self.history_data.values():
+                for record in records:
+                    if record.get('id') in changes:
+                        record['file_exists'] = changes[record['id']]
+            self._save_history()
+    
+    def clear(self, crew_type: Optional[str] = None):
+        """清除歷史紀錄，crew_type 為 None 時清除全部"""
+        with self._locked():
+            if crew_type:
+                self.history_data[crew_type] = []
+            else:
+                self.history_data = _empty_history()
+            self._save_history()
+    
+    def count_by_type(self) -> Dict[str, Dict[str, int]]:
+        """每個類型的總數與成功數"""
+        with self._lock:
+            self._refresh()
+            return {
+                crew_type: {
+                    "total": len(records),
+                    "success": sum(1 for r in records if r.get('success', False))
+                }
+                for crew_type, records in self.history_data.items()
+            }
+
+
+class JournalHistoryBackend(JsonHistoryBackend):
+    """
+    以 append-only 的 JSONL 日誌記錄每次變更，載入時重播，並在背景定期壓縮回 history.json
+    
+    寫入成本只與變更大小有關；中途當機最多只會留下一行不完整的日誌，重播時會略過。
+    其他行程附加的變更會從上次讀到的位置增量讀入
+    """
+    
+    def __init__(self, history_file: str = "history.json", compact_every: int = 200):
+        """
+        初始化日誌後端
+        
+        Args:
+            history_file: 快照檔案路徑（格式與 JSON 後端相同）
+            compact_every: 日誌累積多少筆變更後觸發背景壓縮
+        """
+        self.journal_file = os.path.splitext(history_file)[0] + ".journal.jsonl"
+        self.compact_every = compact_every
+        self._journal_ops = 0
+        self._journal_offset = 0
+        self._journal_inode = None
+        self._compacting = False
+        self._compaction_thread: Optional[threading.Thread] = None
+        super().__init__(history_file)
+    
+    @property
+    def _rotated_journal(self) -> str:
+        """壓縮進行中時，舊日誌會先改名為這個檔案"""
+        return self.journal_file + ".old"
+    
+    def _load_history(self) -> Dict:
+        """載入快照並依序重播日誌"""
+        history_data = super()._load_history()
+        self._journal_ops = 0
+        
+        # 上次壓縮若在寫入快照前中斷，.old 裡的變更仍需要重播
+        self._read_journal(history_data, self._rotated_journal, 0)
+        
+        self._journal_inode = None
+        self._journal_offset = 0
+        signature = self._file_signature(self.journal_file)
+        if signature:
+            self._journal_inode = signature[2]
+            self._journal_offset = self._read_journal(history_data, self.journal_file, 0)
+        
+        return history_data
+    
+    def _read_journal(self, history_data: Dict, path: str, offset: int) -> int:
+        """從 offset 開始重播完整的日誌行，返回讀到的位置"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return offset
+        
+        # 最後一行還沒寫完（沒有換行）就留到下次再讀
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                op = json.loads(line)
+            except ValueError:
+                # 當機時寫到一半的行
+                continue
+            self._apply(history_data, op)
+            self._journal_ops += 1
+        return offset + end
+    
+    def _refresh(self):
+        """快照或日誌被其他行程修改時同步：日誌變長只讀新增的部分，被輪替或壓縮則重新載入"""
+        with self._lock:
+            signature = self._file_signature(self.journal_file)
+            inode = signature[2] if signature else None
+            size = signature[1] if signature else 0
+            
+            if (self._file_signature(self.history_file) != self._signature
+                    or inode != self._journal_inode or size < self._journal_offset):
+                self.history_data = self._load_history()
+            elif size > self._journal_offset:
+                self._journal_offset = self._read_journal(self.history_data, self.journal_file, self._journal_offset)
+    
+    @staticmethod
+    def _apply(history_data: Dict, op: Dict) -> List[str]:
+        """把一筆日誌套用到記憶體中的歷史（可重複套用）；返回 add 因筆數上限淘汰的紀錄 ID"""
+        if op["op"] == "add":
+            record = op["record"]
+            records = history_data.setdefault(record["crew_type"], [])
+            if not any(r.get("id") == record["id"] for r in records):
+                records.insert(0, record)
+            if "evicted" in op:
+                # 日誌重播到已包含這些變更的快照上時（壓縮寫完快照但沒刪掉舊日誌），
+                # 依筆數上限裁切會讓已淘汰的紀錄復活，所以只移除當時實際淘汰的 ID
+                evicted = set(op["evicted"])
+                records[:] = [r for r in records if r.get("id") not in evicted]
+                return op["evicted"]
+            # 舊版日誌沒有 evicted 欄位
+            evicted = [r.get("id") for r in records[op["max"]:]]
+            del records[op["max"]:]
+            return evicted
+        elif op["op"] == "delete":
+            for records in history_data.values():
+                for i, record in enumerate(records):
+                    if record.get("id") == op["id"]:
+                        del records[i]
+                        return []
+        elif op["op"] == "file_exists":
+            changes = op["changes"]
+            for records in history_data.values():
+                for record in records:
+                    if record.get("id") in changes:
+                        record["file_exists"] = changes[record["id"]]
+        elif op["op"] == "clear":
+            if op.get("crew_type"):
+                history_data[op["crew_type"]] = []
+            else:
+                history_data.clear()
+                history_data.update(_empty_history())
+        return []
+    
+    def _append(self, op: Dict) -> List[str]:
+        """套用變更並附加一行日誌（呼叫端需透過 _locked 持有鎖），返回 _apply 的結果"""
+        evicted = self._apply(self.history_data, op)
+        if op["op"] == "add":
+            op["evicted"] = evicted
+        try:
+            with open(self.journal_file, 'ab') as f:
+                # 前一個行程寫到一半就中斷時，先補上換行，避免新的變更接在壞掉的那一行後面
+                if f.tell() > self._journal_offset:
+                    f.write(b"\n")
+                f.write(json.dumps(op, ensure_ascii=False).encode('utf-8') + b"\n")
+                f.flush()
+                self._journal_offset = f.tell()
+                self._journal_inode = os.fstat(f.fileno()).st_ino
+        except Exception as e:
+            print(f"寫入歷史日誌失敗：{e}")
+            return evicted
+        
+        self._journal_ops += 1
+        if self._journal_ops >= self.compact_every and not self._compacting:
+            self._start_compaction()
+        return evicted
+    
+    def add_record(self, record: Dict, max_records: int) -> List[Dict]:
+        """新增紀錄（只附加一行日誌）；返回因筆數上限被淘汰的紀錄"""
+        with self._locked():
+            previous = {r.get("id"): r for r in self.history_data.get(record["crew_type"], [])}
+            evicted = self._append({"op": "add", "record": record, "max": max_records})
+            return [previous[record_id] for record_id in evicted if record_id in previous]
+    
+    def delete_record(self, record_id: str) -> bool:
+        """刪除指定紀錄（只附加一行日誌）"""
+        with self._locked():
+            exists = any(
+                r.get("id") == record_id for records in self.history_data.values() for r in records
+            )
+            if exists:
+                self._append({"op": "delete", "id": record_id})
+            return exists
+    
+    def update_file_exists(self, changes: Dict[str, bool]):
+        """寫回變更過的 file_exists 狀態（只附加一行日誌）"""
+        with self._locked():
+            self._append({"op": "file_exists", "changes": changes})
+    
+    def clear(self, crew_type: Optional[str] = None):
+        """清除歷史紀錄（只附加一行日誌）"""
+        with self._locked():
+            self._append({"op": "clear", "crew_type": crew_type})
+    
+    def _start_compaction(self):
+        """輪替日誌並在背景寫入新快照（呼叫端需透過 _locked 持有鎖）"""
+        if os.path.exists(self._rotated_journal):
+            # 上次壓縮失敗（或其他行程的壓縮還沒完成）留下的舊日誌，改為同步復原
+            self._recover_rotated_journal()
+            return
+        
+        # 在鎖內取得一致的快照內容並輪替日誌，之後的變更寫入新的日誌
+        snapshot = json.dumps(self.history_data, ensure_ascii=False, indent=2)
+        os.replace(self.journal_file, self._rotated_journal)
+        rotated_inode = os.stat(self._rotated_journal).st_ino
+        self._journal_ops = 0
+        self._journal_offset = 0
+        self._journal_inode = None
+        self._compacting = True
+        self._compaction_thread = threading.Thread(
+            target=self._compact, args=(snapshot, rotated_inode), daemon=True
+        )
+        self._compaction_thread.start()
+    
+    def _recover_rotated_journal(self):
+        """
+        把記憶體中的內容寫成快照並移除舊日誌與目前的日誌（呼叫端需透過 _locked 持有鎖）
+        
+        載入時已重播過 .old 與目前的日誌，記憶體中的內容就是最新狀態
+        """
+        tmp_file = f"{self.history_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.history_data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.history_file)
+            self._signature = self._file_signature(self.history_file)
+            os.remove(self._rotated_journal)
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+        except Exception as e:
+            print(f"復原歷史日誌失敗：{e}")
+            return
+        
+        self._journal_ops = 0
+        self._journal_offset = 0
+        self._journal_inode = None
+    
+    def _compact(self, snapshot: str, rotated_inode: int):
+        """寫入暫存檔後以 atomic rename 取代快照，再刪除舊日誌"""
+        tmp_file = f"{self.history_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock, self._file_lock:
+                signature = self._file_signature(self._rotated_journal)
+                if not signature or signature[2] != rotated_inode:
+                    # 舊日誌已被其他行程復原，這份快照已經過時
+                    os.remove(tmp_file)
+                    return
+                os.replace(tmp_file, self.history_file)
+                os.remove(self._rotated_journal)
+                # 記憶體中的內容已包含快照與舊日誌，不需要重新載入
+                self._signature = self._file_signature(self.history_file)
+        except Exception as e:
+            print(f"壓縮歷史日誌失敗：{e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+    
+    def compact(self):
+        """立即壓縮（例如程式結束前），並等待背景寫入完成"""
+        with self._locked():
+            if not self._compacting and os.path.exists(self.journal_file):
+                self._start_compaction()
+            thread = self._compaction_thread
+        if thread:
+            thread.join()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    crew_type TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_type_time ON records(crew_type, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_records_time ON records(timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_records_success ON records(success);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SqliteHistoryBackend:
+    """以 SQLite 儲存歷史紀錄，每次變更只寫入受影響的列"""
+    
+    def __init__(self, db_path: str = "history.db", legacy_json: Optional[str] = "history.json"):
+        """
+        初始化 SQLite 後端
+        
+        Args:
+            db_path: SQLite 資料庫路徑
+            legacy_json: 舊的 history.json，第一次啟動時會匯入（None 表示不匯入）
+        """
+        self.db_path = db_path
+        with self._connect() as conn:
+            # WAL 模式讓讀取不會被寫入阻塞
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SQLITE_SCHEMA)
+        
+        if legacy_json:
+            self._migrate_from_json(legacy_json)
+    
+    @contextmanager
+    def _connect(self):
+        """建立連線（每個操作各自連線，可安全地在 Streamlit 多執行緒中使用）"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous = NORMAL")
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _row_values(record: Dict) -> tuple:
+        """把紀錄轉成資料表欄位"""
+        return (
+            record["id"],
+            record["crew_type"],
+            record["timestamp"],
+            1 if record.get("success", False) else 0,
+            json.dumps(record, ensure_ascii=False)
+        )
+    
+    def _migrate_from_json(self, legacy_json: str):
+        """一次性匯入舊的 history.json"""
+        with self._connect() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+            if done or not os.path.exists(legacy_json):
+                return
+            
+            try:
+                with open(legacy_json, 'r', encoding='utf-8') as f:
+                    history_data = json.load(f)
+            except Exception as e:
+                print(f"匯入歷史紀錄失敗：{e}")
+                return
+            
+            rows = [
+                self._row_values({**record, "crew_type": record.get("crew_type", crew_type)})
+                for crew_type, records in history_data.items()
+                for record in records
+                if record.get("id") and record.get("timestamp")
+            ]
+            conn.executemany("INSERT OR IGNORE INTO records VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_json', ?)",
+                (os.path.abspath(legacy_json),)
+            )
+            print(f"已從 {legacy_json} 匯入 {len(rows)} 筆歷史紀錄")
+    
+    def add_record(self, record: Dict, max_records: int) -> List[Dict]:
+        """新增紀錄，每個類型最多保留 max_records 筆；返回因此被淘汰的紀錄"""
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)", self._row_values(record))
+            # 透過 (crew_type, timestamp) 索引找到第 max_records 筆之後的時間點
+            cutoff = conn.execute(
+                "SELECT timestamp FROM records WHERE crew_type = ? ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+                (record["crew_type"], max_records)
+            ).fetchone()
+            if not cutoff:
+                return []
+            params = (record["crew_type"], cutoff["timestamp"])
+            evicted = [
+                json.loads(row["data"]) for row in
+                conn.execute("SELECT data FROM records WHERE crew_type = ? AND timestamp <= ?", params)
+            ]
+            conn.execute("DELETE FROM records WHERE crew_type = ? AND timestamp <= ?", params)
+            return evicted
+    
+    def get_records(self, crew_type: Optional[str] = None, limit: Optional[int] = None,
+                    success_only: bool = False) -> List[Dict]:
+        """依時間由新到舊取得紀錄"""
+        sql = "SELECT data FROM records"
+        conditions, params = [], []
+        if crew_type:
+            conditions.append("crew_type = ?")
+            params.append(crew_type)
+        if success_only:
+            conditions.append("success = 1")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        with self._connect() as conn:
+            return [json.loads(row["data"]) for row in conn.execute(sql, params)]
+    
+    def get_page(self, crew_type: Optional[str], page_size: int, after: Optional[Tuple[str, str]] = None,
+                 success_only: bool = False) -> List[Dict]:
+        """以 keyset 分頁取得 after 之後的 page_size + 1 筆紀錄"""
+        sql = "SELECT data FROM records"
+        conditions, params = [], []
+        if crew_type:
+            conditions.append("crew_type = ?")
+            params.append(crew_type)
+        if success_only:
+            conditions.append("success = 1")
+        if after:
+            conditions.append("(timestamp, id) < (?, ?)")
+            params.extend(after)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(page_size + 1)
+        
+        with self._connect() as conn:
+            return [json.loads(row["data"]) for row in conn.execute(sql, params)]
+    
+    def delete_record(self, record_id: str) -> bool:
+        """刪除指定紀錄（主鍵查詢）"""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM records WHERE id = ?", (record_id,)).rowcount > 0
+    
+    def update_file_exists(self, changes: Dict[str, bool]):
+        """寫回變更過的 file_exists 狀態（只更新受影響的列）"""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE records SET data = json_set(data, '$.file_exists', json(?)) WHERE id = ?",
+                [("true" if exists else "false", record_id) for record_id, exists in changes.items()]
+            )
+    
+    def clear(self, crew_type: Optional[str] = None):
+        """清除歷史紀錄，crew_type 為 None 時清除全部"""
+        with self._connect() as conn:
+            if crew_type:
+                conn.execute("DELETE FROM records WHERE crew_type = ?", (crew_type,))
+            else:
+                conn.execute("DELETE FROM records")
+    
+    def count_by_type(self) -> Dict[str, Dict[str, int]]:
+        """每個類型的總數與成功數"""
+        counts = {crew_type: {"total": 0, "success": 0} for crew_type in DEFAULT_CREW_TYPES}
+        with self._connect() as conn:
+            for row in conn.execute(
+                "SELECT crew_type, COUNT(*) AS total, SUM(success) AS success FROM records GROUP BY crew_type"
+            ):
+                counts[row["crew_type"]] = {"total": row["total"], "success": row["success"] or 0}
+        return counts
+
+
+def create_backend(name: Optional[str] = None, history_file: str = "history.json"):
+    """
+    依名稱建立儲存後端
+    
+    Args:
+        name: 'json'、'journal' 或 'sqlite'，None 時讀取環境變數 HISTORY_BACKEND（預設 json）
+        history_file: JSON 歷史檔案路徑；SQLite 後端會用同名的 .db 並從它匯入
+    
+    Returns:
+        儲存後端實例
+    """
+    name = (name or os.getenv("HISTORY_BACKEND", "json")).strip().lower()
+    if name == "sqlite":
+        db_path = os.path.splitext(history_file)[0] + ".db"
+        return SqliteHistoryBackend(db_path, legacy_json=history_file)
+    if name == "journal":
+        return JournalHistoryBackend(history_file)
+    if name != "json":
+        print(f"未知的歷史紀錄後端：{name}，改用 json")
+    return JsonHistoryBackend(history_file)
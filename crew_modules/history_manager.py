@@ -3,44 +3,139 @@ History Manager Module
 管理文件生成歷史紀錄
 """
 
+import base64
 import json
 import os
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
 from pathlib import Path
+from dotenv import load_dotenv
+from .history_backends import create_backend, record_sort_key
+from .run_telemetry import TelemetryAggregate
+from .report_store import report_store
+from .report_search import report_search_index
+
+load_dotenv()
+
+
+class FileExistenceCache:
+    """
+    以目錄為單位快取輸出檔案是否存在
+    
+    每個目錄用一次 scandir 取得所有檔名；在 TTL 內直接使用快取，
+    TTL 到期後只 stat 目錄本身，目錄 mtime 沒變（沒有新增、刪除、改名）就沿用結果
+    """
+    
+    def __init__(self, ttl: float = 5.0):
+        """
+        初始化快取
+        
+        Args:
+            ttl: 完全不碰檔案系統的秒數
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._dirs: Dict[str, Dict] = {}
+    
+    def _directory_names(self, directory: str, now: float) -> set:
+        """取得目錄中的檔名集合（呼叫端需持有鎖）"""
+        entry = self._dirs.get(directory)
+        if entry and now - entry["checked_at"] < self.ttl:
+            return entry["names"]
+        
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._dirs[directory] = {"mtime": None, "checked_at": now, "names": set()}
+            return set()
+        
+        if entry and entry["mtime"] == mtime:
+            entry["checked_at"] = now
+            return entry["names"]
+        
+        try:
+            with os.scandir(directory) as it:
+                names = {e.name for e in it}
+        except OSError:
+            names = set()
+        self._dirs[directory] = {"mtime": mtime, "checked_at": now, "names": names}
+        return names
+    
+    def exists(self, path: str) -> bool:
+        """
+        檢查檔案是否存在
+        
+        Args:
+            path: 檔案路徑
+        
+        Returns:
+            True 如果檔案存在
+        """
+        abs_path = os.path.abspath(path)
+        directory, name = os.path.split(abs_path)
+        with self._lock:
+            return name in self._directory_names(directory, time.monotonic())
+    
+    def invalidate(self, path: str = None):
+        """
+        清除快取（path 為 None 時清除全部）
+        
+        Args:
+            path: 檔案路徑，會清除其所在目錄的快取
+        """
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(os.path.dirname(os.path.abspath(path)), None)
 
 
 class HistoryManager:
     """文件歷史紀錄管理器"""
     
-    def __init__(self, history_file: str = "history.json"):
+    # 每個類型最多保留的紀錄筆數
+    MAX_RECORDS_PER_TYPE = 100
+    
+    def __init__(self, history_file: str = "history.json", backend=None):
         """
         初始化歷史紀錄管理器
         
         Args:
             history_file: 歷史紀錄檔案路徑
+            backend: 儲存後端，None 時依環境變數 HISTORY_BACKEND 建立（json / sqlite）
         """
         self.history_file = history_file
-        self.history_data = self._load_history()
+        self.backend = backend or create_backend(history_file=history_file)
+        self.existence_cache = FileExistenceCache()
+        
+        # 每個類型的 telemetry 累計統計，以及建立時對應的紀錄筆數
+        self._stats_lock = threading.Lock()
+        self._aggregates: Dict[str, TelemetryAggregate] = {}
+        self._aggregate_totals: Dict[str, int] = {}
+        
+        # 紀錄變更事件的監聽者（例如全文索引）
+        self._listeners: List[Callable[[str, object], None]] = []
+    
+    def subscribe(self, listener: Callable[[str, object], None]):
+        """
+        註冊紀錄變更的監聽者
+        
+        Args:
+            listener: listener(event, payload)；event 為 'add'（payload 為紀錄）、
+                      'delete'（payload 為紀錄 ID）、'clear'（payload 為 crew_type）
+                      或 'evict'（payload 為 add_record 因筆數上限淘汰的紀錄列表）
+        """
+        self._listeners.append(listener)
     
-    def _load_history(self) -> Dict:
-        """載入歷史紀錄"""
-        if os.path.exists(self.history_file):
+    def _notify(self, event: str, payload):
+        """通知所有監聽者；監聽者失敗不影響歷史紀錄本身"""
+        for listener in self._listeners:
             try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                listener(event, payload)
             except Exception as e:
-                print(f"載入歷史紀錄失敗：{e}")
-                return {"documentation": [], "refactoring": [], "research": []}
-        return {"documentation": [], "refactoring": [], "research": []}
-    
-    def _save_history(self):
-        """儲存歷史紀錄"""
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"儲存歷史紀錄失敗：{e}")
+                print(f"歷史紀錄事件處理失敗：{e}")
     
     def add_record(
         self,
@@ -48,7 +143,8 @@ class HistoryManager:
         input_files: List[str],
         output_file: str,
         success: bool = True,
-        error_message: str = None
+        error_message: str = None,
+        telemetry: Dict = None
     ) -> Dict:
         """
         新增歷史紀錄
@@ -59,10 +155,16 @@ class HistoryManager:
             output_file: 輸出檔案路徑
             success: 是否成功
             error_message: 錯誤訊息（如果有）
+            telemetry: RunTelemetry.to_dict() 的量測資料（時間、token、成本）
             
         Returns:
             新增的紀錄
         """
+        # 成功產生的報告存入 content-addressed 儲存區，相同內容只存一份
+        report_hash = None
+        if success and output_file and os.path.exists(output_file):
+            report_hash = report_store.put_file(output_file)
+        
         record = {
             "id": self._generate_id(),
             "timestamp": datetime.now().isoformat(),
@@ -71,19 +173,33 @@ class HistoryManager:
             "output_file": output_file,
             "success": success,
             "error_message": error_message,
-            "file_exists": os.path.exists(output_file) if output_file else False
+            "file_exists": os.path.exists(output_file) if output_file else False,
+            "telemetry": telemetry,
+            "report_hash": report_hash
         }
         
-        if crew_type not in self.history_data:
-            self.history_data[crew_type] = []
+        # 輸出檔案剛寫入，下次查詢時重新掃描該目錄
+        if output_file:
+            self.existence_cache.invalidate(output_file)
         
-        self.history_data[crew_type].insert(0, record)  # 最新的放最前面
+        # 最新的放最前面，每個類型最多保留 100 筆紀錄
+        evicted = self.backend.add_record(record, self.MAX_RECORDS_PER_TYPE)
         
-        # 限制每個類型最多保留 100 筆紀錄
-        if len(self.history_data[crew_type]) > 100:
-            self.history_data[crew_type] = self.history_data[crew_type][:100]
+        with self._stats_lock:
+            aggregate = self._aggregates.get(crew_type)
+            if aggregate and self._aggregate_totals[crew_type] < self.MAX_RECORDS_PER_TYPE:
+                aggregate.add(telemetry)
+                self._aggregate_totals[crew_type] += 1
+            else:
+                # 超過上限會淘汰最舊的紀錄，下次查詢時再重建
+                self._invalidate_statistics(crew_type)
         
-        self._save_history()
+        self._notify("add", record)
+        # 超過每類型上限被淘汰的紀錄也要通知，讓搜尋索引同步移除、清理模組回收輸出檔案
+        if evicted:
+            for evicted_record in evicted:
+                self._notify("delete", evicted_record.get("id"))
+            self._notify("evict", evicted)
         return record
     
     def get_history(
@@ -103,27 +219,60 @@ class HistoryManager:
         Returns:
             歷史紀錄列表
         """
-        if crew_type:
-            records = self.history_data.get(crew_type, [])
-        else:
-            # 合併所有類型並按時間排序
-            all_records = []
-            for records in self.history_data.values():
-                all_records.extend(records)
-            records = sorted(all_records, key=lambda x: x['timestamp'], reverse=True)
+        records = self.backend.get_records(crew_type, limit, success_only)
         
-        if success_only:
-            records = [r for r in records if r.get('success', False)]
+        self._refresh_file_exists(records)
+        return records
+    
+    def get_history_page(
+        self,
+        crew_type: str = None,
+        page_size: int = 10,
+        cursor: str = None,
+        success_only: bool = False
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        以游標分頁取得歷史紀錄，只讀取與排序需要的那一頁
+        
+        Args:
+            crew_type: Crew 類型，None 表示全部
+            page_size: 每頁筆數
+            cursor: 上一頁返回的游標，None 表示第一頁
+            success_only: 只顯示成功的紀錄
+        
+        Returns:
+            (紀錄列表, 下一頁游標)；沒有下一頁時游標為 None
+        """
+        after = None
+        if cursor:
+            try:
+                after = tuple(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii'))))
+            except Exception:
+                raise ValueError(f"無效的分頁游標：{cursor}")
         
-        if limit:
-            records = records[:limit]
+        records = self.backend.get_page(crew_type, page_size, after, success_only)
+        next_cursor = None
+        if len(records) > page_size:
+            records = records[:page_size]
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps(list(record_sort_key(records[-1]))).encode('utf-8')
+            ).decode('ascii')
         
-        # 更新 file_exists 狀態
+        self._refresh_file_exists(records)
+        return records, next_cursor
+    
+    def _refresh_file_exists(self, records: List[Dict]):
+        """更新 file_exists 狀態，只有變更的紀錄才寫回儲存後端"""
+        changes = {}
         for record in records:
             if 'output_file' in record and record['output_file']:
-                record['file_exists'] = os.path.exists(record['output_file'])
+                exists = self.existence_cache.exists(record['output_file'])
+                if record.get('file_exists') != exists:
+                    record['file_exists'] = exists
+                    changes[record['id']] = exists
         
-        return records
+        if changes:
+            self.backend.update_file_exists(changes)
     
     def delete_record(self, record_id: str) -> bool:
         """
@@ -135,13 +284,12 @@ class HistoryManager:
         Returns:
             是否刪除成功
         """
-        for crew_type, records in self.history_data.items():
-            for i, record in enumerate(records):
-                if record.get('id') == record_id:
-                    del self.history_data[crew_type][i]
-                    self._save_history()
-                    return True
-        return False
+        deleted = self.backend.delete_record(record_id)
+        if deleted:
+            with self._stats_lock:
+                self._invalidate_statistics()
+            self._notify("delete", record_id)
+        return deleted
     
     def clear_history(self, crew_type: str = None):
         """
@@ -150,30 +298,50 @@ class HistoryManager:
         Args:
             crew_type: Crew 類型，None 表示清除全部
         """
+        self.backend.clear(crew_type)
+        with self._stats_lock:
+            self._invalidate_statistics(crew_type)
+        self._notify("clear", crew_type)
+    
+    def _invalidate_statistics(self, crew_type: str = None):
+        """清除 telemetry 累計統計（呼叫端需持有 _stats_lock）"""
         if crew_type:
-            self.history_data[crew_type] = []
+            self._aggregates.pop(crew_type, None)
+            self._aggregate_totals.pop(crew_type, None)
         else:
-            self.history_data = {"documentation": [], "refactoring": [], "research": []}
-        self._save_history()
+            self._aggregates.clear()
+            self._aggregate_totals.clear()
+    
+    def _get_aggregate(self, crew_type: str, total: int) -> TelemetryAggregate:
+        """取得類型的累計統計；筆數與後端不一致（例如其他行程新增過）時才重新掃描"""
+        with self._stats_lock:
+            if self._aggregate_totals.get(crew_type) != total:
+                aggregate = TelemetryAggregate()
+                for record in self.backend.get_records(crew_type):
+                    aggregate.add(record.get("telemetry"))
+                self._aggregates[crew_type] = aggregate
+                self._aggregate_totals[crew_type] = total
+            return self._aggregates[crew_type]
     
     def get_statistics(self) -> Dict:
         """
         取得統計資訊
         
         Returns:
-            統計資訊字典
+            統計資訊字典（包含延遲百分位數與 token / 成本合計）
         """
         stats = {}
-        for crew_type, records in self.history_data.items():
-            total = len(records)
-            success = sum(1 for r in records if r.get('success', False))
+        for crew_type, counts in self.backend.count_by_type().items():
+            total = counts["total"]
+            success = counts["success"]
             failed = total - success
             
             stats[crew_type] = {
                 "total": total,
                 "success": success,
                 "failed": failed,
-                "success_rate": f"{(success/total*100):.1f}%" if total > 0 else "0%"
+                "success_rate": f"{(success/total*100):.1f}%" if total > 0 else "0%",
+                **self._get_aggregate(crew_type, total).summary()
             }
         
         return stats
@@ -202,3 +370,4 @@ class HistoryManager:
 
 # 全域實例
 history_manager = HistoryManager()
+history_manager.subscribe(report_search_index.on_history_event)
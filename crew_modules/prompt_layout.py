@@ -0,0 +1,180 @@
+"""
+Prompt Layout Module
+依照 provider 的 prefix caching 排列 prompt：靜態的系統前言 → 靜態的任務指示 → 每次不同的輸入放最後，
+並量測每次執行與上一次相同 prompt 的共同前綴長度
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# 變動輸入區塊的分隔標題；之前的內容在每次執行之間必須逐字相同
+INPUTS_HEADER = "=== INPUTS FOR THIS RUN ==="
+
+# CrewAI Agent system_template / prompt_template 的佔位字串
+SYSTEM_PLACEHOLDER = "{{ .System }}"
+PROMPT_PLACEHOLDER = "{{ .Prompt }}"
+
+
+def layout_backstory(global_rules: str, backstory: str, custom_prompt: str = "") -> str:
+    """
+    組合 Agent 的 backstory：所有 Agent 共用的全域規則放最前面，接著是 Agent 的 backstory 與自訂 prompt
+    
+    Args:
+        global_rules: 全域規則
+        backstory: Agent 原始的 backstory
+        custom_prompt: 使用者為此 Agent 設定的 prompt
+    
+    Returns:
+        組合後的 backstory
+    """
+    parts = [text for text in (global_rules, backstory, custom_prompt) if text and text.strip()]
+    return "\n\n".join(part.strip("\n") for part in parts)
+
+
+def layout_task(instructions: str, inputs: Sequence[Tuple[str, str]] = ()) -> str:
+    """
+    組合 Task description：靜態指示在前，變動輸入（檔案內容、路徑、輸出檔名）全部放在最後
+    
+    Args:
+        instructions: 不含任何變動內容的任務指示
+        inputs: (標題, 內容) 列表，依序附加在 INPUTS_HEADER 之後
+    
+    Returns:
+        Task description
+    """
+    description = instructions.strip("\n")
+    if inputs:
+        sections = "\n\n".join(f"### {title}\n{content}" for title, content in inputs)
+        description += f"\n\n{INPUTS_HEADER}\n\n{sections}"
+    return description + "\n"
+
+
+def shared_prompt_templates(sections: Sequence[Tuple[str, str]]) -> Dict[str, str]:
+    """
+    產生讓同一個 Crew 的所有 Agent 共用 prompt 前綴的 CrewAI 模板
+    
+    CrewAI 預設的 prompt 以 "You are {role}" 開頭，每個 Agent 從第一個字就不同；
+    把共用內容（全域規則、要審查的程式碼）放在 system_template 最前面，
+    所有 Agent 的 prompt 就以逐字相同的前綴開始，provider 只需完整計費一次
+    
+    Args:
+        sections: (標題, 內容) 列表，空白內容會略過
+    
+    Returns:
+        可直接展開給 Agent 的 system_template 與 prompt_template；沒有共用內容時為空 dict
+    """
+    parts = [(title, content.strip("\n")) for title, content in sections if content and content.strip()]
+    if not parts:
+        return {}
+    shared = "\n\n".join(f"### {title}\n{content}" for title, content in parts)
+    return {
+        "system_template": f"{shared}\n\n{SYSTEM_PLACEHOLDER}",
+        "prompt_template": PROMPT_PLACEHOLDER
+    }
+
+
+def shared_prefix_text(agent) -> str:
+    """Agent system_template 中 {{ .System }} 之前的共用前綴，沒有設定模板時為空字串"""
+    template = getattr(agent, "system_template", None) or ""
+    prefix, found, _ = template.partition(SYSTEM_PLACEHOLDER)
+    return prefix if found else ""
+
+
+def agent_system_prompt(role: str, backstory: str, goal: str) -> str:
+    """
+    與 CrewAI 預設 system prompt 相同順序的文字（role → backstory → goal），用於量測共同前綴
+    
+    Args:
+        role: Agent 角色
+        backstory: Agent backstory
+        goal: Agent 目標
+    
+    Returns:
+        system prompt 文字
+    """
+    return f"You are {role}. {backstory}\nYour personal goal is: {goal}"
+
+
+def task_prompts(tasks: Sequence) -> List[Tuple[str, str]]:
+    """
+    取得每個 Task 送給模型的 prompt 文字（system prompt + task description）
+    
+    Args:
+        tasks: CrewAI Task 列表
+    
+    Returns:
+        (Agent 角色, prompt 文字) 列表
+    """
+    prompts = []
+    for task in tasks:
+        agent = task.agent
+        system = shared_prefix_text(agent) + agent_system_prompt(agent.role, agent.backstory, agent.goal)
+        prompts.append((agent.role, f"{system}\n{task.description}"))
+    return prompts
+
+
+def shared_prefix_length(a: bytes, b: bytes) -> int:
+    """
+    兩段位元組的共同前綴長度（二分搜尋 + 切片比較，比較在 C 層以 memcmp 完成）
+    
+    Args:
+        a: 第一段
+        b: 第二段
+    
+    Returns:
+        共同前綴的位元組數
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class PrefixCacheTracker:
+    """
+    記住每個 (crew_type, task) 上一次送出的 prompt，量測這次與上次逐字相同的前綴長度
+    
+    provider 只會對相同前綴給予快取折扣，共同前綴越長，命中快取的 token 越多
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last: Dict[Tuple[str, str], bytes] = {}
+    
+    def measure(self, crew_type: str, prompts: List[Tuple[str, str]]) -> Dict:
+        """
+        量測並記錄一次執行的 prompts
+        
+        Args:
+            crew_type: Crew 類型
+            prompts: (task 名稱, 完整 prompt 文字) 列表
+        
+        Returns:
+            每個 task 與總計的共同前綴位元組數、總位元組數與比例
+        """
+        tasks = []
+        with self._lock:
+            for name, text in prompts:
+                data = text.encode('utf-8')
+                previous: Optional[bytes] = self._last.get((crew_type, name))
+                shared = shared_prefix_length(previous, data) if previous is not None else 0
+                self._last[(crew_type, name)] = data
+                tasks.append({"task": name, "prefix_bytes": shared, "total_bytes": len(data)})
+        
+        prefix_bytes = sum(task["prefix_bytes"] for task in tasks)
+        total_bytes = sum(task["total_bytes"] for task in tasks)
+        return {
+            "tasks": tasks,
+            "prefix_bytes": prefix_bytes,
+            "total_bytes": total_bytes,
+            "prefix_ratio": round(prefix_bytes / total_bytes, 4) if total_bytes else 0.0
+        }
+
+
+# 全域實例（同一個行程中的所有執行共用）
+prefix_cache_tracker = PrefixCacheTracker()
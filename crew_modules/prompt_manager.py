@@ -5,23 +5,111 @@ System Prompts 管理模組
 
 import configparser
 import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+from .prompt_layout import layout_backstory
+
+
+class PromptSnapshot:
+    """某個版本設定的唯讀快照；更新時整份替換，讀取端不需要加鎖"""
+    
+    __slots__ = ("version", "sections")
+    
+    def __init__(self, version, config):
+        self.version = version
+        self.sections = MappingProxyType({
+            section: MappingProxyType(dict(config[section]))
+            for section in config.sections()
+        })
+    
+    def get(self, section, key):
+        """取得設定值，不存在時返回空字串"""
+        return self.sections.get(section, {}).get(key.lower(), '')
 
 
 class PromptManager:
     """管理自訂 System Prompts"""
     
-    def __init__(self, config_file='custom_prompts.ini'):
+    def __init__(self, config_file='custom_prompts.ini', check_interval=2.0):
+        """
+        Args:
+            config_file: 設定檔路徑
+            check_interval: 檢查設定檔是否被修改的最短間隔（秒）
+        """
         self.config_file = config_file
+        self.check_interval = check_interval
         self.config = configparser.ConfigParser()
+        self._lock = threading.RLock()
+        self._signature = None
+        self._last_check = 0.0
+        self._snapshot = PromptSnapshot(0, self.config)
+        # 組合好的 backstory：(section, key, 原始 backstory, 設定版本) -> interned 字串
+        self._backstory_cache = {}
+        self._backstory_cache_version = None
         self.load_config()
     
+    def _file_signature(self):
+        """設定檔的 (mtime, size)，不存在時為 None"""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
     def load_config(self):
-        """載入設定檔"""
-        if os.path.exists(self.config_file):
-            self.config.read(self.config_file, encoding='utf-8')
-        else:
-            # 如果設定檔不存在，使用預設值
-            self._create_default_config()
+        """
+        載入設定檔（並建立新版本的快照）
+        
+        設定檔格式錯誤或正在被編輯器寫入時，繼續使用上一份正確的快照，
+        並記下這個版本的檔案簽章，檔案再次變更前不會重複解析
+        """
+        with self._lock:
+            if os.path.exists(self.config_file):
+                # 先取得簽章再讀取：讀取期間檔案又被修改時，下次檢查會發現簽章不同
+                signature = self._file_signature()
+                config = configparser.ConfigParser()
+                try:
+                    config.read(self.config_file, encoding='utf-8')
+                    # 建立快照時才會展開 % 插值，格式錯誤也要在這裡攔下
+                    snapshot = PromptSnapshot(self._snapshot.version + 1, config)
+                except (configparser.Error, OSError, UnicodeDecodeError) as e:
+                    print(f"載入 System Prompts 設定失敗，繼續使用上一份設定：{e}")
+                    self._signature = signature
+                    self._last_check = time.monotonic()
+                    return
+                self.config = config
+                self._signature = signature
+                self._last_check = time.monotonic()
+                self._snapshot = snapshot
+            else:
+                # 如果設定檔不存在，使用預設值
+                self._create_default_config()
+    
+    def _publish(self):
+        """以目前的 config 建立下一個版本的快照並整份替換（呼叫端需持有鎖）"""
+        self._signature = self._file_signature()
+        self._last_check = time.monotonic()
+        self._snapshot = PromptSnapshot(self._snapshot.version + 1, self.config)
+    
+    def _current(self):
+        """
+        取得目前的快照；距離上次檢查超過 check_interval 時才 stat 設定檔，
+        被其他行程或手動修改過才重新載入
+        """
+        if time.monotonic() - self._last_check >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._last_check >= self.check_interval:
+                    self._last_check = time.monotonic()
+                    if self._file_signature() != self._signature:
+                        self.load_config()
+        return self._snapshot
+    
+    @property
+    def version(self):
+        """設定的版本號，設定內容改變時遞增（下游快取可用來當作鍵）"""
+        return self._current().version
     
     def _create_default_config(self):
         """建立預設設定"""
@@ -40,15 +128,22 @@ class PromptManager:
         self.save_config()
     
     def save_config(self):
-        """儲存設定到檔案"""
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            self.config.write(f)
+        """儲存設定到檔案（暫存檔 + atomic rename，其他行程不會讀到寫到一半的檔案）"""
+        with self._lock:
+            tmp_file = f"{self.config_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                self.config.write(f)
+            os.replace(tmp_file, self.config_file)
+            self._publish()
+    
+    def _refresh_before_update(self):
+        """更新前先讀入磁碟上最新的內容，避免覆蓋其他行程的修改（呼叫端需持有鎖）"""
+        if self._file_signature() != self._signature and os.path.exists(self.config_file):
+            self.load_config()
     
     def get_global_rules(self):
         """取得全域規則"""
-        if 'GLOBAL_RULES' in self.config:
-            return self.config['GLOBAL_RULES'].get('global_prompt', '')
-        return ''
+        return self._current().get('GLOBAL_RULES', 'global_prompt')
     
     def get_agent_prompt(self, section, key):
         """
@@ -58,58 +153,70 @@ class PromptManager:
             section: 設定區段名稱 (如 'DOCUMENTATION_CREW')
             key: prompt key (如 'senior_dev_prompt')
         """
-        if section in self.config:
-            return self.config[section].get(key, '')
-        return ''
+        return self._current().get(section, key)
     
     def update_global_rules(self, new_rules):
         """更新全域規則"""
-        if 'GLOBAL_RULES' not in self.config:
-            self.config['GLOBAL_RULES'] = {}
-        self.config['GLOBAL_RULES']['global_prompt'] = new_rules
-        self.save_config()
+        self.update_agent_prompt('GLOBAL_RULES', 'global_prompt', new_rules)
     
     def update_agent_prompt(self, section, key, prompt):
         """更新特定 Agent 的 prompt"""
-        if section not in self.config:
-            self.config[section] = {}
-        self.config[section][key] = prompt
-        self.save_config()
+        with self._lock:
+            self._refresh_before_update()
+            if section not in self.config:
+                self.config[section] = {}
+            self.config[section][key] = prompt
+            self.save_config()
     
-    def get_enhanced_backstory(self, section, key, original_backstory):
+    def get_enhanced_backstory(self, section, key, original_backstory, include_global_rules=True):
         """
-        取得增強版的 backstory（原始 + 全域規則 + 自訂規則）
+        取得增強版的 backstory（全域規則 + 原始 + 自訂規則）
+        
+        組合結果依 (section, key, 原始 backstory, 設定版本) 快取；原始 backstory 多半是函數中的字串常數，
+        同一個物件的雜湊值只會計算一次，命中快取時不需要任何字串串接
         
         Args:
             section: 設定區段
             key: prompt key
             original_backstory: 原始的 backstory
+            include_global_rules: False 時不含全域規則（呼叫端已把全域規則放在 Agent 共用的 prompt 前綴）
             
         Returns:
-            增強後的 backstory
+            增強後的 backstory（interned，相同內容共用同一個字串物件）
         """
-        global_rules = self.get_global_rules()
-        custom_prompt = self.get_agent_prompt(section, key)
-        
-        enhanced = original_backstory
-        
-        if global_rules.strip():
-            enhanced += f"\n\n{global_rules}"
-        
-        if custom_prompt.strip():
-            enhanced += f"\n\n{custom_prompt}"
+        snapshot = self._current()
+        cache_key = (section, key, original_backstory, include_global_rules, snapshot.version)
+        enhanced = self._backstory_cache.get(cache_key)
+        if enhanced is not None:
+            return enhanced
         
+        enhanced = sys.intern(
+            self._compose_backstory(snapshot, section, key, original_backstory, include_global_rules)
+        )
+        with self._lock:
+            # 設定換版後舊的組合不會再被用到，整批丟棄；動態產生的 backstory 過多時也一樣
+            if self._backstory_cache_version != snapshot.version or len(self._backstory_cache) >= 512:
+                self._backstory_cache = {}
+                self._backstory_cache_version = snapshot.version
+            self._backstory_cache[cache_key] = enhanced
         return enhanced
     
+    @staticmethod
+    def _compose_backstory(snapshot, section, key, original_backstory, include_global_rules=True):
+        """組合全域規則、原始 backstory 與自訂 prompt（所有 Agent 共用的全域規則放最前面）"""
+        return layout_backstory(
+            snapshot.get('GLOBAL_RULES', 'global_prompt') if include_global_rules else '',
+            original_backstory,
+            snapshot.get(section, key)
+        )
+    
     def get_all_sections(self):
         """取得所有設定區段"""
-        return self.config.sections()
+        return list(self._current().sections)
     
     def get_section_keys(self, section):
         """取得特定區段的所有 keys"""
-        if section in self.config:
-            return list(self.config[section].keys())
-        return []
+        return list(self._current().sections.get(section, {}))
 
 
 # 全域實例
@@ -0,0 +1,342 @@
+"""
+Prompt Profiler Module
+以固定的範例輸入建立每個 Crew 的 Tasks，統計全域規則、各 Agent、各 Task 範本的 token 數，
+並與儲存的 baseline 比較，prompt 修改讓成本增加超過門檻時檢查失敗
+
+用法：
+    python -m crew_modules.prompt_profiler                     # 與 baseline 比較，退化時 exit 1，沒有 baseline 時 exit 2
+    python -m crew_modules.prompt_profiler --update-baseline   # 以目前的 prompts 更新 baseline
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .context_retriever import estimate_tokens
+from .prompt_layout import INPUTS_HEADER, shared_prefix_text
+from .prompt_manager import prompt_manager
+
+
+DEFAULT_BASELINE_FILE = "prompt_baseline.json"
+# 與 baseline 相比，每個 Crew 的總 token 數最多允許增加的比例
+DEFAULT_THRESHOLD = 0.05
+MODEL = "gpt-4o-mini"
+
+# 文檔生成與 Code Review 使用的範例程式碼（固定內容，讓每次量測的輸入相同）
+SAMPLE_CODE = '''"""Inventory helpers used by the profiler as a stable sample input."""
+
+import sqlite3
+from typing import Dict, List, Optional
+
+
+class Inventory:
+    """Keeps product stock levels in a small SQLite table."""
+    
+    def __init__(self, db_path: str = "inventory.db"):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS stock (sku TEXT PRIMARY KEY, qty INTEGER)")
+    
+    def get(self, sku: str) -> Optional[int]:
+        row = self.conn.execute("SELECT qty FROM stock WHERE sku = ?", (sku,)).fetchone()
+        return row[0] if row else None
+    
+    def adjust(self, sku: str, delta: int) -> int:
+        current = self.get(sku) or 0
+        self.conn.execute("INSERT OR REPLACE INTO stock VALUES (?, ?)", (sku, current + delta))
+        self.conn.commit()
+        return current + delta
+    
+    def report(self) -> List[Dict]:
+        return [{"sku": sku, "qty": qty} for sku, qty in self.conn.execute("SELECT sku, qty FROM stock")]
+'''
+SAMPLE_RESEARCH_QUERY = "FastAPI vs Flask for building REST APIs"
+SAMPLE_NEWS_TOPICS = ["Large Language Models", "AI Agents", "Computer Vision"]
+
+
+_encoder = None
+
+
+def _get_encoder():
+    """取得 tiktoken 編碼器；未安裝或不認得模型時返回 None"""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            try:
+                _encoder = tiktoken.encoding_for_model(MODEL)
+            except KeyError:
+                _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    return _encoder or None
+
+
+def tokenizer_name() -> str:
+    """目前使用的計數方式（寫入 baseline，兩邊不同時無法比較）"""
+    encoder = _get_encoder()
+    return f"tiktoken:{encoder.name}" if encoder else "estimate:chars/4"
+
+
+def count_tokens(text: str) -> int:
+    """
+    計算文字的 token 數（有 tiktoken 時精確計算，否則使用 context_retriever 的粗估）
+    
+    Args:
+        text: 文字內容
+    
+    Returns:
+        token 數
+    """
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def _sample_builders(sample_file: str) -> Dict[str, Callable[[], List]]:
+    """各 Crew 以範例輸入建立 Tasks 的函數（延遲匯入，只在量測時才需要 crewai）"""
+    def documentation():
+        from .documentation_crew_module import build_documentation_tasks
+        return build_documentation_tasks([sample_file], "OUTPUT_DOCUMENTATION.md")
+    
+    def refactoring():
+        from .refactoring_crew_module import build_refactoring_tasks
+        return build_refactoring_tasks(sample_file, "REFACTORING_REPORT.md")
+    
+    def research():
+        from .tech_researcher_module import build_tech_researcher_tasks
+        return build_tech_researcher_tasks(SAMPLE_RESEARCH_QUERY, "TECH_RESEARCH_REPORT.md")
+    
+    def daily_news():
+        from .daily_tech_news_module import build_daily_tech_news_tasks
+        return build_daily_tech_news_tasks(SAMPLE_NEWS_TOPICS, 7, "TECH_NEWS_SAMPLE.md", read_urls=[])
+    
+    return {
+        'documentation': documentation,
+        'refactoring': refactoring,
+        'research': research,
+        'daily_news': daily_news,
+    }
+
+
+def _split_description(description: str) -> Tuple[str, str]:
+    """把 Task description 拆成 (靜態範本, 變動輸入)；沒有 INPUTS 區塊的整段都算範本"""
+    template, header, inputs = description.partition(INPUTS_HEADER)
+    return template, inputs if header else ""
+
+
+def profile_tasks(tasks: List, global_rules: str) -> Dict:
+    """
+    統計一個 Crew 各組成部分的 token 數
+    
+    全域規則出現在 backstory 中時，以「單次 token 數 × 這些 Agent 數」計入；
+    Agent 共用的前綴（system_template，例如 Code Review 的全域規則與程式碼）只計一次，
+    其餘 Agent 命中 provider 的 prefix cache；
+    Agent 只計算自己的 role、goal 與扣除全域規則後的 backstory；
+    Task 分成靜態範本（含 expected_output）與範例輸入兩部分，以執行順序編號
+    （同一個 Agent 負責多個 Task 時不會互相覆蓋）。
+    CrewAI 自己的 system / task 模板文字不在統計範圍內。
+    
+    Args:
+        tasks: build_*_tasks 返回的 Tasks
+        global_rules: 目前的全域規則
+    
+    Returns:
+        {"components": {名稱: token 數}, "total": 總 token 數}
+    """
+    components: Dict[str, int] = {}
+    
+    agents = []
+    for task in tasks:
+        if task.agent not in agents:
+            agents.append(task.agent)
+    
+    global_rules = (global_rules or "").strip("\n")
+    with_rules = [agent for agent in agents if global_rules and agent.backstory.startswith(global_rules)]
+    components["global_rules"] = count_tokens(global_rules) * len(with_rules)
+    
+    prefixes = []
+    for agent in agents:
+        prefix = shared_prefix_text(agent)
+        if prefix and prefix not in prefixes:
+            prefixes.append(prefix)
+    if prefixes:
+        components["shared_prefix"] = sum(count_tokens(prefix) for prefix in prefixes)
+    
+    for agent in agents:
+        backstory = agent.backstory
+        if global_rules and backstory.startswith(global_rules):
+            backstory = backstory[len(global_rules):]
+        components[f"agent:{agent.role}"] = count_tokens(f"{agent.role}\n{agent.goal}\n{backstory}")
+    
+    for index, task in enumerate(tasks, 1):
+        template, inputs = _split_description(task.description)
+        components[f"task{index}:{task.agent.role}"] = count_tokens(f"{template}\n{task.expected_output}")
+        if inputs:
+            components[f"inputs{index}:{task.agent.role}"] = count_tokens(inputs)
+    
+    return {"components": components, "total": sum(components.values())}
+
+
+def profile_crews(crew_types: Optional[List[str]] = None) -> Dict:
+    """
+    以範例輸入建立各 Crew 的 Tasks（不呼叫模型）並統計 token 數
+    
+    Args:
+        crew_types: 要量測的 Crew 類型，None 表示全部
+    
+    Returns:
+        {"tokenizer", "generated_at", "crews": {crew_type: profile_tasks 的結果}}
+    """
+    # 建立 LLM 物件時 OpenAI client 需要 API key；量測過程不會送出任何請求
+    os.environ.setdefault("OPENAI_API_KEY", "prompt-profiler")
+    
+    work_dir = tempfile.mkdtemp(prefix="prompt_profiler_")
+    sample_file = os.path.join(work_dir, "inventory.py")
+    with open(sample_file, 'w', encoding='utf-8') as f:
+        f.write(SAMPLE_CODE)
+    
+    try:
+        builders = _sample_builders(sample_file)
+        global_rules = prompt_manager.get_global_rules()
+        crews = {}
+        for crew_type, build in builders.items():
+            if crew_types and crew_type not in crew_types:
+                continue
+            crews[crew_type] = profile_tasks(build(), global_rules)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return {
+        "tokenizer": tokenizer_name(),
+        "generated_at": datetime.now().isoformat(),
+        "crews": crews
+    }
+
+
+def load_baseline(path: str = DEFAULT_BASELINE_FILE) -> Optional[Dict]:
+    """載入 baseline，不存在時返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(profile: Dict, path: str = DEFAULT_BASELINE_FILE):
+    """儲存 baseline"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def compare_profiles(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    找出總 token 數比 baseline 增加超過門檻的 Crew
+    
+    Args:
+        current: 目前的量測結果
+        baseline: baseline 量測結果
+        threshold: 允許增加的比例
+    
+    Returns:
+        退化列表，每筆包含 crew_type、前後總數、增加比例，以及增加的組成部分
+    """
+    regressions = []
+    for crew_type, profile in current["crews"].items():
+        before = baseline.get("crews", {}).get(crew_type)
+        if not before or not before["total"]:
+            continue
+        growth = profile["total"] / before["total"] - 1
+        if growth <= threshold:
+            continue
+        
+        grown = {}
+        for name, tokens in profile["components"].items():
+            delta = tokens - before["components"].get(name, 0)
+            if delta > 0:
+                grown[name] = delta
+        regressions.append({
+            "crew_type": crew_type,
+            "before": before["total"],
+            "after": profile["total"],
+            "growth": growth,
+            "components": dict(sorted(grown.items(), key=lambda item: -item[1]))
+        })
+    return regressions
+
+
+def format_profile(profile: Dict, baseline: Optional[Dict] = None) -> str:
+    """以文字表格呈現量測結果（有 baseline 時附上差異）"""
+    lines = [f"Tokenizer：{profile['tokenizer']}"]
+    for crew_type, crew in profile["crews"].items():
+        before = (baseline or {}).get("crews", {}).get(crew_type, {})
+        lines.append("")
+        lines.append(f"[{crew_type}]")
+        for name, tokens in crew["components"].items():
+            lines.append(_format_row(name, tokens, before.get("components", {}).get(name)))
+        lines.append(_format_row("總計", crew["total"], before.get("total")))
+    return "\n".join(lines)
+
+
+def _format_row(name: str, tokens: int, before: Optional[int]) -> str:
+    """一列：名稱、token 數與相對 baseline 的差異"""
+    row = f"  {name:<48} {tokens:>7,}"
+    if before is not None and tokens != before:
+        row += f"  ({tokens - before:+,})"
+    return row
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令列入口；返回 exit code（0 通過、1 退化、2 無法比較）"""
+    parser = argparse.ArgumentParser(description="量測各 Crew prompt 的 token 數並與 baseline 比較")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="baseline JSON 檔路徑")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="每個 Crew 總 token 數允許增加的比例（預設 0.05）")
+    parser.add_argument("--crew", action="append", help="只量測指定的 Crew（可重複）")
+    parser.add_argument("--update-baseline", action="store_true", help="以目前的量測結果覆寫 baseline")
+    args = parser.parse_args(argv)
+    
+    profile = profile_crews(args.crew)
+    baseline = load_baseline(args.baseline)
+    print(format_profile(profile, baseline))
+    
+    if args.update_baseline:
+        if baseline and args.crew:
+            # 只量測部分 Crew 時保留其他 Crew 的 baseline
+            profile["crews"] = {**baseline.get("crews", {}), **profile["crews"]}
+        save_baseline(profile, args.baseline)
+        print(f"\n已更新 baseline：{args.baseline}")
+        return 0
+    
+    if baseline is None:
+        print(f"\n找不到 baseline（{args.baseline}），無法比較；請先執行 --update-baseline 並提交 baseline")
+        return 2
+    if baseline.get("tokenizer") != profile["tokenizer"]:
+        print(f"\nbaseline 使用 {baseline.get('tokenizer')}，目前為 {profile['tokenizer']}，無法比較；請重新產生 baseline")
+        return 2
+    
+    regressions = compare_profiles(profile, baseline, args.threshold)
+    if not regressions:
+        print(f"\n沒有 Crew 的 prompt 成本增加超過 {args.threshold:.0%}")
+        return 0
+    
+    print("")
+    for regression in regressions:
+        print(
+            f"❌ {regression['crew_type']}：{regression['before']:,} → {regression['after']:,} tokens "
+            f"(+{regression['growth']:.1%}，門檻 {args.threshold:.0%})"
+        )
+        for name, delta in regression["components"].items():
+            print(f"     {name:<46} +{delta:,}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,25 +6,34 @@ Refactoring Crew Module
 import os
 import threading
 import time
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew, Process, LLM
 from .prompt_manager import prompt_manager
+from .run_telemetry import RunTelemetry
+from .prompt_layout import layout_task, shared_prompt_templates, task_prompts, prefix_cache_tracker
 from .utf8_file_tool import read_files_content
+from .git_diff import read_diff_content
 
 load_dotenv()
 
-def run_refactoring_crew(target_file: str, output_file: str = "REFACTORING_REPORT.md", progress_callback: Optional[callable] = None):
+def build_refactoring_tasks(
+    target_file: str,
+    output_file: str = "REFACTORING_REPORT.md",
+    base_ref: Optional[str] = None,
+    diff_context_lines: int = 3
+) -> List[Task]:
     """
-    執行 Code Review 與重構 Crew
+    建立 Code Review 與重構 Crew 的 Agents 與 Tasks（不執行）
     
     Args:
         target_file: 要審查的代碼文件路徑
         output_file: 輸出的報告文件名
-        progress_callback: 進度回調函數，用於顯示 Agent 進度
+        base_ref: 指定時只審查相對於此 Git ref 的變更區塊（例如 'main'）
+        diff_context_lines: diff 模式下每個變更區塊保留的上下文行數
         
     Returns:
-        執行結果
+        依執行順序排列的 Tasks（task.agent 為負責的 Agent）
     """
     
     # 初始化更快的 LLM
@@ -36,7 +45,25 @@ def run_refactoring_crew(target_file: str, output_file: str = "REFACTORING_REPOR
     
     # 預先讀取文件內容（避免編碼問題）
     abs_path = os.path.abspath(target_file)
-    file_content = read_files_content([abs_path])
+    if base_ref:
+        # diff 模式：只送出變更區塊與少量上下文，token 數隨變更大小而非文件大小成長
+        file_content = read_diff_content(abs_path, base_ref, diff_context_lines)
+        if file_content is None:
+            raise ValueError(f"{abs_path} 相對於 {base_ref} 沒有任何變更")
+        content_intro = f"Here are the changed hunks compared against `{base_ref}` (new line numbers on the left). Focus the review on the added/modified lines:"
+        refactor_scope = "Provide refactored versions of the changed hunks with:"
+    else:
+        file_content = read_files_content([abs_path])
+        content_intro = "Here is the complete content (already read with UTF-8 encoding):"
+        refactor_scope = "Provide the complete refactored version of the code with:"
+    
+    # 三個 Agent 都需要看程式碼：全域規則與程式碼放在每個 Agent prompt 的最前面（system_template），
+    # 三次呼叫的前綴逐字相同，provider 的 prefix cache 讓程式碼只需完整計費一次；
+    # backstory 因此不再重複帶全域規則，Task description 也不再附上程式碼
+    shared_templates = shared_prompt_templates([
+        ("Global rules", prompt_manager.get_global_rules()),
+        ("Code", f"{content_intro}\n\n{file_content}")
+    ])
     
     # Agent 1: Security Auditor (資安專家)
     security_auditor_backstory = """You are a cybersecurity expert specializing in application security.
@@ -48,21 +75,20 @@ def run_refactoring_crew(target_file: str, output_file: str = "REFACTORING_REPOR
     enhanced_security_backstory = prompt_manager.get_enhanced_backstory(
         'REFACTORING_CREW',
         'security_auditor_prompt',
-        security_auditor_backstory
+        security_auditor_backstory,
+        include_global_rules=False
     )
     
     security_auditor = Agent(
         role='Security Auditor',
-        goal=f'Identify security vulnerabilities and potential risks in {target_file}',
+        goal='Identify security vulnerabilities and potential risks in the code under review',
         backstory=enhanced_security_backstory,
         llm=fast_llm,  # 使用更快的 LLM
         verbose=True,
-        allow_delegation=False
+        allow_delegation=False,
+        **shared_templates
     )
     
-    if progress_callback:
-        progress_callback("Security Auditor", "running", 3, 0)
-    
     # Agent 2: Clean Code Reviewer (代碼潔癖者)
     clean_code_reviewer_backstory = """You are a software craftsmanship advocate who lives and breathes clean code principles.
         You're an expert in SOLID principles, design patterns, naming conventions, function complexity,
@@ -74,7 +100,8 @@ def run_refactoring_crew(target_file: str, output_file: str = "REFACTORING_REPOR
     enhanced_clean_code_backstory = prompt_manager.get_enhanced_backstory(
         'REFACTORING_CREW',
         'clean_code_reviewer_prompt',
-        clean_code_reviewer_backstory
+        clean_code_reviewer_backstory,
+        include_global_rules=False
     )
     
     clean_code_reviewer = Agent(
@@ -83,7 +110,8 @@ def run_refactoring_crew(target_file: str, output_file: str = "REFACTORING_REPOR
         backstory=enhanced_clean_code_backstory,
         llm=fast_llm,  # 使用更快的 LLM
         verbose=True,
-        allow_delegation=False
+        allow_delegation=False,
+        **shared_templates
     )
     
     # Agent 3: Refactoring Specialist (重構專家)
@@ -96,7 +124,8 @@ def run_refactoring_crew(target_file: str, output_file: str = "REFACTORING_REPOR
     enhanced_refactoring_backstory = prompt_manager.get_enhanced_backstory(
         'REFACTORING_CREW',
         'refactoring_specialist_prompt',
-        refactoring_specialist_backstory
+        refactoring_specialist_backstory,
+        include_global_rules=False
     )
     
     refactoring_specialist = Agent(
@@ -105,18 +134,14 @@ def run_refactoring_crew(target_file: str, output_file: str = "REFACTORING_REPOR
         backstory=enhanced_refactoring_backstory,
         llm=fast_llm,  # 使用更快的 LLM
         verbose=True,
-        allow_delegation=False
+        allow_delegation=False,
+        **shared_templates
     )
     
     # Task 1: Security Audit
+    # 程式碼已在 Agent 共用的前綴中，Task 只帶靜態指示與檔案路徑
     security_task = Task(
-        description=f"""Perform a comprehensive security audit on the following code file.
-
-File: {abs_path}
-
-Here is the complete content (already read with UTF-8 encoding):
-
-{file_content}
+        description=layout_task("""Perform a comprehensive security audit on the code in the Code section at the start of this prompt.
 
 Check for:
 1. **Hardcoded Secrets**: API keys, passwords, tokens embedded in code
@@ -135,18 +160,16 @@ For each issue found, provide:
 - Description of the vulnerability
 - Potential impact
 - Line numbers (if applicable)
-""",
+""", [
+            ("File", abs_path)
+        ]),
         agent=security_auditor,
         expected_output="A detailed security audit report with categorized vulnerabilities"
     )
     
     # Task 2: Code Quality Review
     quality_task = Task(
-        description=f"""Perform a thorough code quality review on the following code file.
-
-File: {abs_path}
-
-Code content (already provided above in the security task context).
+        description=layout_task("""Perform a thorough code quality review on the code in the Code section at the start of this prompt.
 
 Analyze:
         1. **Naming Conventions**: Variable, function, class names clarity and consistency
@@ -174,15 +197,17 @@ Analyze:
         - Description
         - Impact on maintainability
         - Suggested improvement
-        """,
+        """, [
+            ("File", abs_path)
+        ]),
         agent=clean_code_reviewer,
         expected_output="A comprehensive code quality report with improvement suggestions"
     )
     
     # Task 3: Refactoring and Improvement
     refactoring_task = Task(
-        description=f"""Based on the security audit and code quality review, create a comprehensive
-        refactoring report with improved code.
+        description=layout_task(f"""Based on the security audit and code quality review, create a comprehensive
+        refactoring report with improved code for the code in the Code section at the start of this prompt.
         
         Your report should include:
         
@@ -201,7 +226,7 @@ Analyze:
         List low priority improvements
         
         ## ✨ Refactored Code
-        Provide the complete refactored version of the code with:
+        {refactor_scope}
         - All critical security issues fixed
         - Improved naming and structure
         - Better error handling
@@ -219,20 +244,57 @@ Analyze:
         Suggest test cases to verify the refactored code
         
         Use proper markdown formatting with code blocks, tables, and clear sections.
-        Save the report to: {output_file}
-        """,
+        Save the report to the output file given in the inputs below.
+        """, [
+            ("File", abs_path),
+            ("Output file", output_file)
+        ]),
         agent=refactoring_specialist,
         expected_output=f"A complete refactoring report with improved code saved as {output_file}",
         context=[security_task, quality_task],
         output_file=output_file
     )
     
+    return [security_task, quality_task, refactoring_task]
+
+
+def run_refactoring_crew(
+    target_file: str,
+    output_file: str = "REFACTORING_REPORT.md",
+    progress_callback: Optional[callable] = None,
+    base_ref: Optional[str] = None,
+    diff_context_lines: int = 3,
+    telemetry: Optional[RunTelemetry] = None
+):
+    """
+    執行 Code Review 與重構 Crew
+    
+    Args:
+        target_file: 要審查的代碼文件路徑
+        output_file: 輸出的報告文件名
+        progress_callback: 進度回調函數，用於顯示 Agent 進度
+        base_ref: 指定時只審查相對於此 Git ref 的變更區塊（例如 'main'）
+        diff_context_lines: diff 模式下每個變更區塊保留的上下文行數
+        telemetry: 執行量測（RunTelemetry），記錄各 Agent / Task 的時間、token 用量與成本
+    
+    Returns:
+        執行結果
+    """
+    tasks = build_refactoring_tasks(target_file, output_file, base_ref, diff_context_lines)
+    
+    # 量測與上一次執行的共同前綴長度
+    prefix_report = prefix_cache_tracker.measure('refactoring', task_prompts(tasks))
+    if telemetry:
+        telemetry.prefix_cache = prefix_report
+    
     # 建立 Crew
     crew = Crew(
-        agents=[security_auditor, clean_code_reviewer, refactoring_specialist],
-        tasks=[security_task, quality_task, refactoring_task],
+        agents=[task.agent for task in tasks],
+        tasks=tasks,
         process=Process.sequential,
-        verbose=True
+        verbose=True,
+        step_callback=telemetry.step_callback if telemetry else None,
+        task_callback=telemetry.task_callback if telemetry else None
     )
     
     # 使用執行緒來模擬進度更新
@@ -242,11 +304,15 @@ Analyze:
     
     def run_crew():
         nonlocal result, error
+        if telemetry:
+            telemetry.start()
         try:
             result = crew.kickoff()
         except Exception as e:
             error = e
         finally:
+            if telemetry:
+                telemetry.finish(result)
             execution_done.set()
     
     # 啟動執行緒
@@ -0,0 +1,266 @@
+"""
+Report Search Module
+以 SQLite FTS5 建立所有歷史報告的全文索引，支援排序與摘要片段
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from .report_store import report_store
+
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS report_fts USING fts5(
+    record_id UNINDEXED,
+    crew_type UNINDEXED,
+    timestamp UNINDEXED,
+    output_file UNINDEXED,
+    report_hash UNINDEXED,
+    inputs,
+    content,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+-- FTS5 的 UNINDEXED 欄位無法建立索引，以一般資料表記錄 record_id → FTS rowid，刪除與篩選都走索引
+CREATE TABLE IF NOT EXISTS report_rows (
+    record_id TEXT PRIMARY KEY,
+    fts_rowid INTEGER NOT NULL,
+    crew_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_report_rows_type ON report_rows(crew_type);
+"""
+
+# 搜尋時 inputs（檔案路徑、研究問題）的權重高於報告內文
+INPUTS_WEIGHT = 2.0
+CONTENT_WEIGHT = 1.0
+
+_QUERY_TERM = re.compile(r'"[^"]+"|\S+')
+
+
+def build_match_query(query: str) -> str:
+    """
+    把使用者輸入轉成安全的 FTS5 查詢：每個詞加上引號，多個詞為 AND，最後一個詞支援前綴比對
+    
+    Args:
+        query: 使用者輸入，可用雙引號包住片語
+    
+    Returns:
+        FTS5 MATCH 表達式；沒有有效詞彙時為空字串
+    """
+    terms = [t.strip('"').replace('"', '') for t in _QUERY_TERM.findall(query)]
+    terms = [t for t in terms if t.strip()]
+    if not terms:
+        return ""
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += '*'
+    return " ".join(quoted)
+
+
+class ReportSearchIndex:
+    """歷史報告的全文索引，透過 HistoryManager 的事件增量更新"""
+    
+    def __init__(self, db_path: str = "report_search.db"):
+        """
+        初始化全文索引
+        
+        Args:
+            db_path: SQLite 資料庫路徑
+        """
+        self.db_path = db_path
+        self._synced = False
+        self._sync_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # 舊版索引沒有 report_rows，第一次啟動時從 FTS 表補齊
+            if not conn.execute("SELECT 1 FROM report_rows LIMIT 1").fetchone():
+                conn.execute(
+                    "INSERT OR REPLACE INTO report_rows (record_id, fts_rowid, crew_type) "
+                    "SELECT record_id, rowid, crew_type FROM report_fts"
+                )
+    
+    @contextmanager
+    def _connect(self):
+        """建立連線（每個操作各自連線，可安全地在 Streamlit 多執行緒中使用）"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _read_content(record: Dict) -> str:
+        """取得報告內容：優先使用報告儲存區，舊紀錄讀取輸出檔案"""
+        if record.get("report_hash"):
+            content = report_store.get(record["report_hash"])
+            if content is not None:
+                return content
+        
+        output_file = record.get("output_file")
+        if output_file and os.path.exists(output_file):
+            try:
+                with open(output_file, 'r', encoding='utf-8', errors='ignore') as f:
+                    return f.read()
+            except OSError:
+                pass
+        return ""
+    
+    def index_record(self, record: Dict, conn=None):
+        """
+        新增或更新一筆紀錄的索引
+        
+        Args:
+            record: 歷史紀錄
+            conn: 既有連線（批次處理時使用）
+        """
+        if not record.get("success"):
+            return
+        
+        row = (
+            record["id"],
+            record.get("crew_type", ""),
+            record.get("timestamp", ""),
+            record.get("output_file") or "",
+            record.get("report_hash") or "",
+            "\n".join(record.get("input_files") or []),
+            self._read_content(record)
+        )
+        
+        if conn is None:
+            with self._connect() as conn:
+                self._write_row(conn, row)
+        else:
+            self._write_row(conn, row)
+    
+    @staticmethod
+    def _delete_rows(conn, record_ids: List[str]):
+        """以 report_rows 找到 FTS rowid 後依 rowid 刪除（不需要掃描 FTS 表）"""
+        for record_id in record_ids:
+            row = conn.execute("SELECT fts_rowid FROM report_rows WHERE record_id = ?", (record_id,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM report_fts WHERE rowid = ?", (row["fts_rowid"],))
+                conn.execute("DELETE FROM report_rows WHERE record_id = ?", (record_id,))
+    
+    def _write_row(self, conn, row: tuple):
+        """以 record_id 取代既有的索引列"""
+        self._delete_rows(conn, [row[0]])
+        cursor = conn.execute("INSERT INTO report_fts VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        conn.execute(
+            "INSERT INTO report_rows (record_id, fts_rowid, crew_type) VALUES (?, ?, ?)",
+            (row[0], cursor.lastrowid, row[1])
+        )
+    
+    def remove_record(self, record_id: str):
+        """移除一筆紀錄的索引"""
+        with self._connect() as conn:
+            self._delete_rows(conn, [record_id])
+    
+    def clear(self, crew_type: Optional[str] = None):
+        """清除索引，crew_type 為 None 時清除全部"""
+        with self._connect() as conn:
+            if crew_type:
+                conn.execute(
+                    "DELETE FROM report_fts WHERE rowid IN "
+                    "(SELECT fts_rowid FROM report_rows WHERE crew_type = ?)",
+                    (crew_type,)
+                )
+                conn.execute("DELETE FROM report_rows WHERE crew_type = ?", (crew_type,))
+            else:
+                conn.execute("DELETE FROM report_fts")
+                conn.execute("DELETE FROM report_rows")
+    
+    def on_history_event(self, event: str, payload):
+        """
+        HistoryManager 的事件處理函數
+        
+        Args:
+            event: 'add'、'delete' 或 'clear'
+            payload: 新增的紀錄、刪除的紀錄 ID，或清除的 crew_type
+        """
+        if event == "add":
+            self.index_record(payload)
+        elif event == "delete":
+            self.remove_record(payload)
+        elif event == "clear":
+            self.clear(payload)
+    
+    def sync(self, records: List[Dict], force: bool = False):
+        """
+        與歷史紀錄同步：補上尚未索引的紀錄（例如舊資料），移除已不存在的紀錄
+        
+        Args:
+            records: 目前所有的歷史紀錄
+            force: 預設每個行程只同步一次；True 時一律重新比對（例如清理過期紀錄之後）
+        """
+        with self._sync_lock:
+            if self._synced and not force:
+                return
+            
+            with self._connect() as conn:
+                indexed = {row["record_id"] for row in conn.execute("SELECT record_id FROM report_rows")}
+                current = {record["id"] for record in records}
+                
+                for record in records:
+                    if record["id"] not in indexed:
+                        self.index_record(record, conn)
+                self._delete_rows(conn, list(indexed - current))
+            
+            self._synced = True
+    
+    def search(self, query: str, crew_type: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """
+        全文搜尋報告
+        
+        Args:
+            query: 搜尋字串
+            crew_type: 限定 Crew 類型
+            limit: 最多返回筆數
+        
+        Returns:
+            依相關度排序的結果，每筆包含紀錄欄位與 snippet
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        
+        sql = (
+            "SELECT record_id, crew_type, timestamp, output_file, report_hash, inputs, "
+            "snippet(report_fts, 6, '**', '**', ' … ', 16) AS snippet, "
+            f"bm25(report_fts, 0, 0, 0, 0, 0, {INPUTS_WEIGHT}, {CONTENT_WEIGHT}) AS rank "
+            "FROM report_fts WHERE report_fts MATCH ?"
+        )
+        params = [match]
+        if crew_type:
+            sql += " AND rowid IN (SELECT fts_rowid FROM report_rows WHERE crew_type = ?)"
+            params.append(crew_type)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            print(f"搜尋報告失敗：{e}")
+            return []
+        
+        return [
+            {
+                "id": row["record_id"],
+                "crew_type": row["crew_type"],
+                "timestamp": row["timestamp"],
+                "output_file": row["output_file"],
+                "report_hash": row["report_hash"] or None,
+                "input_files": row["inputs"].split("\n") if row["inputs"] else [],
+                "snippet": row["snippet"],
+                "score": -row["rank"]
+            }
+            for row in rows
+        ]
+
+
+# 全域實例
+report_search_index = ReportSearchIndex()
@@ -0,0 +1,188 @@
+"""
+Report Store Module
+以內容雜湊儲存壓縮後的報告，相同內容只存一份，並以共用的 LRU 快取延遲解壓
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+
+class ReportStore:
+    """content-addressed 的報告儲存區（reports/ab/abcdef....md.gz）"""
+    
+    def __init__(self, store_dir: str = "reports", cache_bytes: int = 32 * 1024 * 1024):
+        """
+        初始化報告儲存區
+        
+        Args:
+            store_dir: 儲存目錄
+            cache_bytes: 記憶體 LRU 快取的上限（以解壓後的字元數計）
+        """
+        self.store_dir = store_dir
+        self.cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cached_bytes = 0
+    
+    def _path(self, report_hash: str) -> str:
+        """雜湊對應的檔案路徑（前兩碼分目錄，避免單一目錄檔案過多）"""
+        return os.path.join(self.store_dir, report_hash[:2], f"{report_hash}.md.gz")
+    
+    def put(self, content: str) -> str:
+        """
+        儲存報告內容；相同內容已存在時直接返回雜湊
+        
+        Args:
+            content: 報告內容
+        
+        Returns:
+            內容雜湊
+        """
+        data = content.encode('utf-8')
+        report_hash = hashlib.blake2b(data, digest_size=20).hexdigest()
+        path = self._path(report_hash)
+        
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(data)
+            # 同時寫入相同內容時，rename 保證最後只有一份完整的檔案
+            os.replace(tmp_path, path)
+        
+        return report_hash
+    
+    def put_file(self, file_path: str) -> Optional[str]:
+        """
+        儲存報告檔案
+        
+        Args:
+            file_path: 報告檔案路徑
+        
+        Returns:
+            內容雜湊；檔案無法讀取時返回 None
+        """
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return self.put(f.read())
+        except OSError as e:
+            print(f"儲存報告失敗：{e}")
+            return None
+    
+    def exists(self, report_hash: str) -> bool:
+        """檢查報告是否存在"""
+        return bool(report_hash) and os.path.exists(self._path(report_hash))
+    
+    def get(self, report_hash: str) -> Optional[str]:
+        """
+        取得報告內容（優先從 LRU 快取讀取，所有 session 共用同一份字串）
+        
+        Args:
+            report_hash: 內容雜湊
+        
+        Returns:
+            報告內容；不存在時返回 None
+        """
+        with self._lock:
+            content = self._cache.get(report_hash)
+            if content is not None:
+                self._cache.move_to_end(report_hash)
+                return content
+        
+        try:
+            with gzip.open(self._path(report_hash), 'rb') as f:
+                content = f.read().decode('utf-8')
+        except OSError:
+            return None
+        
+        self._remember(report_hash, content)
+        return content
+    
+    def _remember(self, report_hash: str, content: str):
+        """放入 LRU 快取，超過上限時淘汰最久未使用的報告"""
+        size = len(content)
+        if size > self.cache_bytes:
+            return
+        
+        with self._lock:
+            if report_hash in self._cache:
+                return
+            self._cache[report_hash] = content
+            self._cached_bytes += size
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+    
+    def iter_chunks(self, report_hash: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        以串流方式逐段解壓報告，不需要把整份內容放進記憶體
+        
+        Args:
+            report_hash: 內容雜湊
+            chunk_size: 每段的位元組數
+        
+        Returns:
+            UTF-8 位元組區塊的迭代器
+        """
+        with gzip.open(self._path(report_hash), 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    
+    def iter_reports(self) -> Iterator[Tuple[str, int, float]]:
+        """
+        列出儲存區中的所有報告
+        
+        Returns:
+            (雜湊, 壓縮後位元組數, mtime) 的迭代器
+        """
+        if not os.path.isdir(self.store_dir):
+            return
+        with os.scandir(self.store_dir) as buckets:
+            for bucket in buckets:
+                if not bucket.is_dir():
+                    continue
+                with os.scandir(bucket.path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".md.gz"):
+                            stat = entry.stat()
+                            yield entry.name[:-len(".md.gz")], stat.st_size, stat.st_mtime
+    
+    def size(self, report_hash: str) -> int:
+        """報告壓縮後的位元組數，不存在時為 0"""
+        try:
+            return os.path.getsize(self._path(report_hash))
+        except OSError:
+            return 0
+    
+    def delete(self, report_hash: str) -> int:
+        """
+        刪除報告
+        
+        Args:
+            report_hash: 內容雜湊
+        
+        Returns:
+            釋放的位元組數（壓縮後）
+        """
+        path = self._path(report_hash)
+        with self._lock:
+            content = self._cache.pop(report_hash, None)
+            if content is not None:
+                self._cached_bytes -= len(content)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+
+# 全域實例（同一個 Streamlit 行程的所有 session 共用快取）
+report_store = ReportStore()
@@ -0,0 +1,394 @@
+"""
+Retention Module
+依照年齡、筆數與總容量清理歷史紀錄，並回收被淘汰紀錄的報告、輸出檔案與上傳暫存檔
+"""
+
+import fnmatch
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from filelock import FileLock
+
+from .report_store import report_store
+from .report_search import report_search_index
+from .history_manager import history_manager
+
+
+TEMP_FILE_PATTERN = "temp_*.py"
+
+
+def _env_number(name: str, default, cast=int):
+    """讀取數值型環境變數，空字串或 0 表示不限制"""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        print(f"環境變數 {name} 格式錯誤：{value}")
+        return default
+    return number or None
+
+
+class RetentionPolicy:
+    """保留策略；數值為 None 時表示不限制"""
+    
+    def __init__(
+        self,
+        max_age_days: Optional[float] = None,
+        max_records_per_type: Optional[int] = 100,
+        max_total_bytes: Optional[int] = None,
+        temp_file_max_age_hours: Optional[float] = 24,
+        max_news_articles: Optional[int] = 500,
+        grace_seconds: float = 600,
+        background_interval_hours: Optional[float] = None
+    ):
+        """
+        初始化保留策略
+        
+        Args:
+            max_age_days: 紀錄最多保留的天數
+            max_records_per_type: 每個 crew_type 最多保留的紀錄筆數
+            max_total_bytes: 紀錄引用的報告與輸出檔案的總容量上限，超過時從最舊的紀錄開始刪除
+            temp_file_max_age_hours: 上傳暫存檔（temp_*.py）最多保留的小時數
+            max_news_articles: tech_news_history.json 最多保留的已讀文章數
+            grace_seconds: 剛寫入的報告在這段時間內不會被視為孤立（避免與進行中的執行競爭）
+            background_interval_hours: 背景定期清理的間隔小時數，None 表示不在背景執行（只能手動清理）
+        """
+        self.max_age_days = max_age_days
+        self.max_records_per_type = max_records_per_type
+        self.max_total_bytes = max_total_bytes
+        self.temp_file_max_age_hours = temp_file_max_age_hours
+        self.max_news_articles = max_news_articles
+        self.grace_seconds = grace_seconds
+        self.background_interval_hours = background_interval_hours
+    
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """
+        從環境變數建立保留策略
+        
+        Returns:
+            RETENTION_MAX_AGE_DAYS、RETENTION_MAX_RECORDS、RETENTION_MAX_MB、
+            RETENTION_TEMP_FILE_HOURS、RETENTION_MAX_NEWS_ARTICLES、RETENTION_INTERVAL_HOURS 對應的策略
+        """
+        max_mb = _env_number("RETENTION_MAX_MB", None, float)
+        return cls(
+            max_age_days=_env_number("RETENTION_MAX_AGE_DAYS", None, float),
+            max_records_per_type=_env_number("RETENTION_MAX_RECORDS", 100),
+            max_total_bytes=int(max_mb * 1024 * 1024) if max_mb else None,
+            temp_file_max_age_hours=_env_number("RETENTION_TEMP_FILE_HOURS", 24, float),
+            max_news_articles=_env_number("RETENTION_MAX_NEWS_ARTICLES", 500),
+            background_interval_hours=_env_number("RETENTION_INTERVAL_HOURS", None, float)
+        )
+
+
+class RetentionManager:
+    """套用保留策略並回收磁碟空間，可在背景執行緒定期執行"""
+    
+    def __init__(
+        self,
+        history_manager,
+        policy: Optional[RetentionPolicy] = None,
+        store=None,
+        work_dir: str = ".",
+        news_history_file: str = "tech_news_history.json"
+    ):
+        """
+        初始化清理管理器
+        
+        Args:
+            history_manager: HistoryManager 實例
+            policy: 保留策略，None 時從環境變數讀取
+            store: 報告儲存區，預設為全域 report_store
+            work_dir: 輸出檔案與上傳暫存檔所在的目錄
+            news_history_file: 已讀新聞紀錄檔案
+        """
+        self.history_manager = history_manager
+        self.policy = policy or RetentionPolicy.from_env()
+        self.store = store or report_store
+        self.work_dir = work_dir
+        self.news_history_file = news_history_file
+        
+        self._run_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.last_report: Optional[Dict] = None
+    
+    def _output_path(self, output_file: str) -> str:
+        """輸出檔案的絕對路徑（相對路徑以 work_dir 為準）"""
+        return os.path.abspath(os.path.join(self.work_dir, output_file))
+    
+    @staticmethod
+    def _file_size(path: str) -> int:
+        """檔案位元組數，不存在時為 0"""
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    
+    def _select_expired(self, records: List[Dict]) -> List[str]:
+        """
+        依照年齡、筆數與總容量選出要刪除的紀錄
+        
+        Args:
+            records: 所有紀錄（由新到舊）
+        
+        Returns:
+            要刪除的紀錄 ID
+        """
+        policy = self.policy
+        expired = set()
+        
+        if policy.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=policy.max_age_days)).isoformat()
+            expired.update(r["id"] for r in records if r.get("timestamp", "") < cutoff)
+        
+        if policy.max_records_per_type:
+            seen: Dict[str, int] = {}
+            for record in records:
+                crew_type = record.get("crew_type")
+                seen[crew_type] = seen.get(crew_type, 0) + 1
+                if seen[crew_type] > policy.max_records_per_type:
+                    expired.add(record["id"])
+        
+        if policy.max_total_bytes:
+            # 同一份報告或輸出檔案可能被多筆紀錄引用，以參考計數計算刪除後實際釋放的容量
+            kept = [r for r in records if r["id"] not in expired]
+            refcounts: Dict[str, int] = {}
+            sizes: Dict[str, int] = {}
+            for record in kept:
+                for key, size in self._artifacts(record):
+                    refcounts[key] = refcounts.get(key, 0) + 1
+                    sizes[key] = size
+            total = sum(sizes.values())
+            
+            for record in reversed(kept):
+                if total <= policy.max_total_bytes:
+                    break
+                expired.add(record["id"])
+                for key, _ in self._artifacts(record):
+                    refcounts[key] -= 1
+                    if refcounts[key] == 0:
+                        total -= sizes[key]
+        
+        # 保持由新到舊的順序，方便除錯時對照
+        return [r["id"] for r in records if r["id"] in expired]
+    
+    def _artifacts(self, record: Dict):
+        """紀錄引用的檔案：(識別鍵, 位元組數)"""
+        if record.get("report_hash"):
+            yield f"report:{record['report_hash']}", self.store.size(record["report_hash"])
+        if record.get("output_file"):
+            path = self._output_path(record["output_file"])
+            yield f"file:{path}", self._file_size(path)
+    
+    def _collect_orphan_reports(self, records: List[Dict], now: float) -> Dict[str, int]:
+        """刪除沒有任何紀錄引用的報告（報告儲存區只存放歷史紀錄寫入的內容）"""
+        referenced = {r["report_hash"] for r in records if r.get("report_hash")}
+        count = freed = 0
+        for report_hash, _, mtime in list(self.store.iter_reports()):
+            if report_hash in referenced or now - mtime < self.policy.grace_seconds:
+                continue
+            freed += self.store.delete(report_hash)
+            count += 1
+        return {"count": count, "bytes": freed}
+    
+    def _collect_files(self, should_delete) -> Dict[str, int]:
+        """刪除 work_dir 中 should_delete(entry, mtime) 為 True 的檔案"""
+        count = freed = 0
+        try:
+            entries = list(os.scandir(self.work_dir))
+        except OSError:
+            return {"count": 0, "bytes": 0}
+        
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+                if should_delete(entry, stat.st_mtime):
+                    os.remove(entry.path)
+                    count += 1
+                    freed += stat.st_size
+            except OSError as e:
+                print(f"刪除檔案失敗：{e}")
+        return {"count": count, "bytes": freed}
+    
+    def _collect_evicted_outputs(self, evicted: List[Dict], kept: List[Dict]) -> Dict[str, int]:
+        """
+        刪除這次清理淘汰的紀錄所記錄的輸出檔案（報告內容已保存在報告儲存區）
+        
+        只處理歷史紀錄中記錄過的檔案，不掃描目錄；仍被其他紀錄引用的檔案會保留
+        
+        Args:
+            evicted: 這次刪除的紀錄
+            kept: 保留下來的紀錄
+        
+        Returns:
+            刪除的檔案數與回收的位元組數
+        """
+        referenced = {self._output_path(r["output_file"]) for r in kept if r.get("output_file")}
+        count = freed = 0
+        for path in {self._output_path(r["output_file"]) for r in evicted if r.get("output_file")}:
+            if path in referenced:
+                continue
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                print(f"刪除檔案失敗：{e}")
+                continue
+            count += 1
+            freed += size
+        return {"count": count, "bytes": freed}
+    
+    def on_history_event(self, event: str, payload):
+        """HistoryManager 事件監聽：add_record 因筆數上限淘汰紀錄時，刪除不再被引用的輸出檔案"""
+        if event != "evict":
+            return
+        self._collect_evicted_outputs(payload, self.history_manager.get_history())
+    
+    def _collect_temp_files(self, now: float) -> Dict[str, int]:
+        """刪除過期的上傳暫存檔"""
+        if not self.policy.temp_file_max_age_hours:
+            return {"count": 0, "bytes": 0}
+        max_age = self.policy.temp_file_max_age_hours * 3600
+        
+        def should_delete(entry, mtime):
+            return fnmatch.fnmatch(entry.name, TEMP_FILE_PATTERN) and now - mtime >= max_age
+        
+        return self._collect_files(should_delete)
+    
+    def _trim_news_history(self) -> Dict[str, int]:
+        """
+        限制 tech_news_history.json 的已讀文章數（保留最後加入的文章）
+        
+        與 daily_tech_news_module.save_read_articles 使用同一個檔案鎖與原子寫入，兩邊不會互相覆蓋更新
+        """
+        limit = self.policy.max_news_articles
+        path = os.path.join(self.work_dir, self.news_history_file)
+        if not limit or not os.path.exists(path):
+            return {"count": 0, "bytes": 0}
+        
+        with FileLock(path + ".lock", timeout=30):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"讀取已讀文章紀錄失敗：{e}")
+                return {"count": 0, "bytes": 0}
+            
+            articles = data.get("articles", [])
+            if len(articles) <= limit:
+                return {"count": 0, "bytes": 0}
+            
+            before = self._file_size(path)
+            data["articles"] = articles[-limit:]
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+            return {"count": len(articles) - limit, "bytes": max(before - self._file_size(path), 0)}
+    
+    def run(self) -> Dict:
+        """
+        執行一次清理
+        
+        Returns:
+            清理結果：各類別刪除的數量、回收的位元組數與完成時間；
+            已有清理在進行時直接返回上一次的結果
+        """
+        if not self._run_lock.acquire(blocking=False):
+            return self.last_report
+        
+        try:
+            started = time.perf_counter()
+            now = time.time()
+            records = self.history_manager.get_history()
+            
+            expired = self._select_expired(records)
+            for record_id in expired:
+                self.history_manager.delete_record(record_id)
+            expired_ids = set(expired)
+            evicted = [r for r in records if r["id"] in expired_ids]
+            records = [r for r in records if r["id"] not in expired_ids]
+            
+            outputs = self._collect_evicted_outputs(evicted, records)
+            
+            # 沒有任何紀錄時（包含歷史紀錄讀取失敗）無法判斷哪些報告是孤立的，略過回收
+            if records:
+                # 移除其他行程淘汰、沒有經過本行程事件的紀錄
+                report_search_index.sync(records, force=True)
+                reports = self._collect_orphan_reports(records, now)
+            else:
+                reports = {"count": 0, "bytes": 0}
+            temp_files = self._collect_temp_files(now)
+            news = self._trim_news_history()
+            
+            self.last_report = {
+                "records": len(expired),
+                "reports": reports["count"],
+                "output_files": outputs["count"],
+                "temp_files": temp_files["count"],
+                "news_articles": news["count"],
+                "reclaimed_bytes": reports["bytes"] + outputs["bytes"] + temp_files["bytes"] + news["bytes"],
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished_at": datetime.now().isoformat()
+            }
+            return self.last_report
+        finally:
+            self._run_lock.release()
+    
+    def start_background(self, interval_seconds: Optional[float] = None):
+        """
+        啟動背景清理執行緒（重複呼叫不會建立第二個執行緒）
+        
+        Args:
+            interval_seconds: 兩次清理之間的秒數，None 時使用策略的 background_interval_hours；
+                兩者都沒有設定時不啟動
+        """
+        if interval_seconds is None:
+            if not self.policy.background_interval_hours:
+                return
+            interval_seconds = self.policy.background_interval_hours * 3600
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._stop_event.clear()
+        
+        def loop():
+            while not self._stop_event.is_set():
+                try:
+                    self.run()
+                except Exception as e:
+                    print(f"背景清理失敗：{e}")
+                self._stop_event.wait(interval_seconds)
+        
+        self._thread = threading.Thread(target=loop, name="retention", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止背景清理執行緒"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def format_bytes(size: int) -> str:
+    """把位元組數轉成易讀的字串"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# 全域實例
+retention_manager = RetentionManager(history_manager)
+history_manager.subscribe(retention_manager.on_history_event)
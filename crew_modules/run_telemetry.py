@@ -0,0 +1,199 @@
+"""
+Run Telemetry Module
+記錄每次 Crew 執行的時間、token 用量、工具呼叫與估計成本
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+# 每百萬 token 的價格（美元）：(prompt, cached prompt, completion)
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> float:
+    """
+    依照價格表估計成本
+    
+    Args:
+        model: 模型名稱
+        prompt_tokens: prompt token 數（包含命中快取的部分）
+        completion_tokens: completion token 數
+        cached_prompt_tokens: 命中 prompt 快取的 token 數
+    
+    Returns:
+        估計成本（美元），未知模型返回 0
+    """
+    pricing = MODEL_PRICING.get(model)
+    if not pricing:
+        return 0.0
+    prompt_price, cached_price, completion_price = pricing
+    uncached = max(prompt_tokens - cached_prompt_tokens, 0)
+    return (uncached * prompt_price + cached_prompt_tokens * cached_price + completion_tokens * completion_price) / 1_000_000
+
+
+class RunTelemetry:
+    """收集單次 Crew 執行的量測資料，透過 Crew 的 step_callback / task_callback 取得進度"""
+    
+    def __init__(self, crew_type: str, model: str = "gpt-4o-mini"):
+        """
+        初始化量測
+        
+        Args:
+            crew_type: Crew 類型
+            model: 使用的模型（用於估計成本）
+        """
+        self.crew_type = crew_type
+        self.model = model
+        self._lock = threading.Lock()
+        self._started_at: Optional[float] = None
+        self._last_task_end: Optional[float] = None
+        self.wall_time: Optional[float] = None
+        self.tasks: List[Dict] = []
+        self.agents: Dict[str, float] = {}
+        self.tool_calls = 0
+        # prompt 與上一次執行的共同前綴（PrefixCacheTracker.measure 的結果）
+        self.prefix_cache: Optional[Dict] = None
+        self.usage = {
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+            "successful_requests": 0
+        }
+    
+    def start(self):
+        """開始計時（在 crew.kickoff 之前呼叫）"""
+        self._started_at = time.perf_counter()
+        self._last_task_end = self._started_at
+    
+    def step_callback(self, step):
+        """Crew step_callback：統計工具呼叫次數"""
+        # AgentAction 帶有 tool 屬性；AgentFinish 沒有
+        if getattr(step, "tool", None):
+            with self._lock:
+                self.tool_calls += 1
+    
+    def task_callback(self, task_output):
+        """Crew task_callback：任務依序執行，與上一個任務結束的時間差即為此任務的耗時"""
+        now = time.perf_counter()
+        with self._lock:
+            duration = now - (self._last_task_end or now)
+            self._last_task_end = now
+            agent = str(getattr(task_output, "agent", "") or "unknown")
+            name = getattr(task_output, "name", None) or (getattr(task_output, "description", "") or "")[:60]
+            self.tasks.append({"name": name.strip(), "agent": agent, "seconds": round(duration, 3)})
+            self.agents[agent] = round(self.agents.get(agent, 0.0) + duration, 3)
+    
+    def finish(self, crew_output=None):
+        """
+        結束計時並讀取 CrewOutput.token_usage
+        
+        Args:
+            crew_output: crew.kickoff() 的結果，失敗時為 None
+        """
+        if self._started_at is not None:
+            self.wall_time = time.perf_counter() - self._started_at
+        
+        usage = getattr(crew_output, "token_usage", None)
+        if usage is None:
+            return
+        for key in self.usage:
+            self.usage[key] = int(getattr(usage, key, 0) or 0)
+    
+    @property
+    def estimated_cost(self) -> float:
+        """依 token 用量估計的成本（美元）"""
+        return estimate_cost(
+            self.model,
+            self.usage["prompt_tokens"],
+            self.usage["completion_tokens"],
+            self.usage["cached_prompt_tokens"]
+        )
+    
+    def to_dict(self) -> Dict:
+        """
+        轉成可存入歷史紀錄的字典
+        
+        Returns:
+            量測資料
+        """
+        return {
+            "model": self.model,
+            "wall_time": round(self.wall_time, 3) if self.wall_time is not None else None,
+            "tasks": self.tasks,
+            "agents": self.agents,
+            "tool_calls": self.tool_calls,
+            "prefix_cache": self.prefix_cache,
+            **self.usage,
+            "estimated_cost": round(self.estimated_cost, 6)
+        }
+
+
+def _percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    """nearest-rank 百分位數"""
+    if not sorted_values:
+        return None
+    rank = max(int(-(-percent * len(sorted_values) // 100)), 1)
+    return sorted_values[rank - 1]
+
+
+class TelemetryAggregate:
+    """每個 crew_type 的累計統計；新增紀錄時以 bisect 維持排序，不需要重新掃描全部紀錄"""
+    
+    def __init__(self):
+        self.durations: List[float] = []
+        self.runs = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.total_tokens = 0
+        self.tool_calls = 0
+        self.estimated_cost = 0.0
+    
+    def add(self, telemetry: Optional[Dict]):
+        """
+        累加一筆紀錄的量測資料
+        
+        Args:
+            telemetry: 紀錄中的 telemetry 欄位（舊紀錄沒有時為 None）
+        """
+        if not telemetry:
+            return
+        self.runs += 1
+        if telemetry.get("wall_time") is not None:
+            bisect.insort(self.durations, telemetry["wall_time"])
+        self.prompt_tokens += telemetry.get("prompt_tokens", 0)
+        self.completion_tokens += telemetry.get("completion_tokens", 0)
+        self.cached_prompt_tokens += telemetry.get("cached_prompt_tokens", 0)
+        self.total_tokens += telemetry.get("total_tokens", 0)
+        self.tool_calls += telemetry.get("tool_calls", 0)
+        self.estimated_cost += telemetry.get("estimated_cost", 0.0)
+    
+    def summary(self) -> Dict:
+        """
+        取得統計摘要
+        
+        Returns:
+            延遲百分位數與 token / 成本合計
+        """
+        return {
+            "p50_seconds": _percentile(self.durations, 50),
+            "p95_seconds": _percentile(self.durations, 95),
+            "p99_seconds": _percentile(self.durations, 99),
+            "measured_runs": self.runs,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "total_tokens": self.total_tokens,
+            "avg_tokens": round(self.total_tokens / self.runs) if self.runs else 0,
+            "tool_calls": self.tool_calls,
+            "estimated_cost": round(self.estimated_cost, 4)
+        }
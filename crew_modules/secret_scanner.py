@@ -0,0 +1,311 @@
+"""
+Secret Scanner Module
+以文件內容為基礎的敏感資訊掃描與遮蔽功能
+"""
+
+import math
+import mmap
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+
+# 常見金鑰格式 - 用來分類引號中的候選字串
+SECRET_PATTERNS = {
+    'anthropic_api_key': rb'sk-ant-[A-Za-z0-9_\-]{20,}',
+    'openai_api_key': rb'sk-(?:proj-|svcacct-)?[A-Za-z0-9_\-]{20,}',
+    'stripe_key': rb'[sr]k_(?:live|test)_[0-9A-Za-z]{16,}',
+    'github_token': rb'gh[pousr]_[A-Za-z0-9]{36,255}',
+    'google_api_key': rb'AIza[0-9A-Za-z_\-]{35}',
+    'slack_token': rb'xox[abprs]-[A-Za-z0-9\-]{10,}',
+    'aws_access_key_id': rb'A(?:KIA|SIA)[0-9A-Z]{16}',
+    'jwt': rb'eyJ[A-Za-z0-9_\-]{10,}\.eyJ[A-Za-z0-9_\-]{10,}\.[A-Za-z0-9_\-]{10,}',
+}
+
+_KNOWN_FORMAT_REGEX = re.compile(
+    b'|'.join(b'(?P<%s>%s)' % (name.encode(), pattern) for name, pattern in SECRET_PATTERNS.items())
+)
+
+# 在整份內容中掃描已知金鑰格式（.env、YAML、命令列範例中沒有引號的金鑰也要偵測）。
+# re 只有在 regex 以字面字串開頭時才會用快速的字面搜尋跳到候選位置，
+# 開頭是字元集合或 alternation 時會在每個位置逐一嘗試（把所有格式合併成一個 alternation 慢一個數量級），
+# 所以每個 regex 都以字面字串開頭（字面搜尋本身就是前置過濾，不需要再先 find 一次），
+# 前綴相同的格式合併在同一個 regex，以 named group 區分類型
+_KNOWN_FORMAT_REGEXES = (
+    re.compile(
+        rb'sk-(?:(?P<anthropic_api_key>ant-[A-Za-z0-9_\-]{20,})|(?P<openai_api_key>(?:proj-|svcacct-)?[A-Za-z0-9_\-]{20,}))'
+    ),
+    # stripe 的 s / r 不放進 regex，讓 regex 以 "k_" 開頭；比對後再檢查前一個字元
+    re.compile(rb'(?P<stripe_key>k_(?:live|test)_[0-9A-Za-z]{16,})'),
+    re.compile(rb'(?P<github_token>gh[pousr]_[A-Za-z0-9]{36,255})'),
+    re.compile(rb'(?P<google_api_key>AIza[0-9A-Za-z_\-]{35})'),
+    re.compile(rb'(?P<slack_token>xox[abprs]-[A-Za-z0-9\-]{10,})'),
+    re.compile(rb'(?P<aws_access_key_id>A[KS]IA[0-9A-Z]{16})'),
+    re.compile(rb'(?P<jwt>eyJ[A-Za-z0-9_\-]{10,}\.eyJ[A-Za-z0-9_\-]{10,}\.[A-Za-z0-9_\-]{10,})'),
+)
+_STRIPE_LEADS = frozenset(b'sr')
+# 金鑰前後不能緊接著識別字字元（避免 "risk-..." 之類的字被當成 "sk-" 金鑰）
+_WORD_BYTES = frozenset(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_')
+_DIGIT_REGEX = re.compile(rb'[0-9]')
+_FIXED_LENGTH_FORMATS = frozenset(('aws_access_key_id', 'google_api_key'))
+
+_PRIVATE_KEY_REGEX = re.compile(
+    rb'-----BEGIN (?:[A-Z0-9]+ )*PRIVATE KEY-----[\s\S]{0,8192}?-----END (?:[A-Z0-9]+ )*PRIVATE KEY-----'
+)
+
+# 賦值的值：有引號的任意字串（group 1），或沒有引號的值（group 2，.env、YAML、ini）；
+# 沒有引號的值必須佔滿該行剩餘部分（可接註解），且含有數字或符號，
+# 排除 `token = DEFAULT_TOKEN`、`password = get_password()` 這類程式碼。
+# 以 "=" 與 ":" 各自開頭（字面前綴），同一個 pass 同時找兩種值
+_ASSIGNMENT_VALUE = (
+    rb'[ \t]*(?:["\']([^"\'\s]{8,})["\']'
+    rb'|(?=[A-Za-z_.]*[0-9!@$%^&*~+/\-])([A-Za-z0-9_.!@$%^&*~+/=\-]{8,})[ \t]*(?:#[^\n]*)?\r?$)'
+)
+_ASSIGNMENT_REGEXES = tuple(re.compile(operator + _ASSIGNMENT_VALUE, re.MULTILINE) for operator in (b'=', b':'))
+# 隨機產生的金鑰幾乎都含有數字，用 lookahead 先排除大部分的一般字串
+_QUOTED_TOKEN_REGEXES = (
+    re.compile(rb'"(?=[A-Za-z+/=_\-.]*[0-9])([A-Za-z0-9+/=_\-.]{20,})"'),
+    re.compile(rb"'(?=[A-Za-z+/=_\-.]*[0-9])([A-Za-z0-9+/=_\-.]{20,})'"),
+)
+
+# 賦值（或比較）左側的變數名稱若包含這些關鍵字，值就視為憑證；
+# 允許 `==` / `!=` 的第一個字元，讓 `if password == "..."` 也會被偵測
+_CREDENTIAL_NAME_REGEX = re.compile(
+    rb'(?:password|passwd|pwd|secret|api_?key|access_?key|auth_?token|token)["\']?\s*[=!]?$',
+    re.IGNORECASE
+)
+_NAME_LOOKBEHIND = 48
+
+_HEX_CHARS = frozenset(b'0123456789abcdefABCDEF')
+_PATH_SEPARATOR_REGEX = re.compile(rb'[/.]')
+# 最長一段至少要這麼長才可能是金鑰（與 _QUOTED_TOKEN_REGEXES 的最短長度相同）
+_MIN_TOKEN_LENGTH = 20
+
+# 高熵字串門檻（bits per char）
+BASE64_ENTROPY_THRESHOLD = 4.2
+
+SECRET_MODES = ('redact', 'exclude', 'off')
+
+
+def shannon_entropy(data: bytes) -> float:
+    """
+    計算位元組字串的 Shannon entropy
+    
+    Args:
+        data: 位元組字串
+    
+    Returns:
+        每個字元的平均資訊量（bits）
+    """
+    if not data:
+        return 0.0
+    
+    length = len(data)
+    return -sum(count / length * math.log2(count / length) for count in Counter(data).values())
+
+
+def _is_high_entropy(value: bytes) -> bool:
+    """判斷候選字串是否像隨機產生的金鑰"""
+    # 純字母或純數字通常是識別字或常數，不是金鑰
+    if value.isalpha() or value.isdigit():
+        return False
+    
+    # 路徑、檔名、網域、模組名稱（例如 ".cpython-311-x86_64-linux-gnu.so"）改以最長的一段判斷；
+    # 標準 base64 不含 "."，只有 "/" 開頭時才當成路徑
+    if value.startswith(b'/') or b'.' in value:
+        longest = max(_PATH_SEPARATOR_REGEX.split(value), key=len)
+        return len(longest) >= _MIN_TOKEN_LENGTH and _is_high_entropy(longest)
+    
+    # snake_case、kebab-case、UPPER_CASE 名稱
+    if (b'_' in value or b'-' in value) and (value == value.lower() or value == value.upper()):
+        return False
+    
+    distinct = set(value)
+    
+    # 純十六進位字串幾乎都是 sha256 / md5 等雜湊常數；以十六進位表示的憑證由 credential_assignment 偵測
+    if distinct <= _HEX_CHARS:
+        return False
+    
+    # 字母表（例如 "abcdefghijklmnopqrstuvwxyz0123456789"）的 entropy 很高，但大部分字元都依序排列
+    if _is_sequential(value):
+        return False
+    
+    # 不同字元數決定 entropy 上限，先用它過濾掉大部分的一般字串
+    if math.log2(len(distinct)) < BASE64_ENTROPY_THRESHOLD:
+        return False
+    
+    return shannon_entropy(value) >= BASE64_ENTROPY_THRESHOLD
+
+
+def _is_sequential(value: bytes) -> bool:
+    """一半以上的相鄰字元是連續的字元碼（字母表、數字表）"""
+    steps = sum(1 for current, following in zip(value, value[1:]) if following - current == 1)
+    return steps * 2 >= len(value)
+
+
+def _classify_token(value: bytes) -> Optional[str]:
+    """判斷引號中的字串屬於哪一種金鑰，都不是則返回 None"""
+    match = _KNOWN_FORMAT_REGEX.fullmatch(value)
+    if match:
+        return match.lastgroup
+    if _is_high_entropy(value):
+        return 'high_entropy_string'
+    return None
+
+
+def scan_bytes(data) -> List[Dict]:
+    """
+    掃描位元組內容中的敏感資訊
+    
+    Args:
+        data: bytes 或 mmap 物件
+    
+    Returns:
+        依位置排序的敏感資訊列表，每筆包含 type、start、end、line
+    """
+    candidates = []
+    size = len(data)
+    
+    for match in _PRIVATE_KEY_REGEX.finditer(data):
+        candidates.append((match.start(), match.end(), 'private_key'))
+    
+    # 已知金鑰格式不論是否在引號中都要偵測（.env、YAML、命令列範例）
+    for regex in _KNOWN_FORMAT_REGEXES:
+        for match in regex.finditer(data):
+            start, end = match.span()
+            secret_type = match.lastgroup
+            if secret_type == 'stripe_key':
+                if start == 0 or data[start - 1] not in _STRIPE_LEADS:
+                    continue
+                start -= 1
+            if start > 0 and data[start - 1] in _WORD_BYTES:
+                continue
+            if end < size and data[end] in _WORD_BYTES:
+                continue
+            # 長度不固定的格式可能剛好符合一般識別字，要求含有數字（隨機產生的金鑰幾乎都有）
+            if secret_type not in _FIXED_LENGTH_FORMATS and not _DIGIT_REGEX.search(data, start, end):
+                continue
+            candidates.append((start, end, secret_type))
+    
+    for regex in _ASSIGNMENT_REGEXES:
+        for match in regex.finditer(data):
+            name_start = max(0, match.start() - _NAME_LOOKBEHIND)
+            if _CREDENTIAL_NAME_REGEX.search(data, name_start, match.start()):
+                value = match.lastindex
+                candidates.append((match.start(value), match.end(value), 'credential_assignment'))
+    
+    for regex in _QUOTED_TOKEN_REGEXES:
+        for match in regex.finditer(data):
+            secret_type = _classify_token(match.group(1))
+            if secret_type:
+                candidates.append((match.start(1), match.end(1), secret_type))
+    
+    # 各個 pass 可能重複命中同一段內容，只保留不重疊的最早一筆
+    findings = []
+    line = 1
+    last_pos = 0
+    last_end = -1
+    
+    # 同一個起點有多筆時保留最長的一筆（已知格式排在 credential_assignment 之前）
+    candidates.sort(key=lambda c: (c[0], -c[1], c[2] == 'credential_assignment', c[2]))
+    for start, end, secret_type in candidates:
+        if start < last_end:
+            continue
+        
+        # 增量計算行號，避免每筆都從頭數（mmap 沒有 count，切片成 bytes 再數）
+        line += data[last_pos:start].count(b'\n')
+        last_pos = start
+        last_end = end
+        
+        findings.append({
+            "type": secret_type,
+            "start": start,
+            "end": end,
+            "line": line
+        })
+    
+    return findings
+
+
+def scan_file(file_path: str) -> List[Dict]:
+    """
+    使用 memory-mapped 讀取掃描單一文件
+    
+    Args:
+        file_path: 文件路徑
+    
+    Returns:
+        發現的敏感資訊列表
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return scan_bytes(mapped)
+
+
+def redact_bytes(data, findings: List[Dict]) -> bytes:
+    """
+    將敏感資訊替換為遮蔽標記
+    
+    Args:
+        data: 原始內容
+        findings: scan_bytes 的結果
+    
+    Returns:
+        遮蔽後的內容
+    """
+    parts = []
+    pos = 0
+    
+    for finding in findings:
+        parts.append(data[pos:finding["start"]])
+        parts.append(f"[REDACTED_SECRET:{finding['type']}]".encode())
+        pos = finding["end"]
+    
+    parts.append(data[pos:])
+    return b''.join(parts)
+
+
+def read_file_redacted(file_path: str, mode: str = 'redact') -> Tuple[Optional[str], List[Dict]]:
+    """
+    讀取文件並在送往 LLM 前處理敏感資訊
+    
+    Args:
+        file_path: 文件路徑
+        mode: 'redact' 遮蔽敏感值、'exclude' 整個文件排除、'off' 不掃描
+    
+    Returns:
+        (處理後的 UTF-8 內容，被排除時為 None, 發現的敏感資訊列表)
+    """
+    if mode not in SECRET_MODES:
+        raise ValueError(f"未知的 secret mode：{mode}")
+    
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return "", []
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            findings = scan_bytes(mapped) if mode != 'off' else []
+            
+            if not findings:
+                return mapped[:].decode('utf-8', errors='ignore'), []
+            
+            if mode == 'exclude':
+                return None, findings
+            
+            return redact_bytes(mapped, findings).decode('utf-8', errors='ignore'), findings
+
+
+def summarize_findings(findings: List[Dict]) -> str:
+    """
+    產生敏感資訊摘要（不包含實際值）
+    
+    Args:
+        findings: 發現的敏感資訊列表
+    
+    Returns:
+        例如 "openai_api_key (line 12), credential_assignment (line 30)"
+    """
+    return ", ".join(f"{f['type']} (line {f['line']})" for f in findings)
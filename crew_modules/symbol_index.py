@@ -0,0 +1,355 @@
+"""
+Symbol Index Module
+將程式碼解析成可持久化的符號索引（SQLite + FTS5），依文件雜湊增量更新
+"""
+
+import ast
+import hashlib
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .file_utils import scan_multiple_paths
+from .secret_scanner import scan_bytes, redact_bytes
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    module TEXT,
+    line_count INTEGER,
+    indexed_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    qualname TEXT NOT NULL,
+    signature TEXT,
+    docstring TEXT,
+    start_line INTEGER,
+    end_line INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_symbols_path ON symbols(path);
+CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols(name);
+
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    module TEXT,
+    name TEXT,
+    alias TEXT,
+    line INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_imports_path ON imports(path);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS symbols_fts USING fts5(
+    name, qualname, signature, docstring,
+    content='symbols', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS symbols_ai AFTER INSERT ON symbols BEGIN
+    INSERT INTO symbols_fts(rowid, name, qualname, signature, docstring)
+    VALUES (new.id, new.name, new.qualname, new.signature, new.docstring);
+END;
+CREATE TRIGGER IF NOT EXISTS symbols_ad AFTER DELETE ON symbols BEGIN
+    INSERT INTO symbols_fts(symbols_fts, rowid, name, qualname, signature, docstring)
+    VALUES ('delete', old.id, old.name, old.qualname, old.signature, old.docstring);
+END;
+"""
+
+
+def _redact(text: Optional[str]) -> Optional[str]:
+    """簽名的預設值或 docstring 也可能含有金鑰，存入索引前先遮蔽"""
+    if not text:
+        return text
+    data = text.encode('utf-8')
+    findings = scan_bytes(data)
+    if not findings:
+        return text
+    return redact_bytes(data, findings).decode('utf-8', errors='ignore')
+
+
+def _signature(node) -> str:
+    """產生函數或類別的簽名字串"""
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+        return f"class {node.name}({', '.join(bases)})" if bases else f"class {node.name}"
+    
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    signature = f"{prefix} {node.name}({ast.unparse(node.args)})"
+    if node.returns is not None:
+        signature += f" -> {ast.unparse(node.returns)}"
+    return signature
+
+
+def parse_symbols(source: str, module_name: str = "") -> Tuple[List[Dict], List[Dict]]:
+    """
+    解析 Python 原始碼中的模組、類別、函數與 import
+    
+    Args:
+        source: 原始碼
+        module_name: 模組名稱
+    
+    Returns:
+        (符號列表, import 列表)
+    """
+    tree = ast.parse(source)
+    line_count = source.count('\n') + 1
+    
+    symbols = [{
+        "kind": "module",
+        "name": module_name,
+        "qualname": module_name,
+        "signature": None,
+        "docstring": ast.get_docstring(tree),
+        "start_line": 1,
+        "end_line": line_count
+    }]
+    imports = []
+    
+    def visit(body, parent_qualname: str, in_class: bool):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{parent_qualname}.{node.name}" if parent_qualname else node.name
+                if isinstance(node, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if in_class else "function"
+                
+                symbols.append({
+                    "kind": kind,
+                    "name": node.name,
+                    "qualname": qualname,
+                    "signature": _signature(node),
+                    "docstring": ast.get_docstring(node),
+                    "start_line": node.decorator_list[0].lineno if node.decorator_list else node.lineno,
+                    "end_line": node.end_lineno
+                })
+                visit(node.body, qualname, isinstance(node, ast.ClassDef))
+            
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    imports.append({"module": alias.name, "name": None, "alias": alias.asname, "line": node.lineno})
+            
+            elif isinstance(node, ast.ImportFrom):
+                module = "." * node.level + (node.module or "")
+                for alias in node.names:
+                    imports.append({"module": module, "name": alias.name, "alias": alias.asname, "line": node.lineno})
+    
+    visit(tree.body, module_name, False)
+    return symbols, imports
+
+
+class SymbolIndex:
+    """以 SQLite 儲存的程式碼符號索引"""
+    
+    def __init__(self, db_path: str = "symbol_index.db"):
+        """
+        初始化符號索引
+        
+        Args:
+            db_path: SQLite 資料庫路徑
+        """
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+    
+    @contextmanager
+    def _connect(self):
+        """建立連線（每個操作各自連線，可安全地在 Streamlit 多執行緒中使用）"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def index_paths(self, paths: List[str], recursive: bool = True) -> Dict:
+        """
+        索引多個路徑，只重新解析內容雜湊有變更的文件
+        
+        Args:
+            paths: 文件或目錄路徑列表
+            recursive: 是否遞迴掃描
+        
+        Returns:
+            統計資訊 {"indexed", "unchanged", "removed", "errors"}
+        """
+        valid_files, _ = scan_multiple_paths(paths, recursive=recursive, exclude_sensitive=True)
+        stats = {"indexed": 0, "unchanged": 0, "removed": 0, "errors": []}
+        
+        with self._connect() as conn:
+            known_hashes = {row["path"]: row["content_hash"] for row in conn.execute("SELECT path, content_hash FROM files")}
+            
+            for file_path in valid_files:
+                abs_path = os.path.abspath(file_path)
+                try:
+                    with open(abs_path, 'rb') as f:
+                        raw = f.read()
+                    content_hash = hashlib.blake2b(raw, digest_size=16).hexdigest()
+                    
+                    if known_hashes.get(abs_path) == content_hash:
+                        stats["unchanged"] += 1
+                        continue
+                    
+                    self._index_file(conn, abs_path, raw.decode('utf-8', errors='ignore'), content_hash)
+                    stats["indexed"] += 1
+                except (OSError, SyntaxError, ValueError) as e:
+                    stats["errors"].append(f"{abs_path}: {e}")
+            
+            # 移除已經不存在的文件
+            roots = [os.path.abspath(p.strip()) for p in paths if p.strip()]
+            for indexed_path in known_hashes:
+                in_roots = any(indexed_path == root or indexed_path.startswith(root + os.sep) for root in roots)
+                if in_roots and not os.path.exists(indexed_path):
+                    conn.execute("DELETE FROM files WHERE path = ?", (indexed_path,))
+                    stats["removed"] += 1
+        
+        return stats
+    
+    def _index_file(self, conn, abs_path: str, source: str, content_hash: str):
+        """重新建立單一文件的索引"""
+        module_name = os.path.splitext(os.path.basename(abs_path))[0]
+        symbols, imports = parse_symbols(source, module_name)
+        
+        # ON DELETE CASCADE 會一併刪除舊的 symbols / imports
+        conn.execute("DELETE FROM files WHERE path = ?", (abs_path,))
+        conn.execute(
+            "INSERT INTO files (path, content_hash, module, line_count, indexed_at) VALUES (?, ?, ?, ?, ?)",
+            (abs_path, content_hash, module_name, source.count('\n') + 1, datetime.now().isoformat())
+        )
+        conn.executemany(
+            "INSERT INTO symbols (path, kind, name, qualname, signature, docstring, start_line, end_line) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (abs_path, s["kind"], s["name"], s["qualname"], _redact(s["signature"]),
+                 _redact(s["docstring"]), s["start_line"], s["end_line"])
+                for s in symbols
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO imports (path, module, name, alias, line) VALUES (?, ?, ?, ?, ?)",
+            [(abs_path, i["module"], i["name"], i["alias"], i["line"]) for i in imports]
+        )
+    
+    def search(self, query: str, limit: int = 20, kind: str = None) -> List[Dict]:
+        """
+        全文搜尋符號名稱、簽名與 docstring
+        
+        Args:
+            query: 搜尋字串
+            limit: 最多返回筆數
+            kind: 限定符號種類 ('module', 'class', 'function', 'method')
+        
+        Returns:
+            依相關度排序的符號列表
+        """
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        match_expr = " ".join(f'"{term}"*' for term in terms)
+        
+        sql = (
+            "SELECT s.* FROM symbols_fts JOIN symbols s ON s.id = symbols_fts.rowid "
+            "WHERE symbols_fts MATCH ?"
+        )
+        params = [match_expr]
+        if kind:
+            sql += " AND s.kind = ?"
+            params.append(kind)
+        sql += " ORDER BY bm25(symbols_fts) LIMIT ?"
+        params.append(limit)
+        
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+    
+    def get_file_symbols(self, file_path: str) -> List[Dict]:
+        """
+        取得單一文件的所有符號（依行號排序）
+        
+        Args:
+            file_path: 文件路徑
+        
+        Returns:
+            符號列表
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM symbols WHERE path = ? ORDER BY start_line, id",
+                (os.path.abspath(file_path),)
+            )
+            return [dict(row) for row in rows]
+    
+    def get_file_imports(self, file_path: str) -> List[Dict]:
+        """
+        取得單一文件的 import 列表
+        
+        Args:
+            file_path: 文件路徑
+        
+        Returns:
+            import 列表
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM imports WHERE path = ? ORDER BY line", (os.path.abspath(file_path),))
+            return [dict(row) for row in rows]
+    
+    def build_outline(self, file_paths: List[str], include_docstrings: bool = True) -> str:
+        """
+        產生精簡的程式碼大綱（簽名 + docstring 摘要 + 行號範圍），可取代整份原始碼放入 prompt
+        
+        Args:
+            file_paths: 文件路徑列表
+            include_docstrings: 是否包含 docstring 的第一行
+        
+        Returns:
+            大綱文字
+        """
+        sections = []
+        
+        for file_path in file_paths:
+            abs_path = os.path.abspath(file_path)
+            lines = [f"File: {abs_path}"]
+            
+            imports = self.get_file_imports(abs_path)
+            if imports:
+                modules = sorted({i["module"] for i in imports if i["module"]})
+                lines.append(f"Imports: {', '.join(modules)}")
+            
+            for symbol in self.get_file_symbols(abs_path):
+                if symbol["kind"] == "module":
+                    if include_docstrings and symbol["docstring"]:
+                        lines.append(f"Module doc: {symbol['docstring'].strip().splitlines()[0]}")
+                    continue
+                
+                depth = symbol["qualname"].count('.') - 1
+                entry = f"{'  ' * max(depth, 0)}- {symbol['signature']}  [L{symbol['start_line']}-{symbol['end_line']}]"
+                if include_docstrings and symbol["docstring"]:
+                    entry += f"  # {symbol['docstring'].strip().splitlines()[0]}"
+                lines.append(entry)
+            
+            sections.append("\n".join(lines))
+        
+        return "\n\n".join(sections)
+    
+    def get_symbol_source(self, symbol: Dict) -> str:
+        """
+        讀取單一符號的原始碼片段
+        
+        Args:
+            symbol: search 或 get_file_symbols 返回的符號
+        
+        Returns:
+            原始碼片段
+        """
+        with open(symbol["path"], 'r', encoding='utf-8', errors='ignore') as f:
+            lines = f.read().splitlines()
+        return _redact("\n".join(lines[symbol["start_line"] - 1:symbol["end_line"]]))
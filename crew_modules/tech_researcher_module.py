@@ -6,25 +6,29 @@ Tech Researcher Module
 import os
 import threading
 import time
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew, Process, LLM
 from crewai_tools import SerperDevTool, ScrapeWebsiteTool
 from .prompt_manager import prompt_manager
+from .run_telemetry import RunTelemetry
+from .prompt_layout import layout_task, task_prompts, prefix_cache_tracker
 
 load_dotenv()
 
-def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_REPORT.md", progress_callback: Optional[callable] = None):
+def build_tech_researcher_tasks(
+    research_query: str,
+    output_file: str = "TECH_RESEARCH_REPORT.md"
+) -> List[Task]:
     """
-    執行技術調研 Crew
+    建立技術調研 Crew 的 Agents 與 Tasks（不執行）
     
     Args:
         research_query: 研究主題/問題
         output_file: 輸出的報告文件名
-        progress_callback: 進度回調函數，用於顯示 Agent 進度
         
     Returns:
-        執行結果
+        依執行順序排列的 Tasks（task.agent 為負責的 Agent）
     """
     
     # 初始化更快的 LLM
@@ -55,7 +59,7 @@ def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_R
     
     research_analyst = Agent(
         role='Tech Research Analyst',
-        goal=f'Conduct comprehensive research on: {research_query}',
+        goal='Conduct comprehensive research on the topic given in the task',
         backstory=enhanced_research_backstory,
         tools=[search_tool, scrape_tool],
         llm=fast_llm,  # 使用更快的 LLM
@@ -63,9 +67,6 @@ def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_R
         allow_delegation=False
     )
     
-    if progress_callback:
-        progress_callback("Tech Research Analyst", "running", 3, 0)
-    
     # Agent 2: Comparison Expert (比較專家)
     comparison_expert_backstory = """You are a technology analyst who specializes in creating detailed
         comparison matrices. You evaluate technologies across multiple dimensions including
@@ -115,8 +116,9 @@ def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_R
     )
     
     # Task 1: Research and Information Gathering
+    # 靜態指示在前、研究主題在最後，每次執行的 prompt 前綴相同，可命中 provider 的 prefix cache
     research_task = Task(
-        description=f"""Conduct comprehensive research on: {research_query}
+        description=layout_task("""Conduct comprehensive research on the query given in the inputs below.
         
         Your research should gather information about:
         
@@ -155,14 +157,14 @@ def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_R
         
         Search multiple sources and compile comprehensive findings.
         Include links to sources for verification.
-        """,
+        """, [("Query", research_query)]),
         agent=research_analyst,
         expected_output="A comprehensive research report with findings from multiple credible sources"
     )
     
     # Task 2: Comparison Analysis
     comparison_task = Task(
-        description=f"""Based on the research findings, create a detailed comparison analysis.
+        description="""Based on the research findings, create a detailed comparison analysis.
         
         Create comparison tables covering:
         
@@ -215,7 +217,7 @@ def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_R
     
     # Task 3: Strategic Recommendation
     recommendation_task = Task(
-        description=f"""Based on the research and comparison, provide strategic recommendations.
+        description=layout_task("""Based on the research and comparison, provide strategic recommendations.
         
         Your report should include:
         
@@ -280,20 +282,48 @@ def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_R
         List all sources used in the research
         
         Make the recommendation clear, actionable, and well-reasoned.
-        Save the complete report to: {output_file}
-        """,
+        Save the complete report to the output file given in the inputs below.
+        """, [("Output file", output_file)]),
         agent=strategy_advisor,
         expected_output=f"A comprehensive strategic recommendation report saved as {output_file}",
         context=[research_task, comparison_task],
         output_file=output_file
     )
     
+    return [research_task, comparison_task, recommendation_task]
+
+
+def run_tech_researcher(
+    research_query: str,
+    output_file: str = "TECH_RESEARCH_REPORT.md",
+    progress_callback: Optional[callable] = None,
+    telemetry: Optional[RunTelemetry] = None
+):
+    """
+    執行技術調研 Crew
+    
+    Args:
+        research_query: 研究主題/問題
+        output_file: 輸出的報告文件名
+        progress_callback: 進度回調函數，用於顯示 Agent 進度
+        telemetry: 執行量測（RunTelemetry），記錄各 Agent / Task 的時間、token 用量與成本
+    
+    Returns:
+        執行結果
+    """
+    tasks = build_tech_researcher_tasks(research_query, output_file)
+    prefix_report = prefix_cache_tracker.measure('research', task_prompts(tasks))
+    if telemetry:
+        telemetry.prefix_cache = prefix_report
+    
     # 建立 Crew
     crew = Crew(
-        agents=[research_analyst, comparison_expert, strategy_advisor],
-        tasks=[research_task, comparison_task, recommendation_task],
+        agents=[task.agent for task in tasks],
+        tasks=tasks,
         process=Process.sequential,
-        verbose=True
+        verbose=True,
+        step_callback=telemetry.step_callback if telemetry else None,
+        task_callback=telemetry.task_callback if telemetry else None
     )
     
     # 使用執行緒來模擬進度更新
@@ -303,11 +333,15 @@ def run_tech_researcher(research_query: str, output_file: str = "TECH_RESEARCH_R
     
     def run_crew():
         nonlocal result, error
+        if telemetry:
+            telemetry.start()
         try:
             result = crew.kickoff()
         except Exception as e:
             error = e
         finally:
+            if telemetry:
+                telemetry.finish(result)
             execution_done.set()
     
     # 啟動執行緒
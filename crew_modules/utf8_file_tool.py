@@ -3,36 +3,137 @@ Custom File Reading Tool
 自定義文件讀取工具，支援 UTF-8 編碼
 """
 
+import bisect
+import difflib
+import hashlib
 import os
-from typing import List
+from typing import List, Optional
+from .secret_scanner import read_file_redacted, summarize_findings
 
 
-def read_files_content(file_paths: List[str]) -> str:
+# 近似重複判定：行相似度門檻，以及值得用 diff 取代的最小行數
+NEAR_DUPLICATE_THRESHOLD = 0.9
+NEAR_DUPLICATE_MIN_LINES = 5
+
+
+def _find_near_duplicate(lines: List[str], representatives: list, threshold: float) -> Optional[tuple]:
+    """
+    在已輸出完整內容的文件中尋找最相似的一個
+    
+    Args:
+        lines: 目前文件的行列表
+        representatives: 依行數排序的 (line_count, path, lines) 列表
+        threshold: 相似度門檻
+    
+    Returns:
+        (path, lines, ratio)；找不到時返回 None
+    """
+    count = len(lines)
+    # ratio = 2M / (a + b) ≤ 2·min(a, b) / (a + b)，所以候選行數 a 必須落在
+    # [count·t/(2-t), count·(2-t)/t] 之間；用二分搜尋只取這個範圍的候選
+    low = bisect.bisect_left(representatives, (int(count * threshold / (2 - threshold)),))
+    high = bisect.bisect_right(representatives, (int(count * (2 - threshold) / threshold) + 1,))
+    
+    best = None
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(lines)
+    for _, path, candidate in representatives[low:high]:
+        matcher.set_seq1(candidate)
+        # 由便宜到昂貴的上界逐步過濾
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            continue
+        ratio = matcher.ratio()
+        if ratio >= threshold and (best is None or ratio > best[2]):
+            best = (path, candidate, ratio)
+    return best
+
+
+def read_files_content(
+    file_paths: List[str],
+    secret_mode: str = 'redact',
+    deduplicate: bool = True,
+    near_duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> str:
     """
     批量讀取多個文件的內容（UTF-8 編碼）
     
     Args:
         file_paths: 文件路徑列表
-        
+        secret_mode: 內容敏感資訊處理方式 ('redact' 遮蔽、'exclude' 排除文件、'off' 不掃描)
+        deduplicate: 相同內容只輸出一次；近似的文件改為輸出與代表文件的 diff
+        near_duplicate_threshold: 近似重複的行相似度門檻（0~1）
+    
     Returns:
         所有文件的合併內容
     """
-    results = []
+    entries = []
+    by_hash = {}
     
     for file_path in file_paths:
         try:
             abs_path = os.path.abspath(file_path)
             
             if not os.path.exists(abs_path):
-                results.append(f"\n{'='*80}\nFile: {abs_path}\nError: File not found\n{'='*80}\n")
+                entries.append({"text": f"\n{'='*80}\nFile: {abs_path}\nError: File not found\n{'='*80}\n"})
+                continue
+            
+            # 在組成 prompt 前先掃描並處理硬編碼的金鑰
+            content, findings = read_file_redacted(abs_path, secret_mode)
+            
+            if content is None:
+                entries.append({"text": (
+                    f"\n{'='*80}\nFile: {abs_path}\n"
+                    f"Excluded: contains potential secrets ({summarize_findings(findings)})\n{'='*80}\n"
+                )})
                 continue
             
-            with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
+            # 內容完全相同的文件（vendored 副本、空的 __init__.py）只保留第一個
+            if deduplicate:
+                digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+                if digest in by_hash:
+                    by_hash[digest]["aliases"].append(abs_path)
+                    continue
             
-            results.append(f"\n{'='*80}\nFile: {abs_path}\n{'='*80}\n\n{content}\n")
+            entry = {"path": abs_path, "content": content, "findings": findings, "aliases": []}
+            if deduplicate:
+                by_hash[digest] = entry
+            entries.append(entry)
         
         except Exception as e:
-            results.append(f"\n{'='*80}\nFile: {abs_path}\nError: {str(e)}\n{'='*80}\n")
+            entries.append({"text": f"\n{'='*80}\nFile: {abs_path}\nError: {str(e)}\n{'='*80}\n"})
+    
+    results = []
+    representatives = []
+    
+    for entry in entries:
+        if "text" in entry:
+            results.append(entry["text"])
+            continue
+        
+        header = f"File: {entry['path']}"
+        if entry["aliases"]:
+            header += "\nIdentical copies (content omitted): " + ", ".join(entry["aliases"])
+        if entry["findings"]:
+            header += f"\nRedacted secrets: {summarize_findings(entry['findings'])}"
+        
+        content = entry["content"]
+        lines = content.splitlines()
+        
+        if deduplicate and len(lines) >= NEAR_DUPLICATE_MIN_LINES:
+            match = _find_near_duplicate(lines, representatives, near_duplicate_threshold)
+            if match:
+                base_path, base_lines, ratio = match
+                diff = "\n".join(difflib.unified_diff(
+                    base_lines, lines, fromfile=base_path, tofile=entry['path'], n=1, lineterm=''
+                ))
+                # diff 本身不比原文短就沒有意義
+                if len(diff) < len(content) // 2:
+                    header += f"\nNear-duplicate of: {base_path} ({ratio:.1%} similar), shown as a diff against it"
+                    results.append(f"\n{'='*80}\n{header}\n{'='*80}\n\n{diff}\n")
+                    continue
+            
+            bisect.insort(representatives, (len(lines), entry["path"], lines))
+        
+        results.append(f"\n{'='*80}\n{header}\n{'='*80}\n\n{content}\n")
     
     return "\n".join(results)
@@ -0,0 +1,346 @@
+"""
+Watch Mode Module
+監看程式碼變更並自動觸發增量文檔生成
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .file_utils import scan_multiple_paths, is_sensitive_file, should_exclude_directory
+
+try:
+    # watchdog 在 Linux 上使用 inotify，其他平台使用對應的原生 API
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+    WATCHDOG_AVAILABLE = False
+
+
+def _default_output_file(changed_files: List[str]) -> str:
+    """依照 Web UI 相同的規則決定輸出文件名"""
+    if len(changed_files) == 1:
+        return f"DOCS_{Path(changed_files[0]).stem}.md"
+    return f"DOCS_MultiFile_{len(changed_files)}files.md"
+
+
+def _run_incremental_documentation(changed_files: List[str], output_file: str):
+    """只針對變更的文件執行文檔生成，並記錄到歷史"""
+    # 延遲導入，避免只使用監看功能時就載入 CrewAI
+    from .documentation_crew_module import run_documentation_crew
+    from .history_manager import history_manager
+    from .run_telemetry import RunTelemetry
+    # 匯入清理模組會註冊淘汰事件的監聽者，超過筆數上限的紀錄也會回收輸出檔案
+    from . import retention  # noqa: F401
+    
+    target = changed_files if len(changed_files) > 1 else changed_files[0]
+    telemetry = RunTelemetry('documentation')
+    try:
+        result = run_documentation_crew(target, output_file, telemetry=telemetry)
+        history_manager.add_record(
+            crew_type='documentation',
+            input_files=changed_files,
+            output_file=output_file,
+            success=True,
+            telemetry=telemetry.to_dict()
+        )
+        return result
+    except Exception as e:
+        history_manager.add_record(
+            crew_type='documentation',
+            input_files=changed_files,
+            output_file=output_file,
+            success=False,
+            error_message=str(e),
+            telemetry=telemetry.to_dict()
+        )
+        raise
+
+
+class _ChangeEventHandler(FileSystemEventHandler):
+    """把 watchdog 事件轉交給 DocumentationWatcher"""
+    
+    def __init__(self, watcher: 'DocumentationWatcher'):
+        super().__init__()
+        self.watcher = watcher
+    
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify_change(event.src_path)
+    
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify_change(event.src_path)
+    
+    def on_moved(self, event):
+        # 編輯器常用「寫入暫存檔再改名」的方式存檔
+        if not event.is_directory:
+            self.watcher.notify_change(event.dest_path)
+
+
+class DocumentationWatcher:
+    """監看 scan_multiple_paths 的路徑，合併短時間內的存檔並觸發增量文檔生成"""
+    
+    def __init__(
+        self,
+        paths: List[str],
+        recursive: bool = True,
+        debounce_seconds: float = 5.0,
+        min_run_interval: float = 300.0,
+        max_runs_per_hour: int = 6,
+        poll_interval: float = 2.0,
+        use_polling: bool = False,
+        run_callback: Optional[Callable[[List[str], str], object]] = None
+    ):
+        """
+        初始化監看器
+        
+        Args:
+            paths: 要監看的文件或目錄路徑（與 scan_multiple_paths 相同）
+            recursive: 是否遞迴監看子目錄
+            debounce_seconds: 最後一次變更後等待多久才觸發
+            min_run_interval: 兩次背景執行之間的最短間隔（秒）
+            max_runs_per_hour: 每小時最多執行次數，避免大量呼叫 LLM
+            poll_interval: 輪詢模式的掃描間隔（秒）
+            use_polling: 強制使用輪詢模式（例如網路磁碟不支援 inotify）
+            run_callback: 執行函數 (changed_files, output_file)，預設為增量文檔生成
+        """
+        self.paths = [os.path.abspath(p.strip()) for p in paths if p.strip()]
+        self.recursive = recursive
+        self.debounce_seconds = debounce_seconds
+        self.min_run_interval = min_run_interval
+        self.max_runs_per_hour = max_runs_per_hour
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling or not WATCHDOG_AVAILABLE
+        self.run_callback = run_callback or _run_incremental_documentation
+        
+        self._lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self._timer: Optional[threading.Timer] = None
+        self._running_job = False
+        self._run_times = deque()
+        self._stop_event = threading.Event()
+        self._observer = None
+        self._poll_thread: Optional[threading.Thread] = None
+        
+        # 單一文件路徑需要監看其所在目錄，再用白名單過濾
+        self._watched_files = {p for p in self.paths if os.path.isfile(p)}
+        self._watched_dirs = [p for p in self.paths if os.path.isdir(p)]
+        
+        self.stats = {
+            "events": 0,
+            "runs": 0,
+            "failed_runs": 0,
+            "rate_limited": 0,
+            "last_run_files": [],
+            "last_error": None
+        }
+    
+    def start(self):
+        """開始監看"""
+        self._stop_event.clear()
+        
+        if self.use_polling:
+            self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self._poll_thread.start()
+            return
+        
+        handler = _ChangeEventHandler(self)
+        self._observer = Observer()
+        for directory in self._watched_dirs:
+            self._observer.schedule(handler, directory, recursive=self.recursive)
+        for parent in {os.path.dirname(f) for f in self._watched_files}:
+            self._observer.schedule(handler, parent, recursive=False)
+        self._observer.start()
+    
+    def stop(self):
+        """停止監看並取消尚未觸發的工作"""
+        self._stop_event.set()
+        
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        
+        if self._poll_thread:
+            self._poll_thread.join()
+            self._poll_thread = None
+    
+    def is_watched_file(self, file_path: str) -> bool:
+        """
+        檢查文件是否在監看範圍內
+        
+        Args:
+            file_path: 文件路徑
+        
+        Returns:
+            True 如果變更應該觸發文檔生成
+        """
+        file_path = os.path.abspath(file_path)
+        
+        if not file_path.endswith('.py') or is_sensitive_file(file_path):
+            return False
+        
+        if file_path in self._watched_files:
+            return True
+        
+        for directory in self._watched_dirs:
+            if os.path.commonpath([directory, file_path]) != directory:
+                continue
+            relative_parts = Path(os.path.relpath(file_path, directory)).parts
+            if not self.recursive and len(relative_parts) > 1:
+                continue
+            if any(should_exclude_directory(part) for part in relative_parts[:-1]):
+                continue
+            return True
+        
+        return False
+    
+    def notify_change(self, file_path: str):
+        """
+        記錄一次文件變更，並重新計算 debounce 計時
+        
+        Args:
+            file_path: 變更的文件路徑
+        """
+        if self._stop_event.is_set() or not self.is_watched_file(file_path):
+            return
+        
+        with self._lock:
+            self.stats["events"] += 1
+            self._pending.add(os.path.abspath(file_path))
+            self._schedule(self.debounce_seconds)
+    
+    def _schedule(self, delay: float):
+        """重新排程觸發（呼叫端需持有鎖）"""
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _rate_limit_delay(self, now: float) -> float:
+        """計算距離下一次允許執行還需要等待多久（呼叫端需持有鎖）"""
+        while self._run_times and now - self._run_times[0] >= 3600:
+            self._run_times.popleft()
+        
+        delay = 0.0
+        if self._run_times:
+            delay = max(delay, self.min_run_interval - (now - self._run_times[-1]))
+        if len(self._run_times) >= self.max_runs_per_hour:
+            delay = max(delay, self._run_times[0] + 3600 - now)
+        return delay
+    
+    def _flush(self):
+        """debounce 到期：合併所有待處理的變更成一次執行"""
+        with self._lock:
+            self._timer = None
+            
+            if self._stop_event.is_set() or not self._pending:
+                return
+            
+            # 上一次還在執行時，等它結束後再處理新的變更
+            if self._running_job:
+                self._schedule(self.debounce_seconds)
+                return
+            
+            delay = self._rate_limit_delay(time.time())
+            if delay > 0:
+                self.stats["rate_limited"] += 1
+                self._schedule(delay)
+                return
+            
+            changed_files = sorted(f for f in self._pending if os.path.exists(f))
+            self._pending.clear()
+            if not changed_files:
+                return
+            
+            self._running_job = True
+            self._run_times.append(time.time())
+        
+        threading.Thread(target=self._run_job, args=(changed_files,), daemon=True).start()
+    
+    def _run_job(self, changed_files: List[str]):
+        """在背景執行增量文檔生成"""
+        output_file = _default_output_file(changed_files)
+        print(f"偵測到 {len(changed_files)} 個文件變更，開始更新 {output_file}")
+        
+        try:
+            self.run_callback(changed_files, output_file)
+            self.stats["runs"] += 1
+            self.stats["last_error"] = None
+        except Exception as e:
+            self.stats["failed_runs"] += 1
+            self.stats["last_error"] = str(e)
+            print(f"增量文檔生成失敗：{e}")
+        finally:
+            with self._lock:
+                self.stats["last_run_files"] = changed_files
+                self._running_job = False
+    
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """取得所有監看文件的 (mtime, size)"""
+        valid_files, _ = scan_multiple_paths(self.paths, self.recursive, exclude_sensitive=True)
+        snapshot = {}
+        for file_path in valid_files:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[os.path.abspath(file_path)] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def _poll_loop(self):
+        """沒有 inotify 時的輪詢備案"""
+        previous = self._snapshot()
+        
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._snapshot()
+            for file_path, signature in current.items():
+                if previous.get(file_path) != signature:
+                    self.notify_change(file_path)
+            previous = current
+
+
+def main():
+    """命令列入口：python -m crew_modules.watch_mode <路徑...>"""
+    parser = argparse.ArgumentParser(description="監看程式碼變更並自動更新 DOCS_*.md")
+    parser.add_argument('paths', nargs='+', help="要監看的文件或目錄")
+    parser.add_argument('--debounce', type=float, default=5.0, help="合併存檔的等待秒數")
+    parser.add_argument('--min-interval', type=float, default=300.0, help="兩次執行的最短間隔秒數")
+    parser.add_argument('--max-runs-per-hour', type=int, default=6, help="每小時最多執行次數")
+    parser.add_argument('--polling', action='store_true', help="強制使用輪詢模式")
+    args = parser.parse_args()
+    
+    watcher = DocumentationWatcher(
+        args.paths,
+        debounce_seconds=args.debounce,
+        min_run_interval=args.min_interval,
+        max_runs_per_hour=args.max_runs_per_hour,
+        use_polling=args.polling
+    )
+    watcher.start()
+    mode = "輪詢" if watcher.use_polling else "inotify"
+    print(f"開始監看 {len(watcher.paths)} 個路徑（{mode} 模式），按 Ctrl+C 結束")
+    
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Login Throttle Module
+以記憶體中的 token bucket 限制每個帳號與每個用戶端的登入嘗試次數
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class TokenBuckets:
+    """
+    一組以鍵區分的 token bucket
+    
+    每個鍵只存 (剩餘 token, 上次更新時間)，取用時才依經過的時間補充；
+    以 OrderedDict 維持 LRU 順序，超過 max_keys 時淘汰最久沒有使用的鍵（被淘汰等同於裝滿的 bucket）
+    """
+    
+    def __init__(self, capacity: float, refill_per_second: float, max_keys: int = 10000):
+        """
+        Args:
+            capacity: bucket 容量（允許的突發次數）
+            refill_per_second: 每秒補充的 token 數
+            max_keys: 最多追蹤的鍵數
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self.evicted = 0
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+    
+    def _current(self, key: str, now: float) -> float:
+        """目前的 token 數（呼叫端需持有鎖）"""
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.capacity
+        tokens, updated = entry
+        return min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+    
+    def retry_after(self, key: str, now: float) -> float:
+        """距離下一個 token 的秒數，有 token 時為 0（呼叫端需持有鎖）"""
+        tokens = self._current(key, now)
+        if tokens >= 1:
+            return 0.0
+        return (1 - tokens) / self.refill_per_second
+    
+    def consume(self, key: str, now: float):
+        """取用一個 token（呼叫端需持有鎖，且已確認 retry_after 為 0）"""
+        self._buckets[key] = (self._current(key, now) - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+    
+    def __len__(self) -> int:
+        """目前追蹤的鍵數"""
+        return len(self._buckets)
+
+
+class LoginThrottle:
+    """登入節流：同時檢查帳號與用戶端兩個 bucket，任一個沒有 token 就拒絕"""
+    
+    def __init__(
+        self,
+        account_capacity: int = 5,
+        account_refill_per_minute: float = 1,
+        client_capacity: int = 20,
+        client_refill_per_minute: float = 10,
+        max_keys: int = 10000
+    ):
+        """
+        初始化登入節流
+        
+        Args:
+            account_capacity: 每個帳號允許連續嘗試的次數
+            account_refill_per_minute: 每個帳號每分鐘恢復的嘗試次數
+            client_capacity: 每個用戶端（IP）允許連續嘗試的次數
+            client_refill_per_minute: 每個用戶端每分鐘恢復的嘗試次數
+            max_keys: 每種 bucket 最多追蹤的鍵數
+        """
+        self._lock = threading.Lock()
+        self.accounts = TokenBuckets(account_capacity, account_refill_per_minute / 60, max_keys)
+        self.clients = TokenBuckets(client_capacity, client_refill_per_minute / 60, max_keys)
+        self._counters = {"allowed": 0, "throttled_account": 0, "throttled_client": 0}
+    
+    def allow(self, email: str, client_id: Optional[str] = None) -> Tuple[bool, float]:
+        """
+        檢查並記錄一次登入嘗試（只有記憶體運算，在任何檔案讀取或密碼雜湊之前呼叫）
+        
+        Args:
+            email: 嘗試登入的帳號
+            client_id: 用戶端識別（IP），None 時只檢查帳號
+        
+        Returns:
+            (是否允許, 需要等待的秒數)
+        """
+        account_key = email.strip().lower()
+        now = time.monotonic()
+        
+        with self._lock:
+            account_wait = self.accounts.retry_after(account_key, now)
+            client_wait = self.clients.retry_after(client_id, now) if client_id else 0.0
+            
+            if account_wait or client_wait:
+                self._counters["throttled_account" if account_wait >= client_wait else "throttled_client"] += 1
+                return False, max(account_wait, client_wait)
+            
+            self.accounts.consume(account_key, now)
+            if client_id:
+                self.clients.consume(client_id, now)
+            self._counters["allowed"] += 1
+            return True, 0.0
+    
+    def metrics(self) -> Dict[str, int]:
+        """
+        取得節流統計
+        
+        Returns:
+            允許與被拒絕的次數、目前追蹤的帳號與用戶端數、被 LRU 淘汰的鍵數
+        """
+        with self._lock:
+            return {
+                **self._counters,
+                "throttled": self._counters["throttled_account"] + self._counters["throttled_client"],
+                "tracked_accounts": len(self.accounts),
+                "tracked_clients": len(self.clients),
+                "evicted": self.accounts.evicted + self.clients.evicted
+            }
+
+
+# 全域實例（同一個 Streamlit 行程的所有 session 共用）
+login_throttle = LoginThrottle()
@@ -0,0 +1,166 @@
+"""
+Password Hashing Module
+PBKDF2-HMAC-SHA256 密碼雜湊：啟動時校準迭代次數，在有上限的工作執行緒池中計算，並可升級舊格式的雜湊
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+ALGORITHM = "pbkdf2_sha256"
+# 校準結果的下限，避免在很快的機器上反而選出太小的值
+MIN_ITERATIONS = 100_000
+SALT_BYTES = 16
+# 既有雜湊的迭代次數低於目前校準值的這個比例時才重新雜湊（校準結果每次啟動會有些微差異）
+REHASH_RATIO = 0.8
+
+
+class PasswordHasherBusy(Exception):
+    """同時等待計算的雜湊太多（登入尖峰），請稍後再試"""
+
+
+def calibrate(target_ms: float = 250, sample_iterations: int = 20_000) -> int:
+    """
+    量測這台機器的 PBKDF2 速度，算出雜湊一次約需 target_ms 毫秒的迭代次數
+    
+    Args:
+        target_ms: 目標延遲（毫秒）
+        sample_iterations: 量測時使用的迭代次數
+    
+    Returns:
+        迭代次數（不低於 MIN_ITERATIONS，取整到千位）
+    """
+    salt = secrets.token_bytes(SALT_BYTES)
+    best = float("inf")
+    # 取三次中最快的一次，減少排程雜訊的影響
+    for _ in range(3):
+        started = time.perf_counter()
+        hashlib.pbkdf2_hmac("sha256", b"calibration", salt, sample_iterations)
+        best = min(best, time.perf_counter() - started)
+    
+    iterations = int(sample_iterations * (target_ms / 1000) / max(best, 1e-6))
+    return max(MIN_ITERATIONS, iterations // 1000 * 1000)
+
+
+def _b64(data: bytes) -> str:
+    """不含補齊符號的 base64"""
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    """還原 _b64 的結果"""
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _is_legacy_sha256(hashed: str) -> bool:
+    """舊版的未加鹽 SHA-256（64 個十六進位字元）"""
+    return len(hashed) == 64 and all(c in "0123456789abcdef" for c in hashed)
+
+
+class PasswordHasher:
+    """
+    密碼雜湊服務
+    
+    PBKDF2 在 OpenSSL 中計算時會釋放 GIL，交給固定大小的執行緒池可真正平行；
+    同時排隊的工作數有上限，登入尖峰時多出來的請求最多只等 wait_timeout（約一次雜湊的時間）
+    就得到 PasswordHasherBusy，不會讓所有 Streamlit 腳本執行緒一起卡在 CPU 上
+    """
+    
+    def __init__(self, target_ms: float = 250, max_workers: int = None, max_pending: int = 16,
+                 wait_timeout: float = 0.25):
+        """
+        初始化並校準
+        
+        Args:
+            target_ms: 單次雜湊的目標延遲（毫秒）
+            max_workers: 工作執行緒數，預設為 CPU 數（最多 4）
+            max_pending: 除了執行中的工作之外，最多允許排隊的數量
+            wait_timeout: 排隊名額已滿時等待的秒數（應遠小於一秒，0 表示不等待）
+        """
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.iterations = calibrate(target_ms)
+        self.wait_timeout = wait_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_pending)
+    
+    def _run(self, func, *args):
+        """在工作執行緒池中執行並等待結果"""
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise PasswordHasherBusy("目前登入請求過多，請稍後再試")
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+    
+    @staticmethod
+    def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+        """在工作執行緒中執行的 PBKDF2 計算"""
+        return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    
+    def hash(self, password: str) -> str:
+        """
+        產生密碼雜湊
+        
+        Args:
+            password: 明文密碼
+        
+        Returns:
+            pbkdf2_sha256$迭代次數$salt$hash 格式的字串
+        """
+        salt = secrets.token_bytes(SALT_BYTES)
+        digest = self._run(self._pbkdf2, password, salt, self.iterations)
+        return f"{ALGORITHM}${self.iterations}${_b64(salt)}${_b64(digest)}"
+    
+    def verify(self, password: str, hashed: str) -> Tuple[bool, bool]:
+        """
+        驗證密碼
+        
+        Args:
+            password: 明文密碼
+            hashed: 儲存的雜湊（新格式或舊版 SHA-256）
+        
+        Returns:
+            (是否正確, 是否需要以目前的參數重新雜湊)
+        """
+        if not hashed:
+            return False, False
+        
+        if _is_legacy_sha256(hashed):
+            digest = hashlib.sha256(password.encode()).hexdigest()
+            ok = hmac.compare_digest(digest, hashed)
+            return ok, ok
+        
+        try:
+            algorithm, iterations, salt, expected = hashed.split("$")
+            iterations = int(iterations)
+            salt, expected = _unb64(salt), _unb64(expected)
+        except ValueError:
+            return False, False
+        if algorithm != ALGORITHM:
+            return False, False
+        
+        digest = self._run(self._pbkdf2, password, salt, iterations)
+        ok = hmac.compare_digest(digest, expected)
+        return ok, ok and iterations < self.iterations * REHASH_RATIO
+
+
+def _env_target_ms() -> float:
+    """讀取環境變數 PASSWORD_HASH_TARGET_MS（預設 250）"""
+    try:
+        return float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+    except ValueError:
+        return 250.0
+
+
+# 全域實例（匯入時校準一次）
+password_hasher = PasswordHasher(target_ms=_env_target_ms())
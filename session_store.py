@@ -0,0 +1,271 @@
+"""
+Session Store Module
+登入 session 的服務：行程內 TTL 快取 + SQLite 持久化（write-through）
+"""
+
+import heapq
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_email ON sessions (email);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SessionService:
+    """
+    以 session_id 為鍵的 session 服務
+    
+    驗證時先查行程內的 TTL 快取，命中時完全不讀磁碟；
+    建立與刪除都同時寫入 SQLite 與快取（write-through），其他行程最多在 cache_ttl 秒後看到變更
+    """
+    
+    def __init__(
+        self,
+        db_path: str = "sessions.db",
+        legacy_json: Optional[str] = "sessions.json",
+        lifetime_days: float = 7,
+        cache_ttl: float = 300,
+        cache_size: int = 10000
+    ):
+        """
+        初始化 session 服務
+        
+        Args:
+            db_path: SQLite 資料庫路徑
+            legacy_json: 舊的 sessions.json，第一次啟動時會匯入（None 表示不匯入）
+            lifetime_days: session 有效天數
+            cache_ttl: 快取項目的存活秒數
+            cache_size: 快取最多保留的 session 數
+        """
+        self.db_path = db_path
+        self.lifetime = timedelta(days=lifetime_days)
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        # session_id -> (email, expires_at, 快取到期的 monotonic 時間)
+        self._cache: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        # 依 expires_at 排序的 min-heap，清理時只需要看堆頂（刪除過的項目在彈出時才略過）
+        self._expiry_heap: List[Tuple[str, str]] = []
+        
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SQLITE_SCHEMA)
+        
+        if legacy_json:
+            self._migrate_from_json(legacy_json)
+    
+    @contextmanager
+    def _connect(self):
+        """建立連線（每個操作各自連線，可安全地在 Streamlit 多執行緒中使用）"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous = NORMAL")
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _migrate_from_json(self, legacy_json: str):
+        """一次性匯入舊的 sessions.json（已過期的不匯入）"""
+        with self._connect() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+            if done or not os.path.exists(legacy_json):
+                return
+            
+            try:
+                with open(legacy_json, 'r', encoding='utf-8') as f:
+                    sessions = json.load(f).get("sessions", [])
+            except Exception as e:
+                print(f"匯入 session 資料失敗：{e}")
+                return
+            
+            now = datetime.now().strftime(TIME_FORMAT)
+            rows = [
+                (s["session_id"], s["email"], s.get("created_at", now), s["expires_at"])
+                for s in sessions
+                if s.get("session_id") and s.get("expires_at", "") > now
+            ]
+            conn.executemany("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_json', ?)",
+                (os.path.abspath(legacy_json),)
+            )
+            print(f"已從 {legacy_json} 匯入 {len(rows)} 個 session")
+    
+    def _cache_put(self, session_id: str, email: str, expires_at: str):
+        """放入快取，超過上限時淘汰最久未使用的項目"""
+        with self._lock:
+            self._cache[session_id] = (email, expires_at, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(session_id)
+            heapq.heappush(self._expiry_heap, (expires_at, session_id))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            
+            # 被 LRU 淘汰的項目會留在堆中，數量過多時依快取內容重建
+            if len(self._expiry_heap) > 2 * self.cache_size:
+                self._expiry_heap = [(entry[1], sid) for sid, entry in self._cache.items()]
+                heapq.heapify(self._expiry_heap)
+    
+    def _cache_get(self, session_id: str) -> Optional[Tuple[str, str]]:
+        """從快取取得 (email, expires_at)；快取項目過期時視為未命中"""
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._cache[session_id]
+                return None
+            self._cache.move_to_end(session_id)
+            return entry[0], entry[1]
+    
+    def create(self, email: str) -> str:
+        """
+        建立 session
+        
+        Args:
+            email: 使用者電子郵件
+        
+        Returns:
+            session_id
+        """
+        session_id = secrets.token_hex(32)
+        now = datetime.now()
+        expires_at = (now + self.lifetime).strftime(TIME_FORMAT)
+        
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?, ?)",
+                (session_id, email, now.strftime(TIME_FORMAT), expires_at)
+            )
+        self._cache_put(session_id, email, expires_at)
+        return session_id
+    
+    def verify(self, session_id: str) -> Tuple[bool, str]:
+        """
+        驗證 session
+        
+        Args:
+            session_id: session ID
+        
+        Returns:
+            (是否有效, email 或錯誤訊息)
+        """
+        cached = self._cache_get(session_id)
+        if cached is None:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT email, expires_at FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+            if row is None:
+                return False, "無效的 session"
+            cached = (row["email"], row["expires_at"])
+            self._cache_put(session_id, *cached)
+        
+        email, expires_at = cached
+        if expires_at > datetime.now().strftime(TIME_FORMAT):
+            return True, email
+        
+        # Session 過期，刪除
+        self.delete(session_id)
+        return False, "Session 已過期"
+    
+    def delete(self, session_id: str):
+        """
+        刪除 session（登出）
+        
+        Args:
+            session_id: session ID
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        with self._lock:
+            self._cache.pop(session_id, None)
+    
+    def sweep(self) -> int:
+        """
+        批次清除所有已過期的 session（資料庫以 expires_at 索引範圍刪除，快取從 min-heap 堆頂彈出）
+        
+        Returns:
+            從資料庫刪除的 session 數
+        """
+        now = datetime.now().strftime(TIME_FORMAT)
+        
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self._expiry_heap)
+                entry = self._cache.get(session_id)
+                if entry and entry[1] == expires_at:
+                    del self._cache[session_id]
+        
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+    
+    def session_counts(self) -> Dict[str, int]:
+        """
+        取得 session 數量
+        
+        Returns:
+            {"live": 有效的 session 數, "expired": 已過期但尚未清除的 session 數}
+        """
+        now = datetime.now().strftime(TIME_FORMAT)
+        with self._connect() as conn:
+            expired = conn.execute("SELECT COUNT(*) FROM sessions WHERE expires_at <= ?", (now,)).fetchone()[0]
+            live = conn.execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (now,)).fetchone()[0]
+        return {"live": live, "expired": expired}
+    
+    def start_sweeper(self, interval_seconds: float = 600):
+        """
+        啟動背景清理執行緒（重複呼叫不會建立第二個執行緒）
+        
+        Args:
+            interval_seconds: 兩次清理之間的秒數
+        """
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        
+        self._stop_event.clear()
+        
+        def loop():
+            while not self._stop_event.is_set():
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"清除過期 session 失敗：{e}")
+                self._stop_event.wait(interval_seconds)
+        
+        self._sweeper = threading.Thread(target=loop, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+    
+    def stop_sweeper(self):
+        """停止背景清理執行緒"""
+        self._stop_event.set()
+        if self._sweeper:
+            self._sweeper.join()
+            self._sweeper = None
@@ -0,0 +1,68 @@
+"""
+Secret Scanner Tests
+以實際檔案（memory-mapped 讀取）測試敏感資訊掃描與遮蔽
+"""
+
+from crew_modules.secret_scanner import read_file_redacted, scan_file
+
+
+OPENAI_KEY = "sk-proj-" + "a1B2c3D4e5F6g7H8i9J0k1L2m3N4"
+
+
+def _write(tmp_path, text: str) -> str:
+    path = tmp_path / "config.py"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_scan_file_finds_secret_with_line_number(tmp_path):
+    path = _write(tmp_path, f'import os\n\nAPI_KEY = "{OPENAI_KEY}"\n')
+
+    findings = scan_file(path)
+
+    assert [(f["type"], f["line"]) for f in findings] == [("openai_api_key", 3)]
+
+
+def test_read_file_redacted_replaces_secret(tmp_path):
+    path = _write(tmp_path, f'password = "hunter2-secret"\nAPI_KEY = "{OPENAI_KEY}"\n')
+
+    content, findings = read_file_redacted(path, 'redact')
+
+    assert OPENAI_KEY not in content
+    assert "hunter2-secret" not in content
+    assert "[REDACTED_SECRET:openai_api_key]" in content
+    assert [f["line"] for f in findings] == [1, 2]
+
+
+def test_read_file_redacted_exclude_mode(tmp_path):
+    path = _write(tmp_path, f'API_KEY = "{OPENAI_KEY}"\n')
+
+    content, findings = read_file_redacted(path, 'exclude')
+
+    assert content is None
+    assert findings
+
+
+def test_clean_file_is_returned_unchanged(tmp_path):
+    text = 'def add(a, b):\n    return a + b\n'
+    path = _write(tmp_path, text)
+
+    assert read_file_redacted(path, 'redact') == (text, [])
+
+
+def test_known_formats_found_without_quotes(tmp_path):
+    path = _write(tmp_path, "STRIPE=sk_live_" + "4eC39HqLyjWDarjtT1zdp7dc\nAWS_ACCESS_KEY_ID=AKIA" + "IOSFODNN7EXAMPLE\n")
+
+    findings = scan_file(path)
+
+    assert [(f["type"], f["line"]) for f in findings] == [("stripe_key", 1), ("aws_access_key_id", 2)]
+
+
+def test_digests_alphabets_and_file_names_are_not_secrets(tmp_path):
+    path = _write(tmp_path, (
+        'SHA256 = "e577bfed6c935de944424667e3da285012e741892dcb7051a8f1ce68ab05c92f"\n'
+        'ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"\n'
+        'SUFFIX = ".cpython-311-x86_64-linux-gnu.so"\n'
+    ))
+
+    assert scan_file(path) == []
@@ -0,0 +1,370 @@
+"""
+User Store Module
+使用者資料的儲存後端（SQLite / 有索引的 JSON 文件）
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from filelock import FileLock
+
+
+USER_FIELDS = ("email", "password", "name", "google_id", "created_at", "last_login")
+
+
+class _DeferredLastLogin:
+    """
+    延遲寫入 last_login：登入時只記在記憶體，累積到 batch_size 筆或經過 flush_interval 秒才一次寫回，
+    登入本身不需要任何寫入。尚未寫回的值在 get_user 時會覆蓋上去，行程結束前也會寫回
+    """
+    
+    def __init__(self, flush_interval: float = 30.0, batch_size: int = 100):
+        """
+        Args:
+            flush_interval: 最長延遲秒數
+            batch_size: 累積多少筆時立即寫回
+        """
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: Dict[str, str] = {}
+        self._pending_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+    
+    def record_login(self, email: str, when: str):
+        """
+        記錄登入時間
+        
+        Args:
+            email: 電子郵件
+            when: 登入時間字串
+        """
+        with self._pending_lock:
+            self._pending[email] = when
+            flush_now = len(self._pending) >= self.batch_size
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        
+        if flush_now:
+            self.flush()
+    
+    def flush(self):
+        """把累積的 last_login 一次寫回"""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        
+        if pending:
+            try:
+                self._write_last_logins(pending)
+            except Exception as e:
+                print(f"更新最後登入時間失敗：{e}")
+    
+    def _with_pending(self, user: Optional[Dict]) -> Optional[Dict]:
+        """套用尚未寫回的 last_login"""
+        if user is None:
+            return None
+        with self._pending_lock:
+            when = self._pending.get(user["email"])
+        return {**user, "last_login": when} if when else user
+    
+    def _write_last_logins(self, pending: Dict[str, str]):
+        """由子類別實作：一次寫回多筆 last_login"""
+        raise NotImplementedError
+
+
+class JsonUserStore(_DeferredLastLogin):
+    """
+    沿用 users_db.json 格式，但在記憶體中以 email 建立索引
+    
+    查詢只需一次 stat 確認檔案沒有被其他行程修改；
+    寫入時取得檔案鎖、重新載入後以暫存檔 + atomic rename 寫回
+    """
+    
+    def __init__(self, users_file: str = "users_db.json", **kwargs):
+        """
+        初始化 JSON 使用者儲存
+        
+        Args:
+            users_file: 使用者資料檔案路徑
+        """
+        super().__init__(**kwargs)
+        self.users_file = users_file
+        self._file_lock = FileLock(users_file + ".lock", timeout=30)
+        self._lock = threading.RLock()
+        self._signature = None
+        self._users: Dict[str, Dict] = {}
+        self._load()
+    
+    @staticmethod
+    def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+        """檔案的 (mtime, size, inode)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    
+    def _load(self):
+        """載入使用者資料並建立 email 索引"""
+        self._signature = self._file_signature(self.users_file)
+        users = []
+        if os.path.exists(self.users_file):
+            try:
+                with open(self.users_file, 'r', encoding='utf-8') as f:
+                    users = json.load(f).get("users", [])
+            except Exception as e:
+                print(f"載入使用者資料失敗：{e}")
+        self._users = {user["email"]: user for user in users}
+    
+    def _refresh(self):
+        """檔案被其他行程修改過時重新載入"""
+        with self._lock:
+            if self._file_signature(self.users_file) != self._signature:
+                self._load()
+    
+    def _save(self):
+        """儲存使用者資料（呼叫端需持有鎖）"""
+        tmp_file = f"{self.users_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({"users": list(self._users.values())}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.users_file)
+        self._signature = self._file_signature(self.users_file)
+    
+    def get_user(self, email: str) -> Optional[Dict]:
+        """
+        以 email 取得使用者
+        
+        Args:
+            email: 電子郵件
+        
+        Returns:
+            使用者資料，不存在時返回 None
+        """
+        self._refresh()
+        with self._lock:
+            user = self._users.get(email)
+            user = dict(user) if user else None
+        return self._with_pending(user)
+    
+    def add_user(self, user: Dict) -> bool:
+        """
+        新增使用者
+        
+        Args:
+            user: 使用者資料
+        
+        Returns:
+            False 表示 email 已存在
+        """
+        with self._lock, self._file_lock:
+            self._refresh()
+            if user["email"] in self._users:
+                return False
+            self._users[user["email"]] = dict(user)
+            self._save()
+        return True
+    
+    def update_user(self, email: str, **fields) -> bool:
+        """
+        更新使用者欄位
+        
+        Args:
+            email: 電子郵件
+            **fields: 要更新的欄位
+        
+        Returns:
+            False 表示使用者不存在
+        """
+        with self._lock, self._file_lock:
+            self._refresh()
+            user = self._users.get(email)
+            if user is None:
+                return False
+            user.update(fields)
+            self._save()
+        return True
+    
+    def count(self) -> int:
+        """使用者總數"""
+        self._refresh()
+        return len(self._users)
+    
+    def _write_last_logins(self, pending: Dict[str, str]):
+        """一次寫回多筆 last_login"""
+        with self._lock, self._file_lock:
+            self._refresh()
+            for email, when in pending.items():
+                if email in self._users:
+                    self._users[email]["last_login"] = when
+            self._save()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    password TEXT,
+    name TEXT,
+    google_id TEXT,
+    created_at TEXT,
+    last_login TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_google_id ON users (google_id) WHERE google_id IS NOT NULL;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SqliteUserStore(_DeferredLastLogin):
+    """以 SQLite 儲存使用者，email 為主鍵，查詢與新增都不需要讀取整份資料"""
+    
+    def __init__(self, db_path: str = "users.db", legacy_json: Optional[str] = "users_db.json", **kwargs):
+        """
+        初始化 SQLite 使用者儲存
+        
+        Args:
+            db_path: SQLite 資料庫路徑
+            legacy_json: 舊的 users_db.json，第一次啟動時會匯入（None 表示不匯入）
+        """
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(SQLITE_SCHEMA)
+        
+        if legacy_json:
+            self._migrate_from_json(legacy_json)
+    
+    @contextmanager
+    def _connect(self):
+        """建立連線（每個操作各自連線，可安全地在 Streamlit 多執行緒中使用）"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous = NORMAL")
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _migrate_from_json(self, legacy_json: str):
+        """一次性匯入舊的 users_db.json"""
+        with self._connect() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+            if done or not os.path.exists(legacy_json):
+                return
+            
+            try:
+                with open(legacy_json, 'r', encoding='utf-8') as f:
+                    users = json.load(f).get("users", [])
+            except Exception as e:
+                print(f"匯入使用者資料失敗：{e}")
+                return
+            
+            conn.executemany(
+                f"INSERT OR IGNORE INTO users VALUES ({', '.join('?' * len(USER_FIELDS))})",
+                [tuple(user.get(field) for field in USER_FIELDS) for user in users if user.get("email")]
+            )
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_json', ?)",
+                (os.path.abspath(legacy_json),)
+            )
+            print(f"已從 {legacy_json} 匯入 {len(users)} 位使用者")
+    
+    def get_user(self, email: str) -> Optional[Dict]:
+        """
+        以 email 取得使用者（主鍵查詢）
+        
+        Args:
+            email: 電子郵件
+        
+        Returns:
+            使用者資料，不存在時返回 None
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+        return self._with_pending(dict(row) if row else None)
+    
+    def add_user(self, user: Dict) -> bool:
+        """
+        新增使用者
+        
+        Args:
+            user: 使用者資料
+        
+        Returns:
+            False 表示 email（或 google_id）已存在
+        """
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    f"INSERT INTO users VALUES ({', '.join('?' * len(USER_FIELDS))})",
+                    tuple(user.get(field) for field in USER_FIELDS)
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+    
+    def update_user(self, email: str, **fields) -> bool:
+        """
+        更新使用者欄位
+        
+        Args:
+            email: 電子郵件
+            **fields: 要更新的欄位
+        
+        Returns:
+            False 表示使用者不存在
+        """
+        columns = [field for field in fields if field in USER_FIELDS and field != "email"]
+        if not columns:
+            return False
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE users SET {', '.join(f'{column} = ?' for column in columns)} WHERE email = ?",
+                [fields[column] for column in columns] + [email]
+            )
+            return cursor.rowcount > 0
+    
+    def count(self) -> int:
+        """使用者總數"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    
+    def _write_last_logins(self, pending: Dict[str, str]):
+        """一次寫回多筆 last_login（單一交易）"""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE users SET last_login = ? WHERE email = ?",
+                [(when, email) for email, when in pending.items()]
+            )
+
+
+def create_user_store(name: Optional[str] = None, users_file: str = "users_db.json"):
+    """
+    依名稱建立使用者儲存
+    
+    Args:
+        name: 'sqlite' 或 'json'，None 時讀取環境變數 USER_STORE（預設 sqlite）
+        users_file: JSON 使用者檔案路徑；SQLite 會使用 users.db 並從它匯入
+    
+    Returns:
+        使用者儲存實例
+    """
+    name = (name or os.getenv("USER_STORE", "sqlite")).strip().lower()
+    if name == "json":
+        return JsonUserStore(users_file)
+    if name != "sqlite":
+        print(f"未知的使用者儲存：{name}，改用 sqlite")
+    return SqliteUserStore(os.path.join(os.path.dirname(users_file), "users.db"), legacy_json=users_file)